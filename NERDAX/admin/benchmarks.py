@@ -0,0 +1,134 @@
+import copy
+import sys
+from NERDA.models import NERDA
+from NERDA import precooked
+from NERDA.datasets import get_dane_data
+from NERDA.preprocessing import create_dataloader
+from NERDA.training import compute_loss
+from NERDA.utils import match_kwargs
+import time
+import torch
+
+def timeit(fun, n = 100) -> float:
+    """Average time in microseconds for calling fun()"""
+    start = time.perf_counter()
+    for _ in range(n):
+        fun()
+    return (time.perf_counter() - start) / n * 1e6
+
+def benchmark_overhead(model, dataset, batch_size = 16) -> dict:
+    """Benchmark Per-Batch Python Overhead
+
+    Measures the time spent per batch in the train/predict loops
+    outside the forward pass of the network, i.e. data loading
+    and collating, loss computation, argument matching and
+    decoding of predicted tags.
+
+    Args:
+        model: NERDA model.
+        dataset (dict): data set with 'sentences' and 'tags'.
+        batch_size (int, optional): batch size. Defaults to 16.
+
+    Returns:
+        dict: microseconds per batch by step.
+    """
+    dl = create_dataloader(sentences = dataset.get('sentences'),
+                           tags = dataset.get('tags'),
+                           transformer_tokenizer = model.transformer_tokenizer,
+                           transformer_config = model.transformer_config,
+                           max_len = model.max_len,
+                           tag_encoder = model.tag_encoder,
+                           tag_outside = model.tag_outside,
+                           batch_size = batch_size,
+                           num_workers = 0)
+    n_tags = len(model.tag_encoder.classes_)
+
+    start = time.perf_counter()
+    batches = list(dl)
+    load = (time.perf_counter() - start) / len(batches) * 1e6
+
+    batch = batches[0]
+    outputs = torch.randn(*batch['input_ids'].shape, n_tags)
+    indices = outputs.argmax(dim = 2).numpy()
+
+    return {'load_and_collate': load,
+            'compute_loss': timeit(lambda: compute_loss([outputs], batch['target_tags'], batch['masks'], 'cpu', n_tags)),
+            'match_kwargs': timeit(lambda: match_kwargs(model.network.transformer.forward,
+                                                        input_ids = None,
+                                                        attention_mask = None,
+                                                        token_type_ids = None)),
+            'decode_tags': timeit(lambda: [model.tag_encoder.classes_[row] for row in indices])}
+
+def benchmark_backends(model, sentences, backends = ('torchscript', 'compile'), batch_size = 16, n = 5) -> dict:
+    """Benchmark Compiled Inference Backends Against Eager Network
+
+    Args:
+        model: NERDA model.
+        sentences (list): word-tokenized sentences.
+        backends (tuple, optional): backends for `NERDA.optimize`.
+        batch_size (int, optional): batch size. Defaults to 16.
+        n (int, optional): number of repetitions. Defaults to 5.
+
+    Returns:
+        dict: seconds per call of `predict` by backend.
+    """
+    session = model.compile_for_inference(batch_size = batch_size)
+    results = {'eager': timeit(lambda: session.predict(sentences), n) / 1e6}
+    for backend in backends:
+        # shallow copy, that shares the eager network with model.
+        optimized = copy.copy(model)
+        if optimized.optimize(backend):
+            session = optimized.compile_for_inference(batch_size = batch_size)
+            results[backend] = timeit(lambda: session.predict(sentences), n) / 1e6
+    return results
+
+def benchmark_precisions(model, dataset, precisions = ('fp32', 'bf16-autocast', 'int8-dynamic'), batch_size = 16) -> list:
+    """Benchmark Latency and F1 of Numerical Precisions
+
+    Args:
+        model: fine-tuned NERDA model in full precision.
+        dataset (dict): evaluation data set with 'sentences' and 'tags'.
+        precisions (tuple, optional): precisions for `NERDA.set_precision`.
+        batch_size (int, optional): batch size. Defaults to 16.
+
+    Returns:
+        list: precision, seconds for `evaluate_performance` and 
+        micro-averaged F1-score.
+    """
+    results = []
+    for precision in precisions:
+        # deep copy, as int8 and fp16 can not be reverted.
+        converted = copy.deepcopy(model)
+        converted.set_precision(precision)
+        start = time.perf_counter()
+        performance = converted.evaluate_performance(dataset, batch_size = batch_size)
+        seconds = time.perf_counter() - start
+        f1 = performance.loc[performance['Level'] == 'AVG_MICRO', 'F1-Score'].item()
+        results.append({'precision': precision, 'seconds': seconds, 'f1': f1})
+    return results
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['precisions']:
+        dataset = get_dane_data('test')
+        for name in ['DA_BERT_ML', 'DA_DISTILBERT_ML', 'DA_ELECTRA_DA']:
+            model = getattr(precooked, name)(device = 'cpu')
+            model.load_network()
+            for result in benchmark_precisions(model, dataset):
+                print(f"{name:>20} {result['precision']:>14}: {result['seconds']:8.3f} s, F1 {result['f1']:.4f}")
+        sys.exit()
+
+    if sys.argv[1:] == ['backends']:
+        # untrained weights are as fast as fine-tuned ones.
+        sentences = get_dane_data('test', 256).get('sentences')
+        for name in ['DA_BERT_ML', 'DA_DISTILBERT_ML', 'DA_ELECTRA_DA', 'EN_ELECTRA_EN', 'EN_BERT_ML']:
+            model = getattr(precooked, name)(device = 'cpu')
+            for backend, seconds in benchmark_backends(model, sentences).items():
+                print(f'{name:>20} {backend:>12}: {seconds:8.3f} s')
+        sys.exit()
+
+    model = NERDA(transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased',
+                  device = 'cpu',
+                  max_len = 128)
+    dataset = get_dane_data('train', 2000)
+    for step, us in benchmark_overhead(model, dataset).items():
+        print(f'{step:>20}: {us:10.1f} us/batch')
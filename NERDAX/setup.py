@@ -29,6 +29,12 @@ setuptools.setup(
         'simplejson',
         'tiktoken'
     ],
+    extras_require={
+        'onnx': ['onnx', 'onnxruntime']
+    },
+    entry_points={
+        'console_scripts': ['nerda=NERDA.cli:main']
+    },
     setup_requires=['pytest-runner'],
     tests_require=['pytest',
                    'pytest-cov'],
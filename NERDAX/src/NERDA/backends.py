@@ -0,0 +1,219 @@
+"""
+This section covers functionality for running [NERDA.models.NERDA][]
+models with other execution backends than `torch`.
+
+Networks are exported to ONNX with logits as the only output and
+dynamic batch and sequence axes. `OnnxNetwork` runs an exported
+network with onnxruntime on CPU. It takes the place of the `torch`
+network of a model, so pre- and post-processing for predictions are
+unchanged.
+
+Exported networks can be quantized to int8 dynamically (weights
+only) or statically with activations calibrated on a data set.
+
+Requires the optional dependencies 'onnx' and 'onnxruntime', e.g.
+`pip install NERDA[onnx]`.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import numpy as np
+import torch
+from typing import Iterable
+from NERDA.networks import LogitsNetwork, example_inputs
+
+INPUT_NAMES = ['input_ids', 'attention_mask', 'token_type_ids']
+
+def _import_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError:
+        raise ImportError("ONNX backend requires 'onnxruntime'. Install with `pip install NERDA[onnx]`.")
+    return onnxruntime
+
+def export_onnx(network: torch.nn.Module,
+                path: str,
+                quantize: bool = False,
+                opset_version: int = 17) -> str:
+    """Export Network to ONNX
+
+    Exports the outputs of the classification layer (logits) of a
+    `NERDANetwork` with dynamic batch and sequence axes.
+
+    Args:
+        network (torch.nn.Module): `NERDANetwork` to export.
+        path (str): file for exported network.
+        quantize (bool, optional): if True, quantize weights to int8
+            with onnxruntime dynamic quantization. Defaults to False.
+        opset_version (int, optional): ONNX opset. Defaults to 17.
+
+    Returns:
+        str: path of exported network.
+    """
+    network.eval()
+    core = LogitsNetwork(network).eval()
+    vocab_size = getattr(network.transformer.config, 'vocab_size', 100)
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in INPUT_NAMES + ['logits']}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exported = os.path.join(tmp, 'network.onnx')
+        with torch.no_grad():
+            torch.onnx.export(core,
+                              example_inputs(network.device, 2, 8, vocab_size),
+                              exported,
+                              input_names = INPUT_NAMES,
+                              output_names = ['logits'],
+                              dynamic_axes = dynamic_axes,
+                              opset_version = opset_version,
+                              dynamo = False)
+        if quantize:
+            _import_onnxruntime()
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(exported, path, weight_type = QuantType.QInt8)
+        else:
+            shutil.copyfile(exported, path)
+    return path
+
+def quantize_onnx_static(network: torch.nn.Module,
+                         path: str,
+                         calibration_batches: Iterable[dict],
+                         per_channel: bool = True,
+                         **kwargs) -> str:
+    """Export Network to ONNX with Static int8 Quantization
+
+    Weights and activations are quantized to int8. The ranges of the
+    activations are calibrated by running the exported network on 
+    the calibration batches.
+
+    Args:
+        network (torch.nn.Module): `NERDANetwork` to export.
+        path (str): file for quantized network.
+        calibration_batches (Iterable[dict]): batches from a data 
+            loader for predictions, e.g. from 
+            `NERDA.predictions.create_prediction_dataloader`.
+        per_channel (bool, optional): if True, quantize weights per 
+            output channel. Defaults to True.
+        kwargs: arbitrary keyword arguments for
+            `onnxruntime.quantization.quantize_static`. By default
+            matrix multiplications and embeddings are quantized.
+
+    Returns:
+        str: path of quantized network.
+    """
+    _import_onnxruntime()
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class CalibrationReader(CalibrationDataReader):
+        def __init__(self, batches, input_names):
+            self.batches = iter(batches)
+            self.input_names = input_names
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            if batch is None:
+                return None
+            inputs = {'input_ids': batch['input_ids'], 
+                      'attention_mask': batch['masks'], 
+                      'token_type_ids': batch['token_type_ids']}
+            return {name: inputs[name].numpy().astype(np.int64) for name in self.input_names}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exported = export_onnx(network, os.path.join(tmp, 'network.onnx'))
+        try:
+            # fold shapes and constants, that improves quantization.
+            quant_pre_process(exported, os.path.join(tmp, 'preprocessed.onnx'), skip_symbolic_shape = True)
+            exported = os.path.join(tmp, 'preprocessed.onnx')
+        except Exception:
+            pass
+        input_names = [i.name for i in onnx.load(exported).graph.input]
+        # matrix multiplications and embedding look-ups.
+        kwargs.setdefault('op_types_to_quantize', ['MatMul', 'Gemm', 'Gather'])
+        quantize_static(exported, 
+                        path, 
+                        CalibrationReader(calibration_batches, input_names),
+                        quant_format = QuantFormat.QDQ,
+                        per_channel = per_channel,
+                        activation_type = QuantType.QUInt8,
+                        weight_type = QuantType.QInt8,
+                        **kwargs)
+    return path
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class OnnxNetwork(torch.nn.Module):
+    """NERDA Network Running on onnxruntime
+
+    Takes the same arguments as `NERDANetwork` and returns the
+    logits as a `torch` tensor, so it can replace the network of a
+    `NERDA` model for predictions. Holds no `torch` parameters and
+    can not be trained.
+
+    Attributes:
+        session (onnxruntime.InferenceSession): onnxruntime session.
+        path (str): exported network.
+        digest (str): hash of the exported network, when it was loaded.
+        device (str): 'cpu'.
+    """
+    def __init__(self,
+                 path: str,
+                 optimization_level: str = 'all',
+                 num_threads: int = None,
+                 optimized_path: str = None) -> None:
+        """Initialize OnnxNetwork
+
+        Args:
+            path (str): exported network, see `export_onnx`.
+            optimization_level (str, optional): graph optimizations of
+                onnxruntime, one of 'disable', 'basic', 'extended' and
+                'all'. Defaults to 'all'.
+            num_threads (int, optional): number of intra-op threads.
+                Defaults to None, i.e. chosen by onnxruntime.
+            optimized_path (str, optional): if provided, the optimized
+                graph is saved to this file. Defaults to None.
+        """
+        super(OnnxNetwork, self).__init__()
+        ort = _import_onnxruntime()
+        levels = {'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+                  'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+                  'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+                  'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL}
+        assert optimization_level in levels, f"'optimization_level' must be one of {list(levels)}"
+        options = ort.SessionOptions()
+        options.graph_optimization_level = levels[optimization_level]
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        if optimized_path is not None:
+            options.optimized_model_filepath = optimized_path
+        self.session = ort.InferenceSession(path, options, providers = ['CPUExecutionProvider'])
+        # inputs unused by the transformer are removed on export.
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.device = 'cpu'
+        self.path = path
+        self.digest = _file_digest(path)
+
+    def forward(self,
+                input_ids: torch.Tensor,
+                masks: torch.Tensor,
+                token_type_ids: torch.Tensor,
+                target_tags: torch.Tensor,
+                offsets: torch.Tensor,
+                position_ids: torch.Tensor = None) -> tuple:
+        """Forward Iteration
+
+        Returns:
+            tuple: outputs of classification layer and None in place
+            of transformer outputs.
+        """
+        assert position_ids is None and masks.dim() == 2, "Packed sequences are not supported by ONNX networks"
+        inputs = {'input_ids': input_ids, 'attention_mask': masks, 'token_type_ids': token_type_ids}
+        inputs = {name: np.ascontiguousarray(inputs[name].numpy(), dtype = np.int64) for name in self.input_names}
+        logits = self.session.run(['logits'], inputs)[0]
+        return torch.from_numpy(logits), None
@@ -0,0 +1,311 @@
+"""
+This section covers functionality for caching tokenized features
+for [NERDA.models.NERDA][] models on disk.
+
+Features are written once as flat arrays and are afterwards
+memory-mapped, so repeated training runs and evaluations on the
+same data set skip tokenization entirely.
+
+Predictions can be cached by sentence with `PredictionCache`, so 
+recurring sentences are only computed once by the network.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+import sklearn.preprocessing
+import torch
+import transformers
+
+FEATURES = ['input_ids', 'target_tags', 'offsets']
+
+def features_fingerprint(sentences: list,
+                         tags: list,
+                         transformer_tokenizer: transformers.PreTrainedTokenizer,
+                         max_len: int,
+                         tag_encoder: sklearn.preprocessing.LabelEncoder,
+                         tag_outside: str,
+                         stride: int = None) -> str:
+    """Compute Fingerprint for Tokenized Features
+
+    Computes a key, that identifies the tokenized features of a
+    data set. The key changes, if any of the transformer tokenizer,
+    its parameters, max_len, the tag encoder or the data change.
+
+    Args:
+        sentences (list): Sentences.
+        tags (list): Named-Entity tags.
+        transformer_tokenizer (transformers.PreTrainedTokenizer):
+            tokenizer for transformer.
+        max_len (int): Maximum length of sentences after applying
+            transformer tokenizer.
+        tag_encoder (sklearn.preprocessing.LabelEncoder): Encoder
+            for Named-Entity tags.
+        tag_outside (str): Special Outside tag.
+        stride (int, optional): Overlap of windows for sentences
+            exceeding max_len. Defaults to None.
+
+    Returns:
+        str: hex digest identifying the features.
+    """
+    spec = {'transformer': transformer_tokenizer.name_or_path,
+            'tokenizer': type(transformer_tokenizer).__name__,
+            'tokenizer_parameters': transformer_tokenizer.init_kwargs,
+            'vocab_size': len(transformer_tokenizer),
+            'max_len': max_len,
+            'tags': list(tag_encoder.classes_),
+            'tag_outside': tag_outside,
+            'stride': stride}
+    digest = hashlib.sha1(json.dumps(spec, sort_keys = True, default = str).encode('utf-8'))
+    for sentence, sentence_tags in zip(sentences, tags):
+        digest.update('\x1f'.join(sentence).encode('utf-8'))
+        digest.update(b'\x1e')
+        digest.update('\x1f'.join(sentence_tags).encode('utf-8'))
+        digest.update(b'\x1d')
+    digest.update(str(len(sentences)).encode('utf-8'))
+    return digest.hexdigest()
+
+def write_features(path: str, features: list, sentence_ids: np.ndarray = None) -> None:
+    """Write Tokenized Features to Disk
+
+    Concatenates the features of all sentences to flat arrays and
+    saves them together with the sentence boundaries. The files
+    are written to a temporary directory first, that is moved in
+    place, when complete.
+
+    Args:
+        path (str): Directory for features.
+        features (list): (input_ids, target_tags, offsets) for
+            every sentence.
+        sentence_ids (np.ndarray, optional): sentence for every item,
+            if sentences have been split into windows. Defaults to None.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok = True)
+    tmp = tempfile.mkdtemp(dir = parent)
+    try:
+        lengths = np.array([len(f[0]) for f in features], dtype = np.int64)
+        starts = np.zeros(len(features) + 1, dtype = np.int64)
+        np.cumsum(lengths, out = starts[1:])
+        np.save(os.path.join(tmp, 'starts.npy'), starts)
+        for i, name in enumerate(FEATURES):
+            values = np.fromiter((x for f in features for x in f[i]), dtype = np.int64, count = starts[-1])
+            np.save(os.path.join(tmp, f'{name}.npy'), values)
+        if sentence_ids is not None:
+            np.save(os.path.join(tmp, 'sentence_ids.npy'), sentence_ids)
+        os.replace(tmp, path)
+    except OSError:
+        # another process has written the same features already.
+        shutil.rmtree(tmp, ignore_errors = True)
+        if not os.path.exists(path):
+            raise
+
+def read_features(path: str) -> dict:
+    """Read Tokenized Features from Disk
+
+    Args:
+        path (str): Directory with features.
+
+    Returns:
+        dict: memory-mapped flat arrays with features and
+        item boundaries ('starts'). Features for item i are 
+        found in [starts[i], starts[i+1]). Includes 'sentence_ids' 
+        if sentences have been split into windows.
+    """
+    # copy-on-write mapping. Arrays are writable for torch without
+    # ever touching the files.
+    features = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode = 'c')
+                for name in FEATURES + ['starts']}
+    if os.path.exists(os.path.join(path, 'sentence_ids.npy')):
+        features['sentence_ids'] = np.load(os.path.join(path, 'sentence_ids.npy'))
+    return features
+
+def model_fingerprint(network: torch.nn.Module,
+                      transformer_tokenizer: transformers.PreTrainedTokenizer,
+                      max_len: int,
+                      tag_encoder: sklearn.preprocessing.LabelEncoder,
+                      tag_outside: str,
+                      stride: int = None,
+                      precision: str = 'fp32') -> str:
+    """Compute Fingerprint for Predictions of a Model
+
+    Computes a key, that identifies the predictions of a model. The
+    key changes, if any of the weights of the network, the tokenizer,
+    max_len, the tag scheme, stride or the precision change.
+
+    Args:
+        network (torch.nn.Module): Network.
+        transformer_tokenizer (transformers.PreTrainedTokenizer):
+            tokenizer for transformer.
+        max_len (int): Maximum length of sentences after applying
+            transformer tokenizer.
+        tag_encoder (sklearn.preprocessing.LabelEncoder): Encoder
+            for Named-Entity tags.
+        tag_outside (str): Special Outside tag.
+        stride (int, optional): Overlap of windows for sentences
+            exceeding max_len. Defaults to None.
+        precision (str, optional): numerical precision of network.
+            Defaults to 'fp32'.
+
+    Returns:
+        str: hex digest identifying the model.
+    """
+    spec = {'network': type(network).__name__,
+            # networks without torch weights, e.g. ONNX networks, that
+            # may be exported again to the same path.
+            'path': getattr(network, 'path', None),
+            'digest': getattr(network, 'digest', None),
+            'transformer': transformer_tokenizer.name_or_path,
+            'tokenizer_parameters': transformer_tokenizer.init_kwargs,
+            'vocab_size': len(transformer_tokenizer),
+            'max_len': max_len,
+            'tags': list(tag_encoder.classes_),
+            'tag_outside': tag_outside,
+            'stride': stride,
+            'precision': precision,
+            # early exits, see NERDA.networks.EarlyExitNetwork.
+            'max_layers': getattr(network, 'max_layers', None),
+            'threshold': getattr(network, 'threshold', None)}
+    digest = hashlib.sha1(json.dumps(spec, sort_keys = True, default = str).encode('utf-8'))
+    for name, value in network.state_dict().items():
+        digest.update(name.encode('utf-8'))
+        if torch.is_tensor(value):
+            if value.is_quantized:
+                value = value.int_repr()
+            digest.update(value.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy().tobytes())
+        else:
+            digest.update(repr(value).encode('utf-8'))
+    return digest.hexdigest()
+
+class PredictionCache:
+    """Cache for Predictions of Sentences
+
+    Keeps predicted tags and confidence scores by sentence in memory
+    with least-recently-used eviction and optionally in an unbounded
+    SQLite database on disk, that is shared between runs. Keys are 
+    hashes of the word-tokenized sentence and a model fingerprint,
+    see `model_fingerprint`, so predictions of other models or 
+    weights are never returned. Safe to use from multiple threads.
+
+    Attributes:
+        max_size (int): maximum number of sentences in memory.
+        hits (int): number of sentences found in cache.
+        misses (int): number of sentences not found in cache.
+        disk_hits (int): number of hits found on disk only.
+    """
+    def __init__(self, max_size: int = 100000, cache_dir: str = None) -> None:
+        """Initialize PredictionCache
+
+        Args:
+            max_size (int, optional): maximum number of sentences in 
+                memory. Defaults to 100000.
+            cache_dir (str, optional): directory for cache on disk.
+                Defaults to None, in which case predictions are only
+                cached in memory.
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok = True)
+            self.db = sqlite3.connect(os.path.join(cache_dir, 'predictions.sqlite'), check_same_thread = False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, value TEXT)')
+            self.db.commit()
+
+    @staticmethod
+    def key(fingerprint: str, sentence: list) -> str:
+        """Key for Sentence
+
+        Args:
+            fingerprint (str): model fingerprint.
+            sentence (list): word-tokenized sentence.
+
+        Returns:
+            str: hex digest.
+        """
+        digest = hashlib.sha1(fingerprint.encode('utf-8'))
+        digest.update('\x1f'.join(sentence).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, keys: list) -> list:
+        """Look Up Predictions
+
+        Args:
+            keys (list): keys of sentences.
+
+        Returns:
+            list: (tags, confidence scores) for every key or None, 
+            if not cached.
+        """
+        with self.lock:
+            values = [self.entries.get(key) for key in keys]
+            for key, value in zip(keys, values):
+                if value is not None:
+                    self.entries.move_to_end(key)
+            missing = list({key for key, value in zip(keys, values) if value is None})
+            if missing and self.db is not None:
+                found = {}
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i:i + 500]
+                    rows = self.db.execute(f"SELECT key, value FROM predictions WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                    found.update((key, tuple(json.loads(value))) for key, value in rows)
+                if found:
+                    self.disk_hits += sum(key in found for key in keys)
+                    values = [found.get(key) if value is None else value for key, value in zip(keys, values)]
+                    self._store(found)
+            n_hits = sum(value is not None for value in values)
+            self.hits += n_hits
+            self.misses += len(keys) - n_hits
+        return values
+
+    def put(self, predictions: dict) -> None:
+        """Add Predictions
+
+        Args:
+            predictions (dict): (tags, confidence scores) by key.
+        """
+        with self.lock:
+            self._store(predictions)
+            if self.db is not None:
+                self.db.executemany('INSERT OR REPLACE INTO predictions VALUES (?, ?)',
+                                    [(key, json.dumps(value)) for key, value in predictions.items()])
+                self.db.commit()
+
+    def _store(self, predictions: dict) -> None:
+        self.entries.update(predictions)
+        for key in predictions:
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last = False)
+
+    def clear(self) -> None:
+        """Remove All Predictions from Memory and Disk"""
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute('DELETE FROM predictions')
+                self.db.commit()
+
+    def stats(self) -> dict:
+        """Counters of Cache
+
+        Returns:
+            dict: hits, misses, disk hits, hit rate and number of
+            sentences in memory.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'disk_hits': self.disk_hits,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'size': len(self.entries)}
@@ -0,0 +1,64 @@
+"""
+Command line interface for NERDA.
+
+Examples:
+    Serve a precooked model with weights downloaded before:
+
+    $ nerda serve --model DA_BERT_ML --weights ~/.nerda/DA_BERT_ML.bin
+
+    Serve a fine-tuned NERDA model saved with `save_network`:
+
+    $ nerda serve --weights model.bin --transformer bert-base-multilingual-uncased --max-len 128
+"""
+import argparse
+from functools import partial
+from NERDA.serving import load_model, serve
+
+def main(argv: list = None) -> None:
+    """Run NERDA Command Line Interface
+
+    Args:
+        argv (list, optional): command line arguments. Defaults to 
+            None, in which case the arguments are read from sys.argv.
+    """
+    parser = argparse.ArgumentParser(prog = 'nerda')
+    commands = parser.add_subparsers(dest = 'command')
+    commands.required = True
+
+    server = commands.add_parser('serve', help = 'serve model over HTTP')
+    server.add_argument('--model', default = 'NERDA', 
+                        help = "'NERDA' or name of precooked model, e.g. 'DA_BERT_ML'")
+    server.add_argument('--weights', help = 'path to weights of network')
+    server.add_argument('--device', default = None)
+    server.add_argument('--transformer', help = "transformer for 'NERDA' models")
+    server.add_argument('--tag-scheme', nargs = '+', help = "tags for 'NERDA' models")
+    server.add_argument('--tag-outside', help = "outside tag for 'NERDA' models")
+    server.add_argument('--max-len', type = int, help = "max_len for 'NERDA' models")
+    server.add_argument('--host', default = '127.0.0.1')
+    server.add_argument('--port', type = int, default = 8000)
+    server.add_argument('--max-batch-size', type = int, default = 32)
+    server.add_argument('--max-wait', type = float, default = 0.005)
+    server.add_argument('--max-queue-size', type = int, default = 256)
+    server.add_argument('--verbose', action = 'store_true')
+    args = parser.parse_args(argv)
+
+    model_kwargs = {'transformer': args.transformer,
+                    'tag_scheme': args.tag_scheme,
+                    'tag_outside': args.tag_outside,
+                    'max_len': args.max_len}
+    model_kwargs = {k: v for k, v in model_kwargs.items() if v is not None}
+
+    serve(model_loader = partial(load_model, 
+                                 model = args.model, 
+                                 weights = args.weights, 
+                                 device = args.device, 
+                                 **model_kwargs),
+          host = args.host,
+          port = args.port,
+          max_batch_size = args.max_batch_size,
+          max_wait = args.max_wait,
+          max_queue_size = args.max_queue_size,
+          verbose = args.verbose)
+
+if __name__ == '__main__':
+    main()
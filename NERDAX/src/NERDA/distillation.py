@@ -0,0 +1,113 @@
+"""
+This section covers knowledge distillation from a large teacher
+[NERDA.models.NERDA][] model into a small student model, see
+`NERDA.distill`.
+
+The teacher computes soft targets, i.e. its logits for the first
+subword of every word, for labeled and unlabeled sentences. As
+soft targets are given for words, teacher and student can use
+different transformers and tokenizers, but must share the tag
+scheme. Soft targets can be cached on disk, so they are computed
+only once.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import numpy as np
+import torch
+from typing import List
+from NERDA.cache import model_fingerprint
+from NERDA.predictions import create_prediction_dataloader, first_subwords
+
+def teacher_logits(teacher,
+                   sentences: List[List[str]],
+                   batch_size: int = 8,
+                   cache_dir: str = None) -> list:
+    """Compute Soft Targets with Teacher Model
+
+    Args:
+        teacher (NERDA): teacher model.
+        sentences (List[List[str]]): word-tokenized sentences.
+        batch_size (int, optional): batch size. Defaults to 8.
+        cache_dir (str, optional): directory for caching soft targets
+            on disk. Soft targets are identified by the weights and
+            settings of the teacher and the sentences. Defaults to
+            None, i.e. no caching.
+
+    Returns:
+        list: logits of teacher with shape (words, tags) for every
+        sentence. Words truncated by the teacher are left out.
+    """
+    path = None
+    if cache_dir is not None:
+        digest = hashlib.sha1(model_fingerprint(network = teacher.network,
+                                                transformer_tokenizer = teacher.transformer_tokenizer,
+                                                max_len = teacher.max_len,
+                                                tag_encoder = teacher.tag_encoder,
+                                                tag_outside = teacher.tag_outside,
+                                                precision = teacher.precision).encode('utf-8'))
+        for sentence in sentences:
+            digest.update('\x1f'.join(sentence).encode('utf-8'))
+            digest.update(b'\x1e')
+        path = os.path.join(cache_dir, 'teacher-' + digest.hexdigest())
+        if os.path.exists(path):
+            return read_logits(path)
+
+    dl = create_prediction_dataloader(sentences = sentences,
+                                      transformer_tokenizer = teacher.transformer_tokenizer,
+                                      transformer_config = teacher.transformer_config,
+                                      max_len = teacher.max_len,
+                                      tag_encoder = teacher.tag_encoder,
+                                      tag_outside = teacher.tag_outside,
+                                      batch_size = batch_size,
+                                      num_workers = 0,
+                                      length_bucketing = True)
+    teacher.network.eval()
+    logits = [None] * len(sentences)
+    with torch.no_grad():
+        for batch, rows in zip(dl, dl.batch_sampler):
+            outputs, _ = teacher.network(**batch)
+            keep, bounds = first_subwords(batch['offsets'])
+            words = outputs.float().cpu().numpy()[keep]
+            for row, (start, end) in zip(rows, bounds):
+                logits[row] = words[start:end]
+
+    if path is not None:
+        write_logits(path, logits)
+    return logits
+
+def write_logits(path: str, logits: list) -> None:
+    """Write Soft Targets to Disk
+
+    Args:
+        path (str): directory for soft targets.
+        logits (list): soft targets for every sentence.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok = True)
+    tmp = tempfile.mkdtemp(dir = parent)
+    try:
+        starts = np.zeros(len(logits) + 1, dtype = np.int64)
+        np.cumsum([len(x) for x in logits], out = starts[1:])
+        np.save(os.path.join(tmp, 'starts.npy'), starts)
+        np.save(os.path.join(tmp, 'logits.npy'), np.concatenate(logits).astype(np.float32))
+        os.replace(tmp, path)
+    except OSError:
+        # another process has written the same soft targets already.
+        shutil.rmtree(tmp, ignore_errors = True)
+        if not os.path.exists(path):
+            raise
+
+def read_logits(path: str) -> list:
+    """Read Soft Targets from Disk
+
+    Args:
+        path (str): directory with soft targets.
+
+    Returns:
+        list: memory-mapped soft targets for every sentence.
+    """
+    starts = np.load(os.path.join(path, 'starts.npy'))
+    logits = np.load(os.path.join(path, 'logits.npy'), mmap_mode = 'r')
+    return [logits[start:end] for start, end in zip(starts[:-1], starts[1:])]
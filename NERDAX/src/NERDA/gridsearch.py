@@ -10,7 +10,8 @@ class NerdaEstimator():
                  dataset_training,
                  dataset_validation,
                  tag_scheme,
-                 tag_outside
+                 tag_outside,
+                 cache_dir = None
                  ):
         self.transformer = transformer
         self.dataset_training = dataset_training
@@ -18,6 +19,8 @@ class NerdaEstimator():
         self.tag_scheme = tag_scheme
         self.tag_outside = tag_outside
         self.param_grid = param_grid
+        # tokenized features are shared across all rounds.
+        self.cache_dir = cache_dir
         """
         self.param_grid = {
            'epochs': [],
@@ -48,7 +51,8 @@ class NerdaEstimator():
                          'train_batch_size': params['train_batch_size'],
                          'learning_rate': params['learning_rate']
                       },
-                      dropout=params['dropout']
+                      dropout=params['dropout'],
+                      cache_dir=self.cache_dir
                    )
 
             model.train()
@@ -0,0 +1,646 @@
+"""
+This section covers functionality for serving predictions from
+[NERDA.models.NERDA][] models with low latency.
+
+An `InferenceSession` does all the setup for predictions once, so
+repeated calls with few sentences, e.g. a single short text per
+request, only pay for tokenization and the forward pass. A 
+`MicroBatcher` merges concurrent requests from asyncio callers into
+shared forward passes. An `InferencePool` spreads predictions for
+large inputs over several CPU processes sharing one copy of the
+weights.
+"""
+import asyncio
+import os
+import queue
+import threading
+import warnings
+from contextlib import closing
+from functools import partial
+from itertools import islice
+import numpy as np
+import sklearn.preprocessing
+import torch
+import transformers
+from nltk.tokenize import sent_tokenize, word_tokenize
+from typing import Callable, Iterable, Iterator, List
+from NERDA.predictions import decode_batch, merge_windows
+from NERDA.preprocessing import NERDADataSetReader, LengthBucketBatchSampler
+
+FEATURES = ['input_ids', 'masks', 'token_type_ids', 'target_tags', 'offsets']
+
+class InferenceSession:
+    """Reusable Session for Predictions
+
+    Sets the network to evaluation mode and allocates buffers for the
+    inputs of the network once. Sentences are tokenized and collated
+    in-process, i.e. no data loader or worker processes are created
+    for every call, and nothing is downloaded, so the session runs
+    with no network access.
+
+    A session reuses its buffers, hence it must not be used from
+    several threads at once.
+
+    Attributes:
+        network (torch.nn.Module): Network.
+        batch_size (int): maximum number of sequences per forward pass.
+        buffers (list): pre-allocated input tensors.
+    """
+    def __init__(self,
+                 network: torch.nn.Module,
+                 transformer_tokenizer: transformers.PreTrainedTokenizer,
+                 transformer_config: transformers.PretrainedConfig,
+                 max_len: int,
+                 device: str,
+                 tag_encoder: sklearn.preprocessing.LabelEncoder,
+                 tag_outside: str,
+                 batch_size: int = 8,
+                 stride: int = None,
+                 length_bucketing: bool = False,
+                 sent_tokenize: Callable = sent_tokenize,
+                 word_tokenize: Callable = word_tokenize,
+                 chunk_size: int = 256,
+                 pipeline_depth: int = 0,
+                 warmup: bool = True) -> None:
+        """Initialize Inference Session
+
+        Args:
+            network (torch.nn.Module): Network.
+            transformer_tokenizer (transformers.PreTrainedTokenizer):
+                tokenizer for transformer model.
+            transformer_config (transformers.PretrainedConfig): config
+                for transformer model.
+            max_len (int): Maximum length of sentence after applying
+                transformer tokenizer.
+            device (str): Computational device.
+            tag_encoder (sklearn.preprocessing.LabelEncoder): Encoder
+                for Named-Entity tags.
+            tag_outside (str): Special 'outside' NER tag.
+            batch_size (int, optional): Maximum number of sequences
+                per forward pass. Defaults to 8.
+            stride (int, optional): if provided, split sentences
+                exceeding max_len into overlapping windows sharing
+                'stride' wordpieces instead of truncating them.
+                Defaults to None.
+            length_bucketing (bool, optional): if True, batch sentences
+                of similar length together. Defaults to False.
+            sent_tokenize (Callable, optional): function for sentence
+                tokenization. Defaults to `nltk.sent_tokenize`, that
+                requires the 'punkt_tab' resource to be installed.
+            word_tokenize (Callable, optional): function for word
+                tokenization. Defaults to `nltk.word_tokenize`.
+            chunk_size (int, optional): number of sentences tokenized
+                at a time. Defaults to 256.
+            pipeline_depth (int, optional): if positive, sentences are
+                tokenized and collated by a background thread up to 
+                'pipeline_depth' batches ahead of the forward pass,
+                so tokenization and computation overlap. Defaults to
+                0, i.e. no pipeline.
+            warmup (bool, optional): if True, run a forward pass with
+                a full batch, when the session is created. Defaults to
+                True.
+        """
+        self.network = network
+        self.transformer_tokenizer = transformer_tokenizer
+        self.transformer_config = transformer_config
+        self.max_len = max_len
+        self.device = device
+        self.tag_encoder = tag_encoder
+        self.tag_outside = tag_outside
+        self.batch_size = batch_size
+        self.stride = stride
+        self.length_bucketing = length_bucketing
+        self.sent_tokenize = sent_tokenize
+        self.word_tokenize = word_tokenize
+        self.tag_fill = tag_encoder.classes_[0]
+        self.pad_token_id = transformer_config.pad_token_id
+        self.chunk_size = chunk_size
+        self.pipeline_depth = pipeline_depth
+        # flat buffers, views of which are contiguous for any batch shape.
+        # A pipeline needs a set for every batch in flight.
+        n_buffers = pipeline_depth + 2 if pipeline_depth > 0 else 1
+        self.buffers = [{name: torch.zeros(batch_size * max_len, dtype = torch.long) for name in FEATURES}
+                        for _ in range(n_buffers)]
+
+        self.network.eval()
+        if warmup:
+            self.warmup()
+
+    def warmup(self) -> None:
+        """Warm Up Session
+
+        Runs a forward pass with a batch of maximum size, so memory
+        for the largest inputs is allocated before the first request.
+        """
+        word = self.transformer_tokenizer.unk_token or 'a'
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.predict([[word] * (self.max_len - 2)] * self.batch_size)
+
+    def _collate(self, encoded: list, buffers: dict) -> dict:
+        """Collate Encoded Sequences into Buffers
+
+        Args:
+            encoded (list): input_ids, target_tags and offsets for
+                every sequence.
+            buffers (dict): flat buffers to collate into.
+
+        Returns:
+            dict: inputs for network, views of buffers padded to the
+            longest sequence.
+        """
+        n = len(encoded)
+        length = max(len(input_ids) for input_ids, _, _ in encoded)
+        batch = {name: buffers[name][:n * length].view(n, length) for name in FEATURES}
+        arrays = {name: batch[name].numpy() for name in FEATURES}
+        arrays['input_ids'].fill(self.pad_token_id)
+        for name in ['masks', 'token_type_ids', 'target_tags', 'offsets']:
+            arrays[name].fill(0)
+        for i, (input_ids, _, offsets) in enumerate(encoded):
+            arrays['input_ids'][i, :len(input_ids)] = input_ids
+            arrays['masks'][i, :len(input_ids)] = 1
+            arrays['offsets'][i, :len(offsets)] = offsets
+        return batch
+
+    def _batches(self, sentences: Iterable[List[str]]) -> Iterator[tuple]:
+        """Tokenize and Collate Sentences Chunk by Chunk
+
+        Args:
+            sentences (Iterable[List[str]]): word-tokenized sentences.
+
+        Yields:
+            tuple: rows of batch in chunk, collated batch, and for the
+            last batch of every chunk the number of sentences and the
+            sentence for every row (or None), otherwise None.
+        """
+        sentences = iter(sentences)
+        k = 0
+        while True:
+            chunk = list(islice(sentences, self.chunk_size))
+            if not chunk:
+                return
+            reader = NERDADataSetReader(sentences = chunk,
+                                        tags = [[self.tag_fill] * len(sentence) for sentence in chunk],
+                                        transformer_tokenizer = self.transformer_tokenizer,
+                                        transformer_config = self.transformer_config,
+                                        max_len = self.max_len,
+                                        tag_encoder = self.tag_encoder,
+                                        tag_outside = self.tag_outside,
+                                        pad_sequences = False,
+                                        stride = self.stride)
+
+            if self.length_bucketing:
+                batches = list(LengthBucketBatchSampler(reader.sequence_lengths(), batch_size = self.batch_size))
+            else:
+                batches = [range(start, min(start + self.batch_size, len(reader)))
+                           for start in range(0, len(reader), self.batch_size)]
+
+            for j, rows in enumerate(batches):
+                # cycle through buffers, that are not in use by consumer.
+                buffers = self.buffers[k % len(self.buffers)]
+                batch = self._collate([reader._encode(row) for row in rows], buffers)
+                end = (len(chunk), reader.sentence_ids()) if j == len(batches) - 1 else None
+                yield rows, batch, end
+                k += 1
+
+    def _pipeline(self, batches: Iterator[tuple]) -> Iterator[tuple]:
+        """Produce Batches in Background Thread
+
+        Batches are prepared by a background thread up to 
+        'pipeline_depth' batches ahead of the consumer.
+        """
+        prefetched = queue.Queue(maxsize = self.pipeline_depth)
+        stop = threading.Event()
+        done = object()
+
+        def put(item) -> bool:
+            # give up, if the consumer has stopped and the queue is full.
+            while not stop.is_set():
+                try:
+                    prefetched.put(item, timeout = 0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for batch in batches:
+                    if not put(batch):
+                        return
+                put(done)
+            except Exception as e:
+                put(e)
+
+        producer = threading.Thread(target = produce, daemon = True)
+        producer.start()
+        try:
+            while True:
+                batch = prefetched.get()
+                if batch is done:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            stop.set()
+            producer.join()
+
+    def predict(self,
+                sentences: Iterable[List[str]],
+                return_confidence: bool = False) -> list:
+        """Predict Named Entities in Word-Tokenized Sentences
+
+        Args:
+            sentences (Iterable[List[str]]): word-tokenized sentences.
+            return_confidence (bool, optional): if True, return
+                confidence scores for all predicted tokens. Defaults
+                to False.
+
+        Returns:
+            list: Predicted tags for sentences - one predicted tag
+            per word token (and confidence scores).
+        """
+        batches = self._batches(sentences)
+        if self.pipeline_depth > 0:
+            batches = self._pipeline(batches)
+
+        predictions = []
+        probabilities = []
+        chunk_predictions = {}
+        chunk_probabilities = {}
+        # close batches on errors, so the producer thread is stopped.
+        with closing(batches), torch.no_grad():
+            for rows, batch, end in batches:
+                outputs, _ = self.network(**batch)
+                batch_predictions, batch_probabilities = decode_batch(outputs = outputs,
+                                                                      offsets = batch['offsets'],
+                                                                      tag_encoder = self.tag_encoder,
+                                                                      return_confidence = return_confidence)
+                for i, row in enumerate(rows):
+                    chunk_predictions[row] = batch_predictions[i]
+                    if return_confidence:
+                        chunk_probabilities[row] = batch_probabilities[i]
+
+                if end is None:
+                    continue
+                
+                # all batches of chunk are done.
+                n_sentences, sentence_ids = end
+                chunk_predictions = [chunk_predictions[row] for row in range(len(chunk_predictions))]
+                chunk_probabilities = [chunk_probabilities[row] for row in range(len(chunk_probabilities))]
+                if sentence_ids is not None:
+                    # merge predictions for windows of the same sentence.
+                    chunk_predictions = merge_windows(chunk_predictions, sentence_ids, n_sentences)
+                    chunk_probabilities = merge_windows(chunk_probabilities, sentence_ids, n_sentences) if return_confidence else chunk_probabilities
+                predictions.extend(chunk_predictions)
+                probabilities.extend(chunk_probabilities)
+                chunk_predictions = {}
+                chunk_probabilities = {}
+
+        if return_confidence:
+            return predictions, probabilities
+
+        return predictions
+
+    def predict_text(self,
+                     text: str,
+                     return_confidence: bool = False) -> tuple:
+        """Predict Named Entities in a Text
+
+        Sentences are word-tokenized lazily, i.e. in the background
+        thread, if the session is pipelined.
+
+        Args:
+            text (str): text to predict entities in.
+            return_confidence (bool, optional): if True, return
+                confidence scores for all predicted tokens. Defaults
+                to False.
+
+        Returns:
+            tuple: word-tokenized sentences and predicted
+            tags/entities.
+        """
+        assert isinstance(text, str), "'text' must be a string."
+        sentences = []
+        def tokenize():
+            for sentence in self.sent_tokenize(text):
+                sentences.append(self.word_tokenize(sentence))
+                yield sentences[-1]
+        predictions = self.predict(tokenize(), return_confidence = return_confidence)
+        return sentences, predictions
+
+class MicroBatcher:
+    """Micro-Batching of Concurrent Requests with asyncio
+
+    Requests from concurrent callers are queued and merged into one 
+    call to an `InferenceSession`, when either 'max_batch_size' 
+    sentences are waiting or the first request has waited for
+    'max_wait' seconds. Results are routed back to every caller. 
+    The forward pass runs in a thread, so new requests are queued
+    while a batch is computed.
+
+    Attributes:
+        session (InferenceSession): session computing predictions.
+        max_batch_size (int): maximum number of sentences per batch.
+            A single larger request is computed on its own.
+        max_wait (float): maximum time in seconds to wait for more
+            requests.
+        max_queue_size (int): maximum number of queued requests. 
+            Further requests are rejected with `asyncio.QueueFull`.
+            0 means no limit.
+        stats (dict): number of requests, rejected requests, 
+            sentences and batches.
+    """
+    def __init__(self,
+                 session: InferenceSession,
+                 max_batch_size: int = 32,
+                 max_wait: float = 0.005,
+                 max_queue_size: int = 0) -> None:
+        """Initialize MicroBatcher
+
+        Args:
+            session (InferenceSession): session computing predictions.
+            max_batch_size (int, optional): maximum number of sentences
+                per batch. Defaults to 32.
+            max_wait (float, optional): maximum time in seconds to
+                wait for more requests. Defaults to 0.005.
+            max_queue_size (int, optional): maximum number of queued 
+                requests. Defaults to 0, i.e. no limit.
+        """
+        self.session = session
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue_size = max_queue_size
+        self.stats = {'requests': 0, 'rejected': 0, 'sentences': 0, 'batches': 0}
+        self.loop = None
+        self.queue = None
+        self.worker = None
+        self.pending = None
+
+    def _start(self) -> None:
+        """Start Worker in Running Event Loop"""
+        loop = asyncio.get_event_loop()
+        if self.loop is not loop or self.worker.done():
+            self.loop = loop
+            self.queue = asyncio.Queue(maxsize = self.max_queue_size)
+            self.pending = None
+            self.worker = loop.create_task(self._work())
+
+    async def _next_batch(self) -> list:
+        """Collect Requests for Next Batch"""
+        if self.pending is not None:
+            requests, self.pending = [self.pending], None
+        else:
+            requests = [await self.queue.get()]
+        n = len(requests[0][0])
+        deadline = self.loop.time() + self.max_wait
+        while n < self.max_batch_size:
+            timeout = deadline - self.loop.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if n + len(request[0]) > self.max_batch_size:
+                # keep request for the next batch.
+                self.pending = request
+                break
+            requests.append(request)
+            n += len(request[0])
+        # skip requests, whose callers have gone away.
+        return [request for request in requests if not request[1].done()]
+
+    async def _work(self) -> None:
+        """Compute Batches of Requests until Cancelled"""
+        while True:
+            requests = await self._next_batch()
+            if not requests:
+                continue
+            sentences = [sentence for request, _ in requests for sentence in request]
+            self.stats['sentences'] += len(sentences)
+            self.stats['batches'] += 1
+            try:
+                predictions, probabilities = await self.loop.run_in_executor(None, partial(self.session.predict, 
+                                                                                           sentences, 
+                                                                                           return_confidence = True))
+            except Exception as e:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            start = 0
+            for request, future in requests:
+                end = start + len(request)
+                if not future.done():
+                    future.set_result((predictions[start:end], probabilities[start:end]))
+                start = end
+
+    async def predict(self,
+                      sentences: List[List[str]],
+                      return_confidence: bool = False) -> list:
+        """Predict Named Entities in Word-Tokenized Sentences
+
+        Args:
+            sentences (List[List[str]]): word-tokenized sentences.
+            return_confidence (bool, optional): if True, return
+                confidence scores for all predicted tokens. Defaults
+                to False.
+
+        Returns:
+            list: Predicted tags for sentences (and confidence scores).
+
+        Raises:
+            asyncio.QueueFull: if 'max_queue_size' requests are queued
+                already.
+        """
+        self._start()
+        future = self.loop.create_future()
+        try:
+            self.queue.put_nowait((sentences, future))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            raise
+        self.stats['requests'] += 1
+        predictions, probabilities = await future
+        if return_confidence:
+            return predictions, probabilities
+        return predictions
+
+    async def predict_text(self,
+                           text: str,
+                           return_confidence: bool = False) -> tuple:
+        """Predict Named Entities in a Text
+
+        Args:
+            text (str): text to predict entities in.
+            return_confidence (bool, optional): if True, return
+                confidence scores for all predicted tokens. Defaults
+                to False.
+
+        Returns:
+            tuple: word-tokenized sentences and predicted
+            tags/entities.
+        """
+        assert isinstance(text, str), "'text' must be a string."
+        # split in executor, so the event loop keeps batching requests.
+        sentences = await asyncio.get_running_loop().run_in_executor(None, self._split_text, text)
+        return sentences, await self.predict(sentences, return_confidence = return_confidence)
+
+    def _split_text(self, text: str) -> List[List[str]]:
+        return [self.session.word_tokenize(sentence) for sentence in self.session.sent_tokenize(text)]
+
+    async def close(self) -> None:
+        """Stop Worker"""
+        if self.worker is not None and not self.worker.done():
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+
+# session of worker process in InferencePool.
+_session = None
+
+def _init_worker(session_kwargs: dict, core_sets: list, counter: object) -> None:
+    """Initialize Worker Process of InferencePool
+
+    Pins the worker to its subset of cores and creates its session.
+    Workers replacing dead workers are pinned to all cores of the pool.
+    """
+    global _session
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    worker_cores = core_sets[index] if index < len(core_sets) else set().union(*core_sets)
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, worker_cores)
+    torch.set_num_threads(len(core_sets[index % len(core_sets)]))
+    _session = InferenceSession(**session_kwargs)
+
+def _predict_chunk(sentences: list) -> tuple:
+    return _session.predict(sentences, return_confidence = True)
+
+def _predict_text_chunk(sentences: list) -> tuple:
+    sentences = [_session.word_tokenize(sentence) for sentence in sentences]
+    return sentences, _session.predict(sentences, return_confidence = True)
+
+class InferencePool:
+    """Pool of CPU Processes for Predictions
+
+    The parameters of the network are moved to shared memory before
+    the worker processes are started, so all workers share one copy
+    of the weights. Every worker is pinned to a subset of the cores 
+    with a matching number of torch threads and holds its own
+    `InferenceSession`. Inputs are split into chunks, that are
+    tokenized and predicted by the workers, and results are merged
+    in the original order.
+
+    Attributes:
+        n_workers (int): number of worker processes.
+        chunk_size (int): number of sentences per chunk.
+    """
+    def __init__(self,
+                 n_workers: int = None,
+                 chunk_size: int = 64,
+                 start_method: str = None,
+                 sent_tokenize: Callable = sent_tokenize,
+                 **kwargs) -> None:
+        """Initialize InferencePool
+
+        Args:
+            n_workers (int, optional): number of worker processes. 
+                Defaults to None, i.e. one for every available core.
+            chunk_size (int, optional): number of sentences per chunk
+                sent to a worker. Defaults to 64.
+            start_method (str, optional): start method for worker 
+                processes. Defaults to None, i.e. 'fork' if available, 
+                otherwise 'spawn'.
+            sent_tokenize (Callable, optional): function for sentence
+                tokenization. Defaults to `nltk.sent_tokenize`.
+            kwargs: all arguments for `InferenceSession`, including
+                'network'. Functions for tokenization must be picklable
+                unless the start method is 'fork'.
+        """
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+        if n_workers is None:
+            n_workers = len(cores)
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+        self.sent_tokenize = sent_tokenize
+
+        network = kwargs.get('network')
+        network.eval()
+        network.share_memory()
+
+        if start_method is None:
+            start_method = 'fork' if 'fork' in torch.multiprocessing.get_all_start_methods() else 'spawn'
+        context = torch.multiprocessing.get_context(start_method)
+        core_sets = [set(worker_cores.tolist()) 
+                     for worker_cores in np.array_split(cores, min(n_workers, len(cores))) * (n_workers // len(cores) + 1)]
+        # workers take their cores in order of start.
+        counter = context.Value('i', 0)
+        self.pool = context.Pool(processes = n_workers,
+                                 initializer = _init_worker,
+                                 initargs = (kwargs, core_sets[:n_workers], counter))
+
+    def _chunks(self, values: list) -> list:
+        return [values[start:start + self.chunk_size] for start in range(0, len(values), self.chunk_size)]
+
+    def predict(self,
+                sentences: List[List[str]],
+                return_confidence: bool = False) -> list:
+        """Predict Named Entities in Word-Tokenized Sentences
+
+        Args:
+            sentences (List[List[str]]): word-tokenized sentences.
+            return_confidence (bool, optional): if True, return
+                confidence scores for all predicted tokens. Defaults
+                to False.
+
+        Returns:
+            list: Predicted tags for sentences (and confidence scores).
+        """
+        results = self.pool.map(_predict_chunk, self._chunks(sentences))
+        predictions = [p for chunk_predictions, _ in results for p in chunk_predictions]
+        if return_confidence:
+            return predictions, [p for _, chunk_probabilities in results for p in chunk_probabilities]
+        return predictions
+
+    def predict_text(self,
+                     text: str,
+                     return_confidence: bool = False) -> tuple:
+        """Predict Named Entities in a Text
+
+        The text is split into sentences by the main process, and
+        the sentences are word-tokenized and predicted by the workers.
+
+        Args:
+            text (str): text to predict entities in.
+            return_confidence (bool, optional): if True, return
+                confidence scores for all predicted tokens. Defaults
+                to False.
+
+        Returns:
+            tuple: word-tokenized sentences and predicted
+            tags/entities.
+        """
+        assert isinstance(text, str), "'text' must be a string."
+        results = self.pool.map(_predict_text_chunk, self._chunks(self.sent_tokenize(text)))
+        sentences = [s for chunk_sentences, _ in results for s in chunk_sentences]
+        predictions = [p for _, (chunk_predictions, _) in results for p in chunk_predictions]
+        if return_confidence:
+            return sentences, (predictions, [p for _, (_, chunk_probabilities) in results for p in chunk_probabilities])
+        return sentences, predictions
+
+    def close(self) -> None:
+        """Stop Worker Processes"""
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self) -> 'InferencePool':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -9,20 +9,30 @@ The interface enables you to easily
 - evaluate it
 - use it to predict entities in new texts.
 """
+from NERDA.backends import OnnxNetwork, export_onnx, quantize_onnx_static
+from NERDA.cache import PredictionCache, model_fingerprint
 from NERDA.datasets import get_conll_data
-from NERDA.networks import NERDANetwork
-from NERDA.predictions import predict, predict_text
+from NERDA.distillation import teacher_logits
+from NERDA.networks import EarlyExitNetwork, NERDANetwork, OptimizedNetwork, optimize_network
+from NERDA.predictions import create_prediction_dataloader, download_punkt, predict, predict_text, predict_texts, predict_iter, predict_text_iter, split_by_text
+from NERDA.inference import InferencePool, InferenceSession, MicroBatcher
 from NERDA.performance import compute_f1_scores, flatten
+from NERDA.preprocessing import create_dataloader
+from NERDA.pruning import prune_network, restore_pruning
+from NERDA.splitters import split_texts
 from NERDA.training import train_model
 import pandas as pd
 import numpy as np
 import torch
 import os
 import sys
+import time
+import warnings
 import sklearn.preprocessing
 from sklearn.metrics import accuracy_score
 from transformers import AutoModel, AutoTokenizer, AutoConfig
-from typing import List
+from typing import List, Iterable, Iterator
+from nltk.tokenize import sent_tokenize, word_tokenize
 
 class NERDA:
     """NERDA model
@@ -105,7 +115,9 @@ class NERDA:
                                           'learning_rate': 0.0001},
                  tokenizer_parameters: dict = {'do_lower_case' : True},
                  validation_batch_size: int = 8,
-                 num_workers: int = 1) -> None:
+                 num_workers: int = 1,
+                 cache_dir: str = None,
+                 stride: int = None) -> None:
         """Initialize NERDA model
 
         Args:
@@ -122,7 +134,13 @@ class NERDA:
                 of 'sentences': word-tokenized sentences and 'tags': corresponding 
                 NER tags. You can look at examples of, how the dataset should 
                 look like by invoking functions get_dane_data() or get_conll_data().
-                Defaults to None, in which case the English CoNLL-2003 data set is used. 
+                Data sets, that do not fit in memory, can be streamed with 'shards': 
+                an iterable of (or function returning) shards, that are tuples with 
+                (sentences, tags) or dicts with 'sentences' and 'tags'. Declare the 
+                total number of sentences with 'n_sentences', unless shards are a 
+                list, in which case it is estimated from the first shard. Set 'shuffle_buffer' in hyperparameters to shuffle 
+                sentences across shards. Defaults to None, in which case the English 
+                CoNLL-2003 data set is used. 
             dataset_validation (dict, optional): the validation data. Must consist
                 of 'sentences': word-tokenized sentences and 'tags': corresponding 
                 NER tags. You can look at examples of, how the dataset should 
@@ -142,12 +160,26 @@ class NERDA:
             dropout (float, optional): dropout probability. Defaults to 0.1.
             hyperparameters (dict, optional): Hyperparameters for the model. Defaults
                 to {'epochs' : 3, 'warmup_steps' : 500, 'train_batch_size': 16, 
-                'learning_rate': 0.0001}.
+                'learning_rate': 0.0001}. Set 'length_bucketing': True to batch 
+                sentences of similar length together and/or 'max_tokens' to limit 
+                batches by a token budget instead of 'train_batch_size'. Set 
+                'packing': True to pack consecutive sentences into sequences of
+                up to max_len tokens.
             tokenizer_parameters (dict, optional): parameters for the transformer 
                 tokenizer. Defaults to {'do_lower_case' : True}.
             validation_batch_size (int, optional): batch size for validation. Defaults
                 to 8.
             num_workers (int, optional): number of workers for data loader.
+            cache_dir (str, optional): directory for caching tokenized features
+                of the training and validation data and of data sets passed to
+                `evaluate_performance` on disk. Repeated training runs and
+                evaluations on the same data then skip tokenization. Defaults 
+                to None, in which case features are not cached.
+            stride (int, optional): if provided, sentences exceeding max_len are
+                split into overlapping windows sharing 'stride' wordpieces for
+                training and predictions instead of being truncated. This allows 
+                for lower settings of max_len without dropping any tokens. 
+                Defaults to None, in which case sentences are truncated.
         """
         
         # set device automatically if not provided by user.
@@ -177,10 +209,14 @@ class NERDA:
         self.network.to(self.device)
         self.validation_batch_size = validation_batch_size
         self.num_workers = num_workers
+        self.cache_dir = cache_dir
+        self.stride = stride
+        self.batcher = None
+        self.prediction_cache = None
+        self._fingerprint = None
         self.train_losses = []
         self.valid_loss = np.nan
-        self.quantized = False
-        self.halved = False
+        self.precision = 'fp32'
 
     def train(self) -> str:
         """Train Network
@@ -205,15 +241,98 @@ class NERDA:
                                                         max_len = self.max_len,
                                                         device = self.device,
                                                         num_workers = self.num_workers,
+                                                        cache_dir = self.cache_dir,
+                                                        stride = self.stride,
                                                         **self.hyperparameters)
         
         # attach as attributes to class
         setattr(self, "network", network)
         setattr(self, "train_losses", train_losses)
         setattr(self, "valid_loss", valid_loss)
+        self._fingerprint = None
 
         return "Model trained successfully"
 
+    def distill(self, 
+                teacher, 
+                unlabeled_sentences: List[List[str]] = None, 
+                alpha: float = 0.5, 
+                temperature: float = 2.0,
+                cache_dir: str = None,
+                **kwargs) -> str:
+        """Train Network by Knowledge Distillation
+
+        Trains the network (student) with soft targets computed by a
+        (larger) fine-tuned teacher model on the training data and on
+        unlabeled sentences. The loss combines the cross-entropy with 
+        the tags of the training data and the Kullback-Leibler 
+        divergence from the soft targets. Teacher and student can use
+        different transformers, but must have the same tag scheme.
+        The result is a normal NERDA model, that can be saved with
+        `save_network`. Soft targets can not be split into windows, so
+        the student must not be configured with 'stride'.
+
+        Args:
+            teacher (NERDA): fine-tuned teacher model, e.g. a 
+                precooked model with a larger transformer.
+            unlabeled_sentences (List[List[str]], optional): 
+                additional word-tokenized sentences without tags. 
+                Defaults to None.
+            alpha (float, optional): weight of the cross-entropy with 
+                the tags. The divergence from the soft targets is 
+                weighted by 1 - alpha. Defaults to 0.5.
+            temperature (float, optional): temperature for softening 
+                distributions of teacher and student. Defaults to 2.0.
+            cache_dir (str, optional): directory for caching soft 
+                targets on disk, so they are computed only once. 
+                Defaults to None, in which case the 'cache_dir' of
+                the model is used.
+            kwargs: hyperparameters replacing those of the model, e.g.
+                'epochs' and 'learning_rate'.
+
+        Returns:
+            str: a message saying if the model was trained succesfully.
+            The network is trained and training losses and validation
+            loss are saved as side-effects like with `train`.
+        """
+        assert list(teacher.tag_encoder.classes_) == list(self.tag_encoder.classes_), "Teacher and student must have the same tag scheme"
+        assert 'shards' not in self.dataset_training, "Distillation does not support streaming data sets"
+        assert self.stride is None, "Distillation does not support windows, set 'stride' to None"
+        unlabeled_sentences = unlabeled_sentences or []
+        sentences = list(self.dataset_training.get('sentences')) + list(unlabeled_sentences)
+        tags = list(self.dataset_training.get('tags')) + [[self.tag_outside] * len(sentence) for sentence in unlabeled_sentences]
+        dataset_training = {'sentences': sentences,
+                            'tags': tags,
+                            'soft_targets': teacher_logits(teacher, 
+                                                           sentences, 
+                                                           batch_size = self.validation_batch_size, 
+                                                           cache_dir = cache_dir or self.cache_dir),
+                            'labeled': [True] * len(self.dataset_training.get('sentences')) + [False] * len(unlabeled_sentences)}
+
+        hyperparameters = {**self.hyperparameters, **kwargs}
+        hyperparameters.update(distillation_alpha = alpha, distillation_temperature = temperature)
+        assert not hyperparameters.get('packing'), "Distillation does not support packing"
+        network, train_losses, valid_loss = train_model(network = self.network,
+                                                        tag_encoder = self.tag_encoder,
+                                                        tag_outside = self.tag_outside,
+                                                        transformer_tokenizer = self.transformer_tokenizer,
+                                                        transformer_config = self.transformer_config,
+                                                        dataset_training = dataset_training,
+                                                        dataset_validation = self.dataset_validation,
+                                                        validation_batch_size = self.validation_batch_size,
+                                                        max_len = self.max_len,
+                                                        device = self.device,
+                                                        num_workers = self.num_workers,
+                                                        cache_dir = self.cache_dir,
+                                                        **hyperparameters)
+        
+        self.network = network
+        self.train_losses = train_losses
+        self.valid_loss = valid_loss
+        self._fingerprint = None
+
+        return "Model distilled successfully"
+
     def load_network_from_file(self, model_path = "model.bin") -> str:
         """Load Pretrained NERDA Network from file
 
@@ -229,10 +348,75 @@ class NERDA:
         """
         # TODO: change assert to Raise.
         assert os.path.exists(model_path), "File does not exist. You can download network with download_network()"
-        self.network.load_state_dict(torch.load(model_path, map_location = torch.device(self.device)))
+        state_dict = torch.load(model_path, map_location = torch.device(self.device))
+        if 'pruned_heads' in state_dict and not hasattr(self.network, 'pruned_heads'):
+            # network has been pruned before saving.
+            restore_pruning(self.network, state_dict)
+        self.network.load_state_dict(state_dict)
         self.network.device = self.device
+        self._fingerprint = None
         return f'Weights for network loaded from {model_path}'
 
+    def prune(self, 
+              head_sparsity: float = 0.25, 
+              ffn_sparsity: float = 0.25, 
+              dataset: dict = None, 
+              fine_tune: bool = False,
+              **kwargs) -> dict:
+        """Prune Attention Heads and FFN Neurons
+
+        Scores attention heads and neurons of the feed-forward layers 
+        of the transformer on a data set and removes the lowest 
+        scoring ones physically, so the network needs less memory and
+        computes predictions faster, see `NERDA.pruning`. Pruned 
+        networks are saved with `save_network` and restored by 
+        `load_network_from_file`.
+
+        Args:
+            head_sparsity (float, optional): share of attention heads 
+                to remove. Heads can only be pruned once. Defaults to 
+                0.25.
+            ffn_sparsity (float, optional): share of (remaining) FFN 
+                neurons to remove. Defaults to 0.25.
+            dataset (dict, optional): data set with 'sentences' and 
+                'tags' for scoring. Defaults to None, in which case the
+                validation data is used.
+            fine_tune (bool, optional): if True, fine-tune the pruned 
+                network with `train`. Defaults to False.
+            kwargs: hyperparameters replacing those of the model for 
+                fine-tuning, e.g. 'epochs'.
+
+        Returns:
+            dict: numbers of parameters, heads and FFN neurons before 
+            and after pruning.
+        """
+        assert isinstance(self.network, NERDANetwork), "Pruning requires a NERDANetwork"
+        assert self.precision == 'fp32', "Prune network in full precision"
+        dataset = dataset or self.dataset_validation
+        dl = create_dataloader(sentences = dataset.get('sentences'),
+                               tags = dataset.get('tags'),
+                               transformer_tokenizer = self.transformer_tokenizer,
+                               transformer_config = self.transformer_config,
+                               max_len = self.max_len,
+                               batch_size = self.validation_batch_size,
+                               tag_encoder = self.tag_encoder,
+                               tag_outside = self.tag_outside,
+                               num_workers = 0)
+        report = prune_network(self.network, 
+                               dl, 
+                               n_tags = len(self.tag_encoder.classes_), 
+                               head_sparsity = head_sparsity, 
+                               ffn_sparsity = ffn_sparsity)
+        self._fingerprint = None
+        if fine_tune:
+            hyperparameters = self.hyperparameters
+            self.hyperparameters = {**hyperparameters, **kwargs}
+            try:
+                self.train()
+            finally:
+                self.hyperparameters = hyperparameters
+        return report
+
     def save_network(self, model_path:str = "model.bin") -> None:
         """Save Weights of NERDA Network
 
@@ -248,10 +432,64 @@ class NERDA:
         torch.save(self.network.state_dict(), model_path)
         print(f"Network written to file {model_path}")
 
+    @property
+    def quantized(self) -> bool:
+        """True, if network is quantized to int8"""
+        return self.precision in ['int8-dynamic', 'int8-static']
+
+    @property
+    def halved(self) -> bool:
+        """True, if network is converted to float16"""
+        return self.precision == 'fp16'
+
+    def set_precision(self, precision: str = 'fp32') -> None:
+        """Set Numerical Precision for Inference
+
+        Precisions:
+            'fp32': full precision.
+            'bf16-autocast': transformer runs under autocast with 
+                bfloat16, that is supported by CPU kernels. The 
+                classification head and the argmax for predictions
+                run in float32.
+            'fp16': all weights are converted to float16, see `half`.
+            'int8-dynamic': weights of linear layers are quantized
+                dynamically to int8, see `quantize`.
+
+        Static int8 quantization is applied with `quantize_static`.
+        'fp16' and 'int8-dynamic' can only be applied to networks in
+        full precision and can not be reverted. Networks optimized with
+        `optimize` run in full precision only.
+
+        Args:
+            precision (str, optional): precision. Defaults to 'fp32'.
+
+        Returns:
+            Nothing. Changes precision of network as a side-effect.
+        """
+        precisions = ['fp32', 'bf16-autocast', 'fp16', 'int8-dynamic']
+        assert precision in precisions, f"'precision' must be one of {precisions}"
+        if precision == self.precision:
+            return
+        assert self.precision in ['fp32', 'bf16-autocast'], f"Can't change precision from '{self.precision}'"
+        assert not isinstance(self.network, OptimizedNetwork), "Can't change precision of optimized network, compiled backends run in full precision"
+
+        if precision in ['fp32', 'bf16-autocast']:
+            assert hasattr(self.network, 'autocast_dtype'), "Network does not support autocast"
+            self.network.autocast_dtype = torch.bfloat16 if precision == 'bf16-autocast' else None
+        elif precision == 'fp16':
+            self.set_precision('fp32')
+            self.network.half()
+        elif precision == 'int8-dynamic':
+            self.set_precision('fp32')
+            self.network = torch.quantization.quantize_dynamic(
+                self.network, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        self.precision = precision
+
     def quantize(self):
         """Apply dynamic quantization to increase performance.
 
-        Quantization and half precision inference are mutually exclusive.
+        Same as `set_precision('int8-dynamic')`.
 
         Read more: https://pytorch.org/tutorials/recipes/recipes/dynamic_quantization.html
 
@@ -259,17 +497,95 @@ class NERDA:
             Nothing. Applies dynamic quantization to Network as a side-effect.
         """
         assert not (self.quantized), "Dynamic quantization already applied"
-        assert not (self.halved), "Can't run both quantization and half precision"
+        self.set_precision('int8-dynamic')
+
+    def quantize_static(self, 
+                        calibration_data: dict = None,
+                        path: str = 'model-int8.onnx',
+                        evaluation_data: dict = None,
+                        max_f1_drop: float = 0.01,
+                        strict: bool = True,
+                        n_calibration: int = 256,
+                        **kwargs) -> pd.DataFrame:
+        """Apply Static int8 Quantization with Calibration
+
+        Quantizes weights and activations of the network to int8 with
+        onnxruntime. Ranges of activations are calibrated on the 
+        calibration data. Speed and F1 scores of the network before
+        and after quantization are compared with `evaluate_performance`
+        on the evaluation data. Predictions run with onnxruntime 
+        afterwards, see `load_onnx`.
+
+        Args:
+            calibration_data (dict, optional): data set with 'sentences'
+                for calibration, e.g. `get_dane_data('dev')`. Defaults 
+                to None, i.e. the validation data set.
+            path (str, optional): file for quantized network. Defaults
+                to 'model-int8.onnx'.
+            evaluation_data (dict, optional): data set with 'sentences'
+                and 'tags' for evaluation. Defaults to None, i.e. the
+                validation data set.
+            max_f1_drop (float, optional): maximum drop in micro-averaged
+                F1 score. Defaults to 0.01.
+            strict (bool, optional): if True, the quantized network is 
+                refused with a ValueError, if F1 drops by more than 
+                'max_f1_drop'. Otherwise a warning is issued. Defaults
+                to True.
+            n_calibration (int, optional): maximum number of sentences
+                for calibration. Defaults to 256.
+            kwargs: arbitrary keyword arguments for predict. For
+                instance 'batch_size'.
+
+        Returns:
+            pd.DataFrame: micro-averaged F1 score and seconds for
+            evaluation before and after quantization with deltas.
+        """
+        assert self.device == 'cpu', "Static quantization is for CPU only"
+        assert self.precision == 'fp32', "Static quantization must be applied in full precision"
+        calibration_data = calibration_data if calibration_data is not None else self.dataset_validation
+        evaluation_data = evaluation_data if evaluation_data is not None else self.dataset_validation
+
+        dl = create_prediction_dataloader(sentences = calibration_data.get('sentences')[:n_calibration],
+                                          transformer_tokenizer = self.transformer_tokenizer,
+                                          transformer_config = self.transformer_config,
+                                          max_len = self.max_len,
+                                          batch_size = kwargs.get('batch_size', 8),
+                                          tag_encoder = self.tag_encoder,
+                                          tag_outside = self.tag_outside,
+                                          num_workers = 0)
+        quantize_onnx_static(self.network, path, dl)
+
+        network = self.network
+        report = []
+        for precision in ['fp32', 'int8-static']:
+            if precision == 'int8-static':
+                self.network = OnnxNetwork(path)
+            start = time.perf_counter()
+            performance = self.evaluate_performance(evaluation_data, **kwargs)
+            seconds = time.perf_counter() - start
+            f1 = performance.loc[performance['Level'] == 'AVG_MICRO', 'F1-Score'].item()
+            report.append({'Precision': precision, 'F1-Score': f1, 'Seconds': seconds})
+        report = pd.DataFrame(report)
+        report['F1 Delta'] = report['F1-Score'] - report['F1-Score'][0]
+        report['Speedup'] = report['Seconds'][0] / report['Seconds']
 
-        self.network = torch.quantization.quantize_dynamic(
-            self.network, {torch.nn.Linear}, dtype=torch.qint8
-        )
-        self.quantized = True
+        f1_drop = -report['F1 Delta'][1]
+        if f1_drop > max_f1_drop:
+            msg = f'F1 drops by {f1_drop:.4f} with static quantization, more than max_f1_drop = {max_f1_drop}'
+            if strict:
+                self.network = network
+                raise ValueError(msg + '. Network is not quantized.')
+            warnings.warn(msg)
+
+        self.precision = 'int8-static'
+        return report
 
     def half(self):
         """Convert weights from Float32 to Float16 to increase performance
 
-        Quantization and half precision inference are mutually exclusive.
+        Same as `set_precision('fp16')`. Many CPU kernels are slow 
+        or do not support float16, consider `set_precision('bf16-autocast')`
+        on CPU.
 
         Read more: https://pytorch.org/docs/master/generated/torch.nn.Module.html?highlight=half#torch.nn.Module.half
 
@@ -277,10 +593,219 @@ class NERDA:
             Nothing. Model is "halved" as a side-effect.
         """
         assert not (self.halved), "Half precision already applied"
-        assert not (self.quantized), "Can't run both quantization and half precision"
+        self.set_precision('fp16')
+
+    def optimize(self, backend: str = 'torchscript', path: str = None) -> bool:
+        """Optimize Network for Inference
+
+        Traces (TorchScript) or compiles (`torch.compile`) the network
+        for faster predictions with dynamic batch sizes and sequence 
+        lengths. Falls back to the eager network with a warning, if 
+        the transformer can not be traced or compiled. Apply after 
+        training and loading weights. Optimized networks run in full
+        precision, i.e. they can not be combined with `set_precision`.
+
+        Args:
+            backend (str, optional): 'torchscript' or 'compile'. 
+                Defaults to 'torchscript'.
+            path (str, optional): file for traced network. If it exists,
+                the traced network is loaded from it, which skips 
+                tracing on cold starts. Otherwise it is saved to it. 
+                Only for 'torchscript'. Defaults to None.
+
+        Returns:
+            bool: True, if network has been optimized.
+        """
+        assert not isinstance(self.network, OptimizedNetwork), "Network already optimized"
+        assert self.precision == 'fp32', "Optimize network in full precision, compiled backends ignore autocast and quantization"
+        self.network = optimize_network(self.network, backend = backend, path = path)
+        return isinstance(self.network, OptimizedNetwork)
+
+    def export_onnx(self, path: str = 'model.onnx', quantize: bool = False, **kwargs) -> str:
+        """Export Network to ONNX
+
+        Exports the network (logits only) with dynamic batch and 
+        sequence axes, e.g. for predictions with onnxruntime with
+        `load_onnx`.
+
+        Args:
+            path (str, optional): file for exported network. Defaults
+                to 'model.onnx'.
+            quantize (bool, optional): if True, quantize weights to
+                int8 with onnxruntime. Defaults to False.
+            kwargs: arbitrary keyword arguments for 
+                `NERDA.backends.export_onnx`, e.g. 'opset_version'.
+
+        Returns:
+            str: path of exported network.
+        """
+        assert not isinstance(self.network, OnnxNetwork), "Network is an ONNX network already"
+        assert self.precision == 'fp32', "Export network in full precision"
+        return export_onnx(self.network, path, quantize = quantize, **kwargs)
+
+    def load_onnx(self, path: str = 'model.onnx', **kwargs) -> None:
+        """Run Predictions with onnxruntime
+
+        Replaces the network with an exported ONNX network run by
+        onnxruntime on CPU. Predictions are computed as before with
+        `predict`, `predict_text` etc.
+
+        Args:
+            path (str, optional): exported network, see `export_onnx`.
+                Defaults to 'model.onnx'.
+            kwargs: arbitrary keyword arguments for 
+                `NERDA.backends.OnnxNetwork`, e.g. 'optimization_level'
+                and 'num_threads'.
+
+        Returns:
+            Nothing. Replaces network as a side-effect.
+        """
+        assert self.device == 'cpu', "ONNX networks run on CPU only"
+        self.network = OnnxNetwork(path, **kwargs)
+
+    def enable_early_exit(self, exit_layers: List[int] = None) -> EarlyExitNetwork:
+        """Add Early Exits to Network
+
+        Adds classification heads after encoder layers of the 
+        transformer, see `NERDA.networks.EarlyExitNetwork`. Heads are
+        initialized with the weights of the classification layer and
+        should be trained with `train_early_exit`. Enable early exits 
+        before loading weights of a network with early exits from file.
 
-        self.network.half()
-        self.halved = True
+        Args:
+            exit_layers (List[int], optional): numbers of layers 
+                computed before the exits. Defaults to None, i.e. an 
+                exit after every layer.
+
+        Returns:
+            EarlyExitNetwork: network with early exits.
+        """
+        assert isinstance(self.network, NERDANetwork), "Early exits require a NERDANetwork"
+        assert self.precision == 'fp32', "Add early exits in full precision"
+        self.network = EarlyExitNetwork(self.network, exit_layers = exit_layers)
+        return self.network
+
+    def train_early_exit(self, 
+                         exit_layers: List[int] = None, 
+                         freeze_transformer: bool = True, 
+                         **kwargs) -> str:
+        """Train Classification Heads of Early Exits
+
+        Trains all heads on the training data with the average loss
+        of the heads incl. the final classification layer.
+
+        Args:
+            exit_layers (List[int], optional): numbers of layers 
+                computed before the exits, if early exits are not 
+                enabled yet. Defaults to None, i.e. an exit after every 
+                layer.
+            freeze_transformer (bool, optional): if True, only the 
+                heads of the exits are trained and predictions of the 
+                full network are unchanged. Defaults to True.
+            kwargs: hyperparameters replacing those of the model, e.g.
+                'epochs' and 'learning_rate'.
+
+        Returns:
+            str: a message saying if the heads were trained succesfully.
+        """
+        if not isinstance(self.network, EarlyExitNetwork):
+            self.enable_early_exit(exit_layers)
+        network = self.network
+        requires_grad = {name: p.requires_grad for name, p in network.network.named_parameters()}
+        if freeze_transformer:
+            for p in network.network.parameters():
+                p.requires_grad = False
+        network.train_heads = True
+        try:
+            network, _, _ = train_model(network = network,
+                                        tag_encoder = self.tag_encoder,
+                                        tag_outside = self.tag_outside,
+                                        transformer_tokenizer = self.transformer_tokenizer,
+                                        transformer_config = self.transformer_config,
+                                        dataset_training = self.dataset_training,
+                                        dataset_validation = self.dataset_validation,
+                                        validation_batch_size = self.validation_batch_size,
+                                        max_len = self.max_len,
+                                        device = self.device,
+                                        num_workers = self.num_workers,
+                                        cache_dir = self.cache_dir,
+                                        stride = self.stride,
+                                        **{**self.hyperparameters, **kwargs})
+        finally:
+            network.train_heads = False
+            for name, p in network.network.named_parameters():
+                p.requires_grad = requires_grad[name]
+        self.network = network
+        self._fingerprint = None
+        return "Early exits trained successfully"
+
+    def set_early_exit(self, max_layers: int = None, threshold: float = None) -> None:
+        """Set Early Exits for Predictions
+
+        Args:
+            max_layers (int, optional): compute the first 'max_layers' 
+                layers only and predict with the head of that exit. 
+                Defaults to None, i.e. all layers.
+            threshold (float, optional): leave the network at the first
+                exit, where the confidence scores of all tokens of a 
+                batch are at least 'threshold'. Defaults to None, i.e.
+                no early exits by confidence.
+
+        Returns:
+            Nothing. Sets exits of network as a side-effect.
+        """
+        assert isinstance(self.network, EarlyExitNetwork), "Enable early exits first, see enable_early_exit()"
+        self.network.max_layers = max_layers
+        self.network.threshold = threshold
+
+    def evaluate_early_exit(self, 
+                            dataset: dict, 
+                            thresholds: List[float] = [0.9, 0.99], 
+                            **kwargs) -> pd.DataFrame:
+        """Evaluate F1-Score and Latency of Early Exits
+
+        Evaluates predictions with `evaluate_performance` for every
+        exit (incl. all layers) and for early exits by confidence.
+        The prediction cache is bypassed during the evaluation.
+
+        Args:
+            dataset (dict): data set with 'sentences' and 'tags'.
+            thresholds (List[float], optional): confidence thresholds
+                for early exits. Defaults to [0.9, 0.99].
+            kwargs: arbitrary keyword arguments for 
+                `evaluate_performance`, e.g. 'batch_size'.
+
+        Returns:
+            pd.DataFrame: exit, average number of layers computed, 
+            micro-averaged F1-Score, seconds and speedup relative to 
+            all layers for every exit.
+        """
+        assert isinstance(self.network, EarlyExitNetwork), "Enable early exits first, see enable_early_exit()"
+        network = self.network
+        settings = [(k, None) for k in [int(k) for k in network.heads] + [network.n_layers]]
+        settings += [(None, threshold) for threshold in thresholds]
+        max_layers, threshold = network.max_layers, network.threshold
+        # predictions are computed by the exits, not looked up.
+        prediction_cache, self.prediction_cache = self.prediction_cache, None
+        report = []
+        try:
+            for k, t in settings:
+                self.set_early_exit(k, t)
+                network.exits = {}
+                start = time.perf_counter()
+                performance = self.evaluate_performance(dataset, **kwargs)
+                seconds = time.perf_counter() - start
+                n_batches = sum(network.exits.values())
+                report.append({'Exit': f'layer {k}' if t is None else f'confidence {t}',
+                               'Layers': sum(layer * n for layer, n in network.exits.items()) / n_batches,
+                               'F1-Score': performance.loc[performance['Level'] == 'AVG_MICRO', 'F1-Score'].item(),
+                               'Seconds': seconds})
+        finally:
+            self.set_early_exit(max_layers, threshold)
+            self.prediction_cache = prediction_cache
+        report = pd.DataFrame(report)
+        report['Speedup'] = report['Seconds'][len(network.heads)] / report['Seconds']
+        return report
 
     def predict(self, sentences: List[List[str]],
                 return_confidence: bool = False,
@@ -301,6 +826,9 @@ class NERDA:
             List[List[str]]: Predicted tags for sentences - one
             predicted tag/entity per word token.
         """
+        kwargs.setdefault('stride', self.stride)
+        if self.prediction_cache is not None and not kwargs.get('return_tensors'):
+            return self._predict_cached(sentences, return_confidence, **kwargs)
         return predict(network = self.network, 
                        sentences = sentences,
                        transformer_tokenizer = self.transformer_tokenizer,
@@ -328,6 +856,14 @@ class NERDA:
             tuple: word-tokenized sentences and predicted 
             tags/entities.
         """
+        kwargs.setdefault('stride', self.stride)
+        if self.prediction_cache is not None and not kwargs.get('return_tensors'):
+            assert isinstance(text, str), "'text' must be a string."
+            split_sentences = kwargs.pop('sent_tokenize', sent_tokenize)
+            split_words = kwargs.pop('word_tokenize', word_tokenize)
+            download_punkt(split_sentences, split_words)
+            sentences = [split_words(sentence) for sentence in split_sentences(text)]
+            return sentences, self.predict(sentences, return_confidence = return_confidence, **kwargs)
         return predict_text(network = self.network, 
                             text = text,
                             transformer_tokenizer = self.transformer_tokenizer,
@@ -339,6 +875,323 @@ class NERDA:
                             return_confidence=return_confidence,
                             **kwargs)
 
+    def predict_texts(self, texts: List[str], 
+                      return_confidence: bool = False, **kwargs) -> list:
+        """Predict Named Entities in Multiple Texts
+
+        Sentences of all texts are pooled into one stream of batches 
+        of sentences of similar length, so short texts do not run 
+        under-filled batches. 
+
+        Args:
+            texts (List[str]): texts to predict entities in.
+            return_confidence (bool, optional): if True, return
+                confidence scores for all predicted tokens. Defaults
+                to False.
+            kwargs: arbitrary keyword arguments. For instance
+                'batch_size', 'max_tokens', 'sent_tokenize', 
+                'word_tokenize' and 'split_workers' for splitting
+                texts in worker processes.
+
+        Returns:
+            list: word-tokenized sentences and predicted tags/entities
+            for every text, the same as `predict_text` for every text.
+        """
+        kwargs.setdefault('stride', self.stride)
+        if self.prediction_cache is not None:
+            assert not isinstance(texts, str), "'texts' must be a list of strings."
+            split_sentences = kwargs.pop('sent_tokenize', sent_tokenize)
+            split_words = kwargs.pop('word_tokenize', word_tokenize)
+            download_punkt(split_sentences, split_words)
+            sentences_by_text = split_texts(texts, 
+                                            sent_tokenize = split_sentences, 
+                                            word_tokenize = split_words, 
+                                            n_workers = kwargs.pop('split_workers', None))
+            kwargs.setdefault('length_bucketing', True)
+            predictions = self.predict([sentence for sentences in sentences_by_text for sentence in sentences], 
+                                       return_confidence = return_confidence, 
+                                       **kwargs)
+            return split_by_text(sentences_by_text, predictions, return_confidence)
+        return predict_texts(network = self.network, 
+                             texts = texts,
+                             transformer_tokenizer = self.transformer_tokenizer,
+                             transformer_config = self.transformer_config,
+                             max_len = self.max_len,
+                             device = self.device,
+                             tag_encoder = self.tag_encoder,
+                             tag_outside = self.tag_outside,
+                             return_confidence = return_confidence,
+                             **kwargs)
+
+    def enable_prediction_cache(self, max_size: int = 100000, cache_dir: str = None) -> PredictionCache:
+        """Cache Predictions of Sentences
+
+        Predictions of `predict` and `predict_text` are cached by 
+        sentence, so recurring sentences, e.g. bylines and recurring
+        headlines, are only computed once. Sentences not found in the
+        cache are predicted together and results are returned in the
+        original order. Keys include a fingerprint of the weights,
+        max_len, stride, the tag scheme and the precision, that is
+        updated when the network is trained, loaded or converted.
+
+        Args:
+            max_size (int, optional): maximum number of sentences in
+                memory. Least recently used sentences are evicted first.
+                Defaults to 100000.
+            cache_dir (str, optional): directory for a persistent
+                cache on disk, that is looked up for sentences not in
+                memory. Defaults to None.
+
+        Returns:
+            PredictionCache: cache with hit and miss counters, see 
+            `PredictionCache.stats`.
+        """
+        self.prediction_cache = PredictionCache(max_size = max_size, cache_dir = cache_dir)
+        return self.prediction_cache
+
+    def _predict_cached(self, sentences: List[List[str]], return_confidence: bool = False, **kwargs):
+        # weights are only hashed again, when the network may have changed.
+        state = (self.network, self.precision, self.max_len, kwargs.get('stride'),
+                 getattr(self.network, 'max_layers', None), getattr(self.network, 'threshold', None))
+        if self._fingerprint is None or self._fingerprint[0] != state:
+            fingerprint = model_fingerprint(network = self.network,
+                                            transformer_tokenizer = self.transformer_tokenizer,
+                                            max_len = self.max_len,
+                                            tag_encoder = self.tag_encoder,
+                                            tag_outside = self.tag_outside,
+                                            stride = kwargs.get('stride'),
+                                            precision = self.precision)
+            self._fingerprint = (state, fingerprint)
+        
+        keys = [PredictionCache.key(self._fingerprint[1], sentence) for sentence in sentences]
+        values = self.prediction_cache.get(keys)
+        # recurring sentences are only predicted once.
+        missing = {}
+        for key, sentence, value in zip(keys, sentences, values):
+            if value is None:
+                missing.setdefault(key, sentence)
+        if missing:
+            tags, confidences = predict(network = self.network, 
+                                        sentences = list(missing.values()),
+                                        transformer_tokenizer = self.transformer_tokenizer,
+                                        transformer_config = self.transformer_config,
+                                        max_len = self.max_len,
+                                        device = self.device,
+                                        tag_encoder = self.tag_encoder,
+                                        tag_outside = self.tag_outside,
+                                        return_confidence = True,
+                                        **kwargs)
+            predictions = {key: (list(t), [float(c) for c in conf]) for key, t, conf in zip(missing, tags, confidences)}
+            self.prediction_cache.put(predictions)
+            values = [predictions[key] if value is None else value for key, value in zip(keys, values)]
+
+        tags = [list(value[0]) for value in values]
+        if return_confidence:
+            return tags, [list(value[1]) for value in values]
+        return tags
+
+    def predict_iter(self, sentences: Iterable[List[str]],
+                     return_confidence: bool = False,
+                     **kwargs) -> Iterator[tuple]:
+        """Predict Named Entities Iteratively
+
+        Predicts any iterable of word-tokenized sentences, e.g. a
+        generator reading from a file, chunk by chunk with bounded
+        memory.
+
+        Args:
+            sentences (Iterable[List[str]]): word-tokenized sentences.
+            return_confidence (bool, optional): if True, return
+                confidence scores for all predicted tokens. Defaults
+                to False.
+            kwargs: arbitrary keyword arguments. For instance
+                'batch_size', 'chunk_size' and 'num_workers'.
+
+        Yields:
+            tuple: index of sentence and predicted tags (and 
+            confidence scores).
+        """
+        kwargs.setdefault('stride', self.stride)
+        return predict_iter(network = self.network, 
+                            sentences = sentences,
+                            transformer_tokenizer = self.transformer_tokenizer,
+                            transformer_config = self.transformer_config,
+                            max_len = self.max_len,
+                            device = self.device,
+                            tag_encoder = self.tag_encoder,
+                            tag_outside = self.tag_outside,
+                            return_confidence = return_confidence,
+                            **kwargs)
+
+    def predict_text_iter(self, text: str, 
+                          return_confidence: bool = False, 
+                          **kwargs) -> Iterator[tuple]:
+        """Predict Named Entities in a Text Iteratively
+
+        Args:
+            text (str): text to predict entities in.
+            return_confidence (bool, optional): if True, return
+                confidence scores for all predicted tokens. Defaults
+                to False.
+            kwargs: arbitrary keyword arguments. For instance
+                'batch_size', 'chunk_size' and 'num_workers'.
+
+        Yields:
+            tuple: index of sentence, word-tokenized sentence and
+            predicted tags (and confidence scores).
+        """
+        kwargs.setdefault('stride', self.stride)
+        return predict_text_iter(network = self.network, 
+                                 text = text,
+                                 transformer_tokenizer = self.transformer_tokenizer,
+                                 transformer_config = self.transformer_config,
+                                 max_len = self.max_len,
+                                 device = self.device,
+                                 tag_encoder = self.tag_encoder,
+                                 tag_outside = self.tag_outside,
+                                 return_confidence = return_confidence,
+                                 **kwargs)
+
+    def compile_for_inference(self, **kwargs) -> InferenceSession:
+        """Create Session for Repeated Predictions
+
+        Does the setup for predictions once, i.e. the network is set
+        to evaluation mode, buffers are allocated and warmed up. The
+        session predicts without a data loader or downloads, which 
+        reduces the latency for small inputs, e.g. a single text.
+
+        Args:
+            kwargs: arbitrary keyword arguments for `InferenceSession`. 
+                For instance 'batch_size', 'sent_tokenize' and 
+                'word_tokenize'.
+
+        Returns:
+            InferenceSession: session with `predict` and `predict_text`
+            methods.
+
+        Examples:
+            >>> session = model.compile_for_inference(batch_size = 16)
+            >>> session.predict_text('Jens Hansen har en bondegård')
+        """
+        kwargs.setdefault('stride', self.stride)
+        return InferenceSession(network = self.network,
+                                transformer_tokenizer = self.transformer_tokenizer,
+                                transformer_config = self.transformer_config,
+                                max_len = self.max_len,
+                                device = self.device,
+                                tag_encoder = self.tag_encoder,
+                                tag_outside = self.tag_outside,
+                                **kwargs)
+
+    def inference_pool(self, n_workers: int = None, **kwargs) -> InferencePool:
+        """Create Pool of CPU Processes for Predictions
+
+        The weights of the network are shared by all worker processes,
+        so memory stays close to one model, while tokenization and
+        inference are spread over the cores.
+
+        Args:
+            n_workers (int, optional): number of worker processes. 
+                Defaults to None, i.e. one for every available core.
+            kwargs: arbitrary keyword arguments for `InferencePool` and
+                `InferenceSession`. For instance 'chunk_size', 
+                'batch_size', 'sent_tokenize' and 'word_tokenize'.
+
+        Returns:
+            InferencePool: pool with `predict` and `predict_text` 
+            methods. Close it with `close()` or use it as a context
+            manager.
+
+        Examples:
+            >>> with model.inference_pool(n_workers = 4) as pool:
+            >>>     pool.predict_text(text)
+        """
+        assert self.device == 'cpu', "Inference pools are for CPU only"
+        kwargs.setdefault('stride', self.stride)
+        return InferencePool(n_workers = n_workers,
+                             network = self.network,
+                             transformer_tokenizer = self.transformer_tokenizer,
+                             transformer_config = self.transformer_config,
+                             max_len = self.max_len,
+                             device = self.device,
+                             tag_encoder = self.tag_encoder,
+                             tag_outside = self.tag_outside,
+                             **kwargs)
+
+    def micro_batcher(self, 
+                      max_batch_size: int = 32, 
+                      max_wait: float = 0.005, 
+                      max_queue_size: int = 0,
+                      **kwargs) -> MicroBatcher:
+        """Set Up Micro-Batching for Concurrent Requests
+
+        Creates the `MicroBatcher` used by `apredict` and 
+        `apredict_text`. Concurrent requests are merged into one 
+        forward pass with up to 'max_batch_size' sentences, waiting
+        at most 'max_wait' seconds for more requests.
+
+        Args:
+            max_batch_size (int, optional): maximum number of sentences
+                per batch. Defaults to 32.
+            max_wait (float, optional): maximum time in seconds to 
+                wait for more requests. Defaults to 0.005.
+            max_queue_size (int, optional): maximum number of queued
+                requests. Defaults to 0, i.e. no limit.
+            kwargs: arbitrary keyword arguments for `InferenceSession`.
+                For instance 'sent_tokenize' and 'word_tokenize'.
+
+        Returns:
+            MicroBatcher: micro batcher.
+        """
+        session = self.compile_for_inference(batch_size = max_batch_size, **kwargs)
+        self.batcher = MicroBatcher(session, 
+                                    max_batch_size = max_batch_size, 
+                                    max_wait = max_wait,
+                                    max_queue_size = max_queue_size)
+        return self.batcher
+
+    async def apredict(self, sentences: List[List[str]],
+                       return_confidence: bool = False) -> List[List[str]]:
+        """Predict Named Entities in Word-Tokenized Sentences with asyncio
+
+        Concurrent calls are merged into shared forward passes, see
+        `micro_batcher`.
+
+        Args:
+            sentences (List[List[str]]): word-tokenized sentences.
+            return_confidence (bool, optional): if True, return
+                confidence scores for all predicted tokens. Defaults
+                to False.
+
+        Returns:
+            List[List[str]]: Predicted tags for sentences.
+        """
+        batcher = self.batcher or self.micro_batcher()
+        return await batcher.predict(sentences, return_confidence = return_confidence)
+
+    async def apredict_text(self, text: str,
+                            return_confidence: bool = False) -> tuple:
+        """Predict Named Entities in a Text with asyncio
+
+        Concurrent calls are merged into shared forward passes, see
+        `micro_batcher`.
+
+        Args:
+            text (str): text to predict entities in.
+            return_confidence (bool, optional): if True, return
+                confidence scores for all predicted tokens. Defaults
+                to False.
+
+        Returns:
+            tuple: word-tokenized sentences and predicted 
+            tags/entities.
+
+        Examples:
+            >>> await model.apredict_text('Jens Hansen har en bondegård')
+        """
+        batcher = self.batcher or self.micro_batcher()
+        return await batcher.predict_text(text, return_confidence = return_confidence)
+
     def evaluate_performance(self, dataset: dict, 
                              return_accuracy: bool=False,
                              **kwargs) -> pd.DataFrame:
@@ -365,6 +1218,7 @@ class NERDA:
             True.
         """
         
+        kwargs.setdefault('cache_dir', self.cache_dir)
         tags_predicted = self.predict(dataset.get('sentences'), 
                                       **kwargs)
         
@@ -1,82 +1,366 @@
-"""This section covers `torch` networks for `NERDA`"""
-import torch
-import torch.nn as nn
-from transformers import AutoConfig
-from NERDA.utils import match_kwargs
-
-class NERDANetwork(nn.Module):
-    """A Generic Network for NERDA models.
-
-    The network has an analogous architecture to the models in
-    [Hvingelby et al. 2020](http://www.lrec-conf.org/proceedings/lrec2020/pdf/2020.lrec-1.565.pdf).
-
-    Can be replaced with a custom user-defined network with 
-    the restriction, that it must take the same arguments.
-    """
-
-    def __init__(self, transformer: nn.Module, device: str, n_tags: int, dropout: float = 0.1) -> None:
-        """Initialize a NERDA Network
-
-        Args:
-            transformer (nn.Module): huggingface `torch` transformer.
-            device (str): Computational device.
-            n_tags (int): Number of unique entity tags (incl. outside tag)
-            dropout (float, optional): Dropout probability. Defaults to 0.1.
-        """
-        super(NERDANetwork, self).__init__()
-        
-        # extract transformer name
-        transformer_name = transformer.name_or_path
-        # extract AutoConfig, from which relevant parameters can be extracted.
-        transformer_config = AutoConfig.from_pretrained(transformer_name, output_hidden_states=True)
-
-        self.transformer = transformer
-        self.dropout = nn.Dropout(dropout)
-        self.tags = nn.Linear(transformer_config.hidden_size, n_tags)
-        self.device = device
-
-    # NOTE: 'offsets 'are not used in model as-is, but they are expected as output
-    # down-stream. So _DON'T_ remove! :)
-    def forward(self, 
-                input_ids: torch.Tensor, 
-                masks: torch.Tensor, 
-                token_type_ids: torch.Tensor, 
-                target_tags: torch.Tensor, 
-                offsets: torch.Tensor) -> torch.Tensor:
-        """Model Forward Iteration
-
-        Args:
-            input_ids (torch.Tensor): Input IDs.
-            masks (torch.Tensor): Attention Masks.
-            token_type_ids (torch.Tensor): Token Type IDs.
-            target_tags (torch.Tensor): Target tags. Are not used 
-                in model as-is, but they are expected downstream,
-                so they can not be left out.
-            offsets (torch.Tensor): Offsets to keep track of original
-                words. Are not used in model as-is, but they are 
-                expected as down-stream, so they can not be left out.
-
-        Returns:
-            torch.Tensor: predicted values.
-        """
-
-        # TODO: can be improved with ** and move everything to device in a
-        # single step.
-        transformer_inputs = {
-            'input_ids': input_ids.to(self.device),
-            'attention_mask': masks.to(self.device),
-            'token_type_ids': token_type_ids.to(self.device)
-        }
-        
-        # match args with transformer
-        transformer_inputs = match_kwargs(self.transformer.forward, **transformer_inputs)
-        transformer_outputs = self.transformer(**transformer_inputs)
-
-        # apply drop-out
-        outputs = self.dropout(transformer_outputs[0])
-
-        # outputs for all labels/tags
-        outputs = self.tags(outputs)
-
-        return outputs, transformer_outputs
-
+"""This section covers `torch` networks for `NERDA`"""
+import os
+import warnings
+import torch
+import torch.nn as nn
+from typing import Callable
+from transformers import AutoConfig
+from NERDA.utils import match_kwargs
+
+class NERDANetwork(nn.Module):
+    """A Generic Network for NERDA models.
+
+    The network has an analogous architecture to the models in
+    [Hvingelby et al. 2020](http://www.lrec-conf.org/proceedings/lrec2020/pdf/2020.lrec-1.565.pdf).
+
+    Can be replaced with a custom user-defined network with 
+    the restriction, that it must take the same arguments.
+    """
+
+    def __init__(self, transformer: nn.Module, device: str, n_tags: int, dropout: float = 0.1) -> None:
+        """Initialize a NERDA Network
+
+        Args:
+            transformer (nn.Module): huggingface `torch` transformer.
+            device (str): Computational device.
+            n_tags (int): Number of unique entity tags (incl. outside tag)
+            dropout (float, optional): Dropout probability. Defaults to 0.1.
+        """
+        super(NERDANetwork, self).__init__()
+        
+        # extract transformer name
+        transformer_name = transformer.name_or_path
+        # extract AutoConfig, from which relevant parameters can be extracted.
+        transformer_config = AutoConfig.from_pretrained(transformer_name, output_hidden_states=True)
+
+        self.transformer = transformer
+        self.dropout = nn.Dropout(dropout)
+        self.tags = nn.Linear(transformer_config.hidden_size, n_tags)
+        self.device = device
+        # lower precision for transformer with autocast, e.g. torch.bfloat16.
+        self.autocast_dtype = None
+
+    # NOTE: 'offsets 'are not used in model as-is, but they are expected as output
+    # down-stream. So _DON'T_ remove! :)
+    def forward(self, 
+                input_ids: torch.Tensor, 
+                masks: torch.Tensor, 
+                token_type_ids: torch.Tensor, 
+                target_tags: torch.Tensor, 
+                offsets: torch.Tensor,
+                position_ids: torch.Tensor = None) -> torch.Tensor:
+        """Model Forward Iteration
+
+        Args:
+            input_ids (torch.Tensor): Input IDs.
+            masks (torch.Tensor): Attention Masks.
+            token_type_ids (torch.Tensor): Token Type IDs.
+            target_tags (torch.Tensor): Target tags. Are not used 
+                in model as-is, but they are expected downstream,
+                so they can not be left out.
+            offsets (torch.Tensor): Offsets to keep track of original
+                words. Are not used in model as-is, but they are 
+                expected as down-stream, so they can not be left out.
+            position_ids (torch.Tensor, optional): Position IDs. Only
+                needed for packed sequences. Defaults to None.
+
+        Returns:
+            torch.Tensor: predicted values.
+        """
+
+        # TODO: can be improved with ** and move everything to device in a
+        # single step.
+        transformer_inputs = {
+            'input_ids': input_ids.to(self.device),
+            'attention_mask': masks.to(self.device),
+            'token_type_ids': token_type_ids.to(self.device)
+        }
+        
+        if position_ids is not None:
+            transformer_inputs['position_ids'] = position_ids.to(self.device)
+        
+        # match args with transformer
+        transformer_inputs = match_kwargs(self.transformer.forward, **transformer_inputs)
+        if position_ids is not None and 'position_ids' not in transformer_inputs:
+            raise ValueError("Transformer does not accept 'position_ids' required for packed sequences")
+        autocast_dtype = getattr(self, 'autocast_dtype', None)
+        with torch.autocast(device_type = torch.device(self.device).type, 
+                            dtype = autocast_dtype,
+                            enabled = autocast_dtype is not None):
+            transformer_outputs = self.transformer(**transformer_inputs)
+
+        outputs = transformer_outputs[0]
+        if autocast_dtype is not None:
+            # classification head in full precision.
+            outputs = outputs.float()
+
+        # apply drop-out
+        outputs = self.dropout(outputs)
+
+        # outputs for all labels/tags
+        outputs = self.tags(outputs)
+
+        return outputs, transformer_outputs
+
+
+class LogitsNetwork(nn.Module):
+    """Inference Core of NERDA Network
+
+    Computes the outputs of the classification layer of a
+    `NERDANetwork` from tensor inputs only, i.e. without building
+    dicts or matching arguments, so it can be traced, compiled or
+    exported. Dropout is left out, as it does nothing in inference.
+    """
+    def __init__(self, network: NERDANetwork) -> None:
+        super(LogitsNetwork, self).__init__()
+        self.transformer = network.transformer
+        self.tags = network.tags
+        # match arguments with transformer once.
+        self.accepts_token_type_ids = 'token_type_ids' in match_kwargs(self.transformer.forward, token_type_ids = None)
+
+    def forward(self, 
+                input_ids: torch.Tensor, 
+                attention_mask: torch.Tensor, 
+                token_type_ids: torch.Tensor) -> torch.Tensor:
+        if self.accepts_token_type_ids:
+            transformer_outputs = self.transformer(input_ids = input_ids, 
+                                                   attention_mask = attention_mask, 
+                                                   token_type_ids = token_type_ids, 
+                                                   return_dict = False)
+        else:
+            transformer_outputs = self.transformer(input_ids = input_ids, 
+                                                   attention_mask = attention_mask, 
+                                                   return_dict = False)
+        return self.tags(transformer_outputs[0])
+
+class OptimizedNetwork(nn.Module):
+    """NERDA Network with Compiled Inference Backend
+
+    Wraps a `NERDANetwork` and computes predictions with a traced
+    (TorchScript) or compiled (`torch.compile`) `LogitsNetwork`.
+    Takes the same arguments as `NERDANetwork`. Packed sequences and 
+    training fall back to the original (eager) network, that also
+    holds the weights for saving and loading.
+
+    Attributes:
+        eager (NERDANetwork): original network.
+        core (nn.Module): traced or compiled inference core.
+        backend (str): 'torchscript' or 'compile'.
+    """
+    def __init__(self, eager: NERDANetwork, core: nn.Module, backend: str) -> None:
+        super(OptimizedNetwork, self).__init__()
+        self.eager = eager
+        self.core = core
+        self.backend = backend
+        self.device = eager.device
+
+    def forward(self, 
+                input_ids: torch.Tensor, 
+                masks: torch.Tensor, 
+                token_type_ids: torch.Tensor, 
+                target_tags: torch.Tensor, 
+                offsets: torch.Tensor,
+                position_ids: torch.Tensor = None) -> tuple:
+        """Forward Iteration
+
+        Returns:
+            tuple: outputs of classification layer and None in place
+            of transformer outputs, that are not kept by the compiled 
+            backend.
+        """
+        if self.training or position_ids is not None or masks.dim() == 3:
+            return self.eager(input_ids, masks, token_type_ids, target_tags, offsets, position_ids)
+        outputs = self.core(input_ids.to(self.device), masks.to(self.device), token_type_ids.to(self.device))
+        return outputs, None
+
+    def state_dict(self, *args, **kwargs) -> dict:
+        # weights are saved as those of the original network.
+        return self.eager.state_dict(*args, **kwargs)
+
+    def load_state_dict(self, *args, **kwargs):
+        return self.eager.load_state_dict(*args, **kwargs)
+
+def example_inputs(device: str, batch_size: int = 2, seq_len: int = 8, vocab_size: int = 100) -> tuple:
+    """Example Inputs for Tracing and Warm-Up"""
+    input_ids = torch.randint(5, vocab_size, (batch_size, seq_len), device = device)
+    attention_mask = torch.ones_like(input_ids)
+    attention_mask[-1, seq_len // 2:] = 0
+    return input_ids, attention_mask, torch.zeros_like(input_ids)
+
+def optimize_network(network: NERDANetwork, 
+                     backend: str = 'torchscript', 
+                     path: str = None,
+                     atol: float = 1e-4) -> nn.Module:
+    """Optimize Network for Inference
+
+    Traces the network with TorchScript or compiles it with 
+    `torch.compile` with dynamic shapes. The result is checked
+    against the eager network on inputs of another shape than the
+    example inputs, so dynamic batch sizes and sequence lengths are
+    supported.
+
+    Args:
+        network (NERDANetwork): network to optimize.
+        backend (str, optional): 'torchscript' or 'compile'. Defaults 
+            to 'torchscript'.
+        path (str, optional): file for traced network. If it exists, 
+            the traced network is loaded from it instead of tracing 
+            again. Otherwise it is saved to it. Only for 'torchscript'. 
+            Compiled graphs are cached by `torch.compile` itself. 
+            Defaults to None.
+        atol (float, optional): tolerance for check against eager 
+            network. Defaults to 1e-4.
+
+    Returns:
+        nn.Module: `OptimizedNetwork` or the network unchanged with a
+        warning, if it can not be traced or compiled.
+    """
+    assert backend in ['torchscript', 'compile'], "'backend' must be 'torchscript' or 'compile'"
+    network.eval()
+    core = LogitsNetwork(network).eval()
+    vocab_size = getattr(network.transformer.config, 'vocab_size', 100)
+    
+    try:
+        with torch.no_grad():
+            if backend == 'torchscript':
+                if path is not None and os.path.exists(path):
+                    optimized = torch.jit.load(path, map_location = network.device)
+                else:
+                    optimized = torch.jit.trace(core, example_inputs(network.device, 2, 8, vocab_size), strict = False)
+                    if path is not None:
+                        torch.jit.save(optimized, path)
+            else:
+                optimized = torch.compile(core, dynamic = True)
+            
+            # check on another shape than traced with.
+            inputs = example_inputs(network.device, 3, 13, vocab_size)
+            diff = (optimized(*inputs) - core(*inputs)).abs().max().item()
+        if diff > atol:
+            raise ValueError(f'outputs differ from eager network by {diff}')
+    except Exception as e:
+        warnings.warn(f"Network could not be optimized with '{backend}' and runs eagerly: {type(e).__name__}: {e}")
+        return network
+
+    return OptimizedNetwork(network, optimized, backend)
+
+def encoder_layers(transformer: nn.Module) -> nn.ModuleList:
+    """Find Encoder Layers of a Transformer
+
+    Args:
+        transformer (nn.Module): huggingface `torch` transformer.
+
+    Returns:
+        nn.ModuleList: encoder layers in order of computation.
+    """
+    config = transformer.config
+    n_layers = getattr(config, 'num_hidden_layers', None) or getattr(config, 'n_layers', None)
+    for module in transformer.modules():
+        if isinstance(module, nn.ModuleList) and len(module) == n_layers:
+            return module
+    raise ValueError(f'Encoder layers of {type(transformer).__name__} not found')
+
+class _EarlyExit(Exception):
+    def __init__(self, logits: torch.Tensor, layer: int) -> None:
+        self.logits = logits
+        self.layer = layer
+
+class EarlyExitNetwork(nn.Module):
+    """NERDA Network with Early Exits
+
+    Adds classification heads after some of the encoder layers of the
+    transformer of a `NERDANetwork`. Predictions can be computed from
+    the first `max_layers` layers only, or a batch leaves the network
+    at the first exit, where the confidence scores of all its tokens 
+    reach `threshold`. Remaining layers are not computed. Takes the 
+    same arguments as `NERDANetwork`.
+
+    Attributes:
+        network (NERDANetwork): original network.
+        heads (nn.ModuleDict): classification heads by number of 
+            layers computed before the exit.
+        n_layers (int): number of encoder layers.
+        max_layers (int): number of layers to compute. Defaults to 
+            None, i.e. all layers.
+        threshold (float): minimum confidence score for leaving the
+            network early. Defaults to None, i.e. no early exits.
+        train_heads (bool): if True, return outputs of all heads 
+            stacked for training.
+        exits (dict): number of batches by exit layer.
+    """
+    def __init__(self, network: NERDANetwork, exit_layers: list = None) -> None:
+        """Initialize EarlyExitNetwork
+
+        Args:
+            network (NERDANetwork): network.
+            exit_layers (list, optional): numbers of layers computed 
+                before the exits. Defaults to None, i.e. an exit after 
+                every layer. Heads are initialized with the weights of 
+                the classification layer of the network.
+        """
+        super(EarlyExitNetwork, self).__init__()
+        assert isinstance(network, NERDANetwork), "Early exits require a NERDANetwork"
+        self.network = network
+        self.device = network.device
+        self.n_layers = len(encoder_layers(network.transformer))
+        if exit_layers is None:
+            exit_layers = range(1, self.n_layers)
+        assert all(0 < k < self.n_layers for k in exit_layers), f"'exit_layers' must be between 1 and {self.n_layers - 1}"
+        self.heads = nn.ModuleDict()
+        for k in sorted(exit_layers):
+            head = nn.Linear(network.tags.in_features, network.tags.out_features).to(network.tags.weight.device)
+            head.load_state_dict(network.tags.state_dict())
+            self.heads[str(k)] = head
+        self.max_layers = None
+        self.threshold = None
+        self.train_heads = False
+        self.exits = {}
+
+    def forward(self, 
+                input_ids: torch.Tensor, 
+                masks: torch.Tensor, 
+                token_type_ids: torch.Tensor, 
+                target_tags: torch.Tensor, 
+                offsets: torch.Tensor,
+                position_ids: torch.Tensor = None) -> tuple:
+        """Forward Iteration
+
+        Returns:
+            tuple: outputs of classification layer of the exit and 
+            None in place of transformer outputs. If `train_heads` is 
+            True, outputs of all heads incl. the final classification 
+            layer stacked in the first dimension.
+        """
+        token_masks = (masks.diagonal(dim1 = 1, dim2 = 2) if masks.dim() == 3 else masks).to(self.device) == 1
+        outputs = []
+
+        def exit_hook(k: int) -> Callable:
+            def hook(module, inputs, output):
+                hidden = output[0] if isinstance(output, (tuple, list)) else output
+                logits = self.heads[str(k)](self.network.dropout(hidden))
+                if self.train_heads:
+                    outputs.append(logits)
+                elif k == self.max_layers:
+                    raise _EarlyExit(logits, k)
+                elif self.threshold is not None:
+                    confidence = logits.softmax(dim = -1).max(dim = -1).values
+                    if confidence[token_masks].min() >= self.threshold:
+                        raise _EarlyExit(logits, k)
+            return hook
+
+        if self.max_layers is not None and not self.train_heads:
+            assert self.max_layers == self.n_layers or str(self.max_layers) in self.heads, f"No exit after {self.max_layers} layers"
+        layers = encoder_layers(self.network.transformer)
+        handles = [layers[int(k) - 1].register_forward_hook(exit_hook(int(k))) for k in self.heads]
+        try:
+            logits, _ = self.network(input_ids, masks, token_type_ids, target_tags, offsets, position_ids)
+            layer = self.n_layers
+        except _EarlyExit as e:
+            logits, layer = e.logits, e.layer
+        finally:
+            for handle in handles:
+                handle.remove()
+
+        if self.train_heads:
+            return torch.stack(outputs + [logits]), None
+        self.exits[layer] = self.exits.get(layer, 0) + 1
+        return logits, None
@@ -4,19 +4,55 @@ with a [NERDA.models.NERDA][] model.
 """
 
 from NERDA.preprocessing import create_dataloader
+from NERDA.splitters import split_texts
 import torch
 import numpy as np
 from tqdm import tqdm 
 import nltk
 from nltk.tokenize import sent_tokenize, word_tokenize
-from typing import List, Callable
+from functools import lru_cache
+from itertools import islice
+from typing import List, Callable, Iterable, Iterator
 import transformers
 import sklearn.preprocessing
 
+@lru_cache(maxsize = None)
+def _download_punkt() -> None:
+    try:
+        nltk.data.find('tokenizers/punkt_tab')
+    except LookupError:
+        nltk.download('punkt_tab')
+
+def download_punkt(*tokenizers: Callable) -> None:
+    """Download Data for nltk Tokenizers Once, if Missing
+
+    Args:
+        tokenizers (Callable): tokenizers for splitting texts. Data
+            is only downloaded, if any of them is from `nltk`.
+    """
+    if any(tokenizer in (nltk.tokenize.sent_tokenize, nltk.tokenize.word_tokenize) for tokenizer in tokenizers):
+        _download_punkt()
+
 def sigmoid_transform(x):
     prob = 1/(1 + np.exp(-x))
     return prob
 
+def merge_windows(values: list, sentence_ids: np.ndarray, n_sentences: int) -> list:
+    """Merge Word-Level Results for Windows of the Same Sentence
+
+    Args:
+        values (list): word-level results for every window.
+        sentence_ids (np.ndarray): sentence for every window.
+        n_sentences (int): number of sentences.
+
+    Returns:
+        list: word-level results for every sentence.
+    """
+    merged = [[] for _ in range(n_sentences)]
+    for value, sentence_id in zip(values, sentence_ids):
+        merged[sentence_id].extend(value)
+    return merged
+
 def predict(network: torch.nn.Module, 
             sentences: List[List[str]],
             transformer_tokenizer: transformers.PreTrainedTokenizer,
@@ -29,8 +65,13 @@ def predict(network: torch.nn.Module,
             num_workers: int = 1,
             return_tensors: bool = False,
             return_confidence: bool = False,
-            pad_sequences: bool = True,
-            return_transformer_outputs = False) -> List[List[str]]:
+            pad_sequences: bool = False,
+            return_transformer_outputs = False,
+            cache_dir: str = None,
+            length_bucketing: bool = False,
+            max_tokens: int = None,
+            stride: int = None,
+            packing: bool = False) -> List[List[str]]:
     """Compute predictions.
 
     Computes predictions for a list with word-tokenized sentences 
@@ -58,8 +99,9 @@ def predict(network: torch.nn.Module,
         return_confidence (bool, optional): if True, return
             confidence scores for all predicted tokens. Defaults
             to False.
-        pad_sequences (bool, optional): if True, pad sequences. 
-            Defaults to True.
+        pad_sequences (bool, optional): if True, pad sequences to
+            max_len. Otherwise sequences are padded to the longest
+            sequence in every batch. Defaults to False.
         return_tensors (bool, optional): if True, return
             the output tensors of the last linear classification layer.
             Defaults to False
@@ -67,13 +109,30 @@ def predict(network: torch.nn.Module,
             the output tensors of the transformer model instead of
             the last classification layer when return_tensors is
             set to True. Defaults to False.
+        cache_dir (str, optional): Directory for caching tokenized
+            sentences on disk. Defaults to None, in which case
+            tokenized sentences are not cached.
+        length_bucketing (bool, optional): if True, batch sentences
+            of similar length together. Predictions are returned in 
+            the original order of the sentences. Defaults to False.
+        max_tokens (int, optional): Maximum number of tokens per 
+            batch incl. padding. Replaces batch_size and implies 
+            length bucketing. Defaults to None.
+        stride (int, optional): if provided, sentences exceeding 
+            max_len are split into overlapping windows sharing 'stride'
+            wordpieces instead of being truncated, and predictions for 
+            the windows are merged. Tensors are returned for every 
+            window. Defaults to None.
+        packing (bool, optional): if True, pack consecutive sentences 
+            into sequences of up to max_len tokens, so fewer forward
+            passes are needed. Requires a transformer accepting 
+            'position_ids' and 3-dimensional attention masks, e.g. BERT
+            and ELECTRA. Defaults to False.
 
     Returns:
         List[List[str]]: List of lists with predicted Entity
         tags.
     """
-    nltk.download('punkt_tab')
-
     # make sure, that input has the correct format. 
     assert isinstance(sentences, list), "'sentences' must be a list of list of word-tokens"
     assert isinstance(sentences[0], list), "'sentences' must be a list of list of word-tokens"
@@ -82,78 +141,338 @@ def predict(network: torch.nn.Module,
     # set network to appropriate mode.
     network.eval()
 
-    # fill 'dummy' tags (expected input for dataloader).
-    tag_fill = [tag_encoder.classes_[0]]
-    tags_dummy = [tag_fill * len(sent) for sent in sentences]
-    
-    dl = create_dataloader(sentences = sentences,
-                           tags = tags_dummy, 
-                           transformer_tokenizer = transformer_tokenizer,
-                           transformer_config = transformer_config,
-                           max_len = max_len, 
-                           batch_size = batch_size, 
-                           tag_encoder = tag_encoder,
-                           tag_outside = tag_outside,
-                           num_workers = num_workers,
-                           pad_sequences = pad_sequences)
+    dl = create_prediction_dataloader(sentences = sentences,
+                                      transformer_tokenizer = transformer_tokenizer,
+                                      transformer_config = transformer_config,
+                                      max_len = max_len, 
+                                      batch_size = batch_size, 
+                                      tag_encoder = tag_encoder,
+                                      tag_outside = tag_outside,
+                                      num_workers = num_workers,
+                                      pad_sequences = pad_sequences,
+                                      cache_dir = cache_dir,
+                                      length_bucketing = length_bucketing,
+                                      max_tokens = max_tokens,
+                                      stride = stride,
+                                      packing = packing)
 
+    items = []
     predictions = []
     probabilities = []
     tensors = []
     
-    with torch.no_grad():
-        for _, dl in enumerate(dl): 
-
-            outputs, transformer_outputs = network(**dl)   
-
-            # conduct operations on sentence level.
-            for i in range(outputs.shape[0]):
-                
-                # extract prediction and transform.
-
-                # find max by row.
-                values, indices = outputs[i].max(dim=1)
-                
-                preds = tag_encoder.inverse_transform(indices.cpu().numpy())
-                probs = values.cpu().numpy()
-
-                if return_tensors:
-                    if return_transformer_outputs:
-                       tensors.append(transformer_outputs)
-                    else:
-                       tensors.append(outputs)
-
-                # subset predictions for original word tokens.
-                preds = [prediction for prediction, offset in zip(preds.tolist(), dl.get('offsets')[i]) if offset]
-                if return_confidence:
-                    probs = [prob for prob, offset in zip(probs.tolist(), dl.get('offsets')[i]) if offset]
-            
-                # Remove special tokens ('CLS' + 'SEP').
-                preds = preds[1:-1]
-                if return_confidence:
-                    probs = probs[1:-1]
-            
-                # make sure resulting predictions have same length as
-                # original sentence.
-            
-                # TODO: Move assert statement to unit tests. Does not work 
-                # in boundary.
-                # assert len(preds) == len(sentences[i])          
-                predictions.append(preds)
-                if return_confidence:
-                    probabilities.append(probs)
-            
-            if return_confidence:
-                return predictions, probabilities
-
-            if return_tensors and not return_confidence:
-                return predictions, tensors
-                
-            if return_tensors and return_confidence:
-               return predictions, probabilities, tensors
+    for batch_items, batch_predictions, batch_probabilities, batch_tensors in predict_batches(network = network,
+                                                                                             data_loader = dl,
+                                                                                             tag_encoder = tag_encoder,
+                                                                                             return_confidence = return_confidence,
+                                                                                             return_tensors = return_tensors,
+                                                                                             return_transformer_outputs = return_transformer_outputs):
+        items.extend(batch_items)
+        predictions.extend(batch_predictions)
+        probabilities.extend(batch_probabilities)
+        tensors.extend(batch_tensors)
+
+    # restore original order of sentences, if batches were not.
+    if items != list(range(len(items))):
+        order = np.argsort(items, kind = 'stable')
+        predictions = [predictions[i] for i in order]
+        probabilities = [probabilities[i] for i in order] if return_confidence else probabilities
+        tensors = [tensors[i] for i in order] if return_tensors else tensors
+
+    sentence_ids = dl.dataset.sentence_ids()
+    if sentence_ids is not None:
+        # merge predictions for windows of the same sentence.
+        predictions = merge_windows(predictions, sentence_ids, len(sentences))
+        probabilities = merge_windows(probabilities, sentence_ids, len(sentences)) if return_confidence else probabilities
+
+    if return_tensors and return_confidence:
+        return predictions, probabilities, tensors
+
+    if return_confidence:
+        return predictions, probabilities
+
+    if return_tensors:
+        return predictions, tensors
 
     return predictions
 
+def create_prediction_dataloader(sentences: List[List[str]],
+                                 tag_encoder: sklearn.preprocessing.LabelEncoder,
+                                 **kwargs) -> torch.utils.data.DataLoader:
+    """Create DataLoader for Predictions
+
+    Args:
+        sentences (List[List[str]]): word-tokenized sentences.
+        tag_encoder (sklearn.preprocessing.LabelEncoder): Encoder
+            for Named-Entity tags.
+        kwargs: all other arguments for `create_dataloader`.
+
+    Returns:
+        torch.utils.data.DataLoader: data loader.
+    """
+    # fill 'dummy' tags (expected input for dataloader).
+    tag_fill = [tag_encoder.classes_[0]]
+    tags_dummy = [tag_fill * len(sent) for sent in sentences]
+
+    return create_dataloader(sentences = sentences,
+                             tags = tags_dummy,
+                             tag_encoder = tag_encoder,
+                             **kwargs)
+
+def decode_batch(outputs: torch.Tensor,
+                 offsets: torch.Tensor,
+                 tag_encoder: sklearn.preprocessing.LabelEncoder,
+                 spans: list = None,
+                 return_confidence: bool = False) -> tuple:
+    """Decode Outputs for Batch into Word-Level Tags
+
+    The whole batch is decoded at once: one argmax, one copy to host
+    and a mask-based selection of the first subword of every word.
+
+    Args:
+        outputs (torch.Tensor): outputs of network for batch.
+        offsets (torch.Tensor): offsets for batch, 1 for the first
+            subword of every word and the special tokens.
+        tag_encoder (sklearn.preprocessing.LabelEncoder): Encoder
+            for Named-Entity tags.
+        spans (list, optional): positions [start, end) of sentences
+            for every row of packed sequences. Defaults to None, i.e.
+            one sentence per row.
+        return_confidence (bool, optional): if True, return 
+            confidence scores. Defaults to False.
+
+    Returns:
+        tuple: predicted tags and confidence scores (empty list, 
+        unless requested) for every sentence.
+    """
+    values, indices = outputs.max(dim = 2)
+    indices = indices.cpu().numpy()
+    keep, bounds = first_subwords(offsets, spans)
+
+    preds = np.asarray(tag_encoder.classes_)[indices[keep]].tolist()
+    predictions = [preds[start:end] for start, end in bounds]
+
+    probabilities = []
+    if return_confidence:
+        probs = values.cpu().numpy()[keep].tolist()
+        probabilities = [probs[start:end] for start, end in bounds]
+
+    return predictions, probabilities
+
+def first_subwords(offsets: torch.Tensor, spans: list = None) -> tuple:
+    """Find First Subwords of Words in Batch
+
+    Args:
+        offsets (torch.Tensor): offsets for batch, 1 for the first
+            subword of every word and the special tokens.
+        spans (list, optional): positions [start, end) of sentences
+            for every row of packed sequences. Defaults to None, i.e.
+            one sentence per row.
+
+    Returns:
+        tuple: mask for the first subwords of words and bounds
+        [start, end) of every sentence in the masked positions.
+    """
+    offsets = offsets.numpy()
+
+    # assign every position to a sentence and find special tokens 
+    # ('CLS' + 'SEP') delimiting them.
+    segments = np.zeros(offsets.shape, dtype = np.int64)
+    special = np.zeros(offsets.shape, dtype = bool)
+    if spans is not None:
+        n = 0
+        for i, row_spans in enumerate(spans):
+            for start, end in row_spans:
+                segments[i, start:end] = n
+                special[i, [start, end - 1]] = True
+                n += 1
+    else:
+        n = len(offsets)
+        lengths = offsets.shape[1] - np.argmax(offsets[:, ::-1] != 0, axis = 1)
+        segments[:] = np.arange(n)[:, None]
+        special[:, 0] = True
+        special[np.arange(n), lengths - 1] = True
+
+    # subset predictions for original word tokens.
+    keep = (offsets != 0) & ~special
+    ends = np.cumsum(np.bincount(segments[keep], minlength = n)).tolist()
+    bounds = list(zip([0] + ends[:-1], ends))
+    return keep, bounds
+
+def predict_batches(network: torch.nn.Module,
+                    data_loader: torch.utils.data.DataLoader,
+                    tag_encoder: sklearn.preprocessing.LabelEncoder,
+                    return_confidence: bool = False,
+                    return_tensors: bool = False,
+                    return_transformer_outputs: bool = False) -> Iterator[tuple]:
+    """Compute Predictions Batch by Batch
+
+    Args:
+        network (torch.nn.Module): Network.
+        data_loader (torch.utils.data.DataLoader): data loader from
+            `create_prediction_dataloader`.
+        tag_encoder (sklearn.preprocessing.LabelEncoder): Encoder
+            for Named-Entity tags.
+        return_confidence (bool, optional): if True, return
+            confidence scores. Defaults to False.
+        return_tensors (bool, optional): if True, return output 
+            tensors. Defaults to False.
+        return_transformer_outputs (bool, optional): if True, return
+            outputs of transformer instead of classification layer
+            as tensors. Defaults to False.
+
+    Yields:
+        tuple: items (indices of sentences or windows in data set), 
+        predicted tags, confidence scores and tensors for a batch.
+        Confidence scores and tensors are empty lists, unless 
+        requested.
+    """
+    # packed sequences hold several sentences each.
+    packed = hasattr(data_loader.dataset, 'spans')
+
+    with torch.no_grad():
+        # batch sampler yields the indices of the rows in every batch.
+        for batch, rows in zip(data_loader, data_loader.batch_sampler): 
+
+            outputs, transformer_outputs = network(**batch)   
+
+            if packed:
+                items = [item for row in rows for item in data_loader.dataset.packs[row]]
+                spans = [data_loader.dataset.spans(row) for row in rows]
+            else:
+                items = list(rows)
+                spans = None
+
+            predictions, probabilities = decode_batch(outputs = outputs,
+                                                      offsets = batch.get('offsets'),
+                                                      tag_encoder = tag_encoder,
+                                                      spans = spans,
+                                                      return_confidence = return_confidence)
+
+            tensors = []
+            if return_tensors:
+                tensors = [transformer_outputs if return_transformer_outputs else outputs] * len(items)
+
+            yield items, predictions, probabilities, tensors
+
+def predict_iter(network: torch.nn.Module, 
+                 sentences: Iterable[List[str]],
+                 transformer_tokenizer: transformers.PreTrainedTokenizer,
+                 transformer_config: transformers.PretrainedConfig,
+                 max_len: int,
+                 device: str,
+                 tag_encoder: sklearn.preprocessing.LabelEncoder,
+                 tag_outside: str,
+                 batch_size: int = 8,
+                 num_workers: int = 1,
+                 return_confidence: bool = False,
+                 pad_sequences: bool = False,
+                 chunk_size: int = 1000,
+                 length_bucketing: bool = False,
+                 max_tokens: int = None,
+                 stride: int = None,
+                 packing: bool = False) -> Iterator[tuple]:
+    """Compute Predictions Iteratively.
+
+    Computes predictions for any iterable of word-tokenized 
+    sentences with a `NERDA` model. Sentences are read in chunks
+    and predictions are yielded as soon as every batch is 
+    completed, so memory use does not grow with the number of
+    sentences.
+
+    Args:
+        network (torch.nn.Module): Network.
+        sentences (Iterable[List[str]]): Iterable, e.g. generator,
+            with word-tokenized sentences.
+        transformer_tokenizer (transformers.PreTrainedTokenizer): 
+            tokenizer for transformer model.
+        transformer_config (transformers.PretrainedConfig): config
+            for transformer model.
+        max_len (int): Maximum length of sentence after applying 
+            transformer tokenizer.
+        device (str): Computational device.
+        tag_encoder (sklearn.preprocessing.LabelEncoder): Encoder
+            for Named-Entity tags.
+        tag_outside (str): Special 'outside' NER tag.
+        batch_size (int, optional): Batch Size for DataLoader. 
+            Defaults to 8.
+        num_workers (int, optional): Number of workers. Defaults
+            to 1.
+        return_confidence (bool, optional): if True, return
+            confidence scores for all predicted tokens. Defaults
+            to False.
+        pad_sequences (bool, optional): if True, pad sequences to
+            max_len. Defaults to False.
+        chunk_size (int, optional): Number of sentences read from
+            'sentences' at a time. Defaults to 1000.
+        length_bucketing (bool, optional): if True, batch sentences
+            of similar length together within every chunk. Defaults 
+            to False.
+        max_tokens (int, optional): Maximum number of tokens per 
+            batch incl. padding. Defaults to None.
+        stride (int, optional): if provided, split sentences exceeding
+            max_len into overlapping windows sharing 'stride' wordpieces
+            instead of truncating them. Defaults to None.
+        packing (bool, optional): if True, pack consecutive sentences
+            into sequences of up to max_len tokens. Defaults to False.
+
+    Yields:
+        tuple: index of sentence and predicted tags (and confidence
+        scores, if return_confidence is True). Sentences are NOT 
+        necessarily yielded in order with length bucketing.
+    """
+    # set network to appropriate mode.
+    network.eval()
+
+    sentences = iter(sentences)
+    index = 0
+
+    while True:
+        chunk = list(islice(sentences, chunk_size))
+        if not chunk:
+            return
+
+        dl = create_prediction_dataloader(sentences = chunk,
+                                          transformer_tokenizer = transformer_tokenizer,
+                                          transformer_config = transformer_config,
+                                          max_len = max_len, 
+                                          batch_size = batch_size, 
+                                          tag_encoder = tag_encoder,
+                                          tag_outside = tag_outside,
+                                          num_workers = num_workers,
+                                          pad_sequences = pad_sequences,
+                                          length_bucketing = length_bucketing,
+                                          max_tokens = max_tokens,
+                                          stride = stride,
+                                          packing = packing)
+        
+        sentence_ids = dl.dataset.sentence_ids()
+        if sentence_ids is not None:
+            # number of windows to merge for every sentence.
+            n_windows = np.bincount(sentence_ids, minlength = len(chunk))
+            windows = {}
+
+        for items, predictions, probabilities, _ in predict_batches(network = network,
+                                                                    data_loader = dl,
+                                                                    tag_encoder = tag_encoder,
+                                                                    return_confidence = return_confidence):
+            if not return_confidence:
+                probabilities = [None] * len(items)
+            for item, preds, probs in zip(items, predictions, probabilities):
+                if sentence_ids is not None:
+                    window, item = item, sentence_ids[item]
+                    windows.setdefault(item, []).append((window, preds, probs))
+                    if len(windows[item]) < n_windows[item]:
+                        continue
+                    # merge windows of sentence in original order.
+                    merged = sorted(windows.pop(item), key = lambda x: x[0])
+                    preds = [p for _, window_preds, _ in merged for p in window_preds]
+                    if return_confidence:
+                        probs = [p for _, _, window_probs in merged for p in window_probs]
+                yield (index + int(item), preds, probs) if return_confidence else (index + int(item), preds)
+
+        index += len(chunk)
+
 def predict_text(network: torch.nn.Module, 
                  text: str,
                  transformer_tokenizer: transformers.PreTrainedTokenizer,
@@ -164,12 +483,16 @@ def predict_text(network: torch.nn.Module,
                  tag_outside: str,
                  batch_size: int = 8,
                  num_workers: int = 1,
-                 pad_sequences: bool = True,
+                 pad_sequences: bool = False,
                  return_confidence: bool = False,
                  sent_tokenize: Callable = sent_tokenize,
                  word_tokenize: Callable = word_tokenize,
                  return_tensors: bool = False,
-                 return_transformer_outputs: bool = False) -> tuple:
+                 return_transformer_outputs: bool = False,
+                 length_bucketing: bool = False,
+                 max_tokens: int = None,
+                 stride: int = None,
+                 packing: bool = False) -> tuple:
     """Compute Predictions for Text.
 
     Computes predictions for a text with `NERDA` model. 
@@ -192,8 +515,9 @@ def predict_text(network: torch.nn.Module,
             Defaults to 8.
         num_workers (int, optional): Number of workers. Defaults
             to 1.
-        pad_sequences (bool, optional): if True, pad sequences. 
-            Defaults to True.
+        pad_sequences (bool, optional): if True, pad sequences to
+            max_len. Otherwise sequences are padded to the longest
+            sequence in every batch. Defaults to False.
         return_confidence (bool, optional): if True, return 
             confidence scores for predicted tokens. Defaults
             to False.
@@ -204,11 +528,22 @@ def predict_text(network: torch.nn.Module,
             the output tensors of the transformer model instead of
             the last classification layer when return_tensors is
             set to True. Defaults to False.
+        length_bucketing (bool, optional): if True, batch sentences
+            of similar length together. Defaults to False.
+        max_tokens (int, optional): Maximum number of tokens per 
+            batch incl. padding. Replaces batch_size and implies 
+            length bucketing. Defaults to None.
+        stride (int, optional): if provided, split sentences exceeding
+            max_len into overlapping windows sharing 'stride' wordpieces
+            instead of truncating them. Defaults to None.
+        packing (bool, optional): if True, pack consecutive sentences
+            into sequences of up to max_len tokens. Defaults to False.
     Returns:
         tuple: sentence- and word-tokenized text with corresponding
         predicted named-entity tags.
     """
     assert isinstance(text, str), "'text' must be a string."
+    download_punkt(sent_tokenize, word_tokenize)
     sentences = sent_tokenize(text)
     sentences = [word_tokenize(sentence) for sentence in sentences]
 
@@ -225,7 +560,182 @@ def predict_text(network: torch.nn.Module,
                           tag_encoder = tag_encoder,
                           return_tensors = return_tensors,
                           tag_outside = tag_outside,
-                          return_transformer_outputs = return_transformer_outputs)
+                          return_transformer_outputs = return_transformer_outputs,
+                          length_bucketing = length_bucketing,
+                          max_tokens = max_tokens,
+                          stride = stride,
+                          packing = packing)
 
     return sentences, predictions
 
+
+def predict_text_iter(network: torch.nn.Module, 
+                      text: str,
+                      transformer_tokenizer: transformers.PreTrainedTokenizer,
+                      transformer_config: transformers.PretrainedConfig,
+                      max_len: int,
+                      device: str,
+                      tag_encoder: sklearn.preprocessing.LabelEncoder,
+                      tag_outside: str,
+                      sent_tokenize: Callable = sent_tokenize,
+                      word_tokenize: Callable = word_tokenize,
+                      return_confidence: bool = False,
+                      **kwargs) -> Iterator[tuple]:
+    """Compute Predictions for Text Iteratively.
+
+    Text is tokenized into sentences lazily, and predictions are 
+    yielded sentence by sentence as soon as they are computed.
+
+    Args:
+        network (torch.nn.Module): Network.
+        text (str): text to predict entities in.
+        transformer_tokenizer (transformers.PreTrainedTokenizer): 
+            tokenizer for transformer model.
+        transformer_config (transformers.PretrainedConfig): config
+            for transformer model.
+        max_len (int): Maximum length of sentence after applying 
+            transformer tokenizer.
+        device (str): Computational device.
+        tag_encoder (sklearn.preprocessing.LabelEncoder): Encoder
+            for Named-Entity tags.
+        tag_outside (str): Special 'outside' NER tag.
+        sent_tokenize (Callable, optional): function for sentence
+            tokenization. Defaults to `nltk.sent_tokenize`.
+        word_tokenize (Callable, optional): function for word
+            tokenization. Defaults to `nltk.word_tokenize`.
+        return_confidence (bool, optional): if True, return 
+            confidence scores for predicted tokens. Defaults
+            to False.
+        kwargs: all optional arguments for `predict_iter`.
+
+    Yields:
+        tuple: index of sentence, word-tokenized sentence and
+        predicted tags (and confidence scores, if return_confidence
+        is True).
+    """
+    assert isinstance(text, str), "'text' must be a string."
+    download_punkt(sent_tokenize, word_tokenize)
+    
+    # keep word tokens only until the sentence has been predicted.
+    words = {}
+    def tokenize():
+        for i, sentence in enumerate(sent_tokenize(text)):
+            words[i] = word_tokenize(sentence)
+            yield words[i]
+
+    for index, *results in predict_iter(network = network, 
+                                        sentences = tokenize(),
+                                        transformer_tokenizer = transformer_tokenizer,
+                                        transformer_config = transformer_config,
+                                        max_len = max_len,
+                                        device = device,
+                                        tag_encoder = tag_encoder,
+                                        tag_outside = tag_outside,
+                                        return_confidence = return_confidence,
+                                        **kwargs):
+        yield (index, words.pop(index), *results)
+
+def split_by_text(sentences_by_text: List[List[List[str]]], 
+                  predictions, 
+                  return_confidence: bool = False) -> list:
+    """Split Predictions for Pooled Sentences by Text
+
+    Args:
+        sentences_by_text (List[List[List[str]]]): word-tokenized
+            sentences for every text.
+        predictions: predictions for all sentences of all texts.
+        return_confidence (bool, optional): if True, predictions 
+            are tags and confidence scores. Defaults to False.
+
+    Returns:
+        list: word-tokenized sentences and predictions for every text.
+    """
+    results = []
+    start = 0
+    for sentences in sentences_by_text:
+        end = start + len(sentences)
+        if return_confidence:
+            results.append((sentences, (predictions[0][start:end], predictions[1][start:end])))
+        else:
+            results.append((sentences, predictions[start:end]))
+        start = end
+    return results
+
+def predict_texts(network: torch.nn.Module, 
+                  texts: List[str],
+                  transformer_tokenizer: transformers.PreTrainedTokenizer,
+                  transformer_config: transformers.PretrainedConfig,
+                  max_len: int,
+                  device: str,
+                  tag_encoder: sklearn.preprocessing.LabelEncoder,
+                  tag_outside: str,
+                  sent_tokenize: Callable = sent_tokenize,
+                  word_tokenize: Callable = word_tokenize,
+                  return_confidence: bool = False,
+                  length_bucketing: bool = True,
+                  split_workers: int = None,
+                  **kwargs) -> list:
+    """Compute Predictions for Multiple Texts.
+
+    Sentences of all texts are pooled and batched together, sorted
+    by length, instead of predicting every text with its own 
+    (under-filled) batches. Results are returned by text.
+
+    Args:
+        network (torch.nn.Module): Network.
+        texts (List[str]): texts to predict entities in.
+        transformer_tokenizer (transformers.PreTrainedTokenizer): 
+            tokenizer for transformer model.
+        transformer_config (transformers.PretrainedConfig): config
+            for transformer model.
+        max_len (int): Maximum length of sentence after applying 
+            transformer tokenizer.
+        device (str): Computational device.
+        tag_encoder (sklearn.preprocessing.LabelEncoder): Encoder
+            for Named-Entity tags.
+        tag_outside (str): Special 'outside' NER tag.
+        sent_tokenize (Callable, optional): function for sentence
+            tokenization. Defaults to `nltk.sent_tokenize`.
+        word_tokenize (Callable, optional): function for word
+            tokenization. Defaults to `nltk.word_tokenize`.
+        return_confidence (bool, optional): if True, return 
+            confidence scores for predicted tokens. Defaults
+            to False.
+        length_bucketing (bool, optional): if True, batch sentences
+            of similar length together. Defaults to True.
+        split_workers (int, optional): number of worker processes 
+            for splitting texts into sentences and words, see 
+            `NERDA.splitters.split_texts`. Defaults to None, i.e.
+            texts are split in this process.
+        kwargs: optional arguments for `predict` except 
+            'return_tensors'.
+
+    Returns:
+        list: sentence- and word-tokenized text with corresponding
+        predicted named-entity tags for every text, i.e. the same
+        as `predict_text` for every text.
+    """
+    assert not isinstance(texts, str), "'texts' must be a list of strings."
+    assert not kwargs.get('return_tensors'), "'return_tensors' is not supported for multiple texts."
+    download_punkt(sent_tokenize, word_tokenize)
+    sentences_by_text = split_texts(texts, 
+                                    sent_tokenize = sent_tokenize, 
+                                    word_tokenize = word_tokenize, 
+                                    n_workers = split_workers)
+    sentences = [sentence for sentences in sentences_by_text for sentence in sentences]
+    if len(sentences) == 0:
+        return split_by_text(sentences_by_text, ([], []) if return_confidence else [], return_confidence)
+
+    predictions = predict(network = network, 
+                          sentences = sentences,
+                          transformer_tokenizer = transformer_tokenizer,
+                          transformer_config = transformer_config,
+                          max_len = max_len,
+                          device = device,
+                          tag_encoder = tag_encoder,
+                          tag_outside = tag_outside,
+                          return_confidence = return_confidence,
+                          length_bucketing = length_bucketing,
+                          **kwargs)
+
+    return split_by_text(sentences_by_text, predictions, return_confidence)
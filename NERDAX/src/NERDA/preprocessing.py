@@ -1,7 +1,16 @@
+import os
+import random
+import numpy as np
 import torch
+from functools import partial
+from torch.nn.utils.rnn import pad_sequence
 import warnings
 import transformers
 import sklearn.preprocessing
+from NERDA.cache import features_fingerprint, read_features, write_features
+
+# labels ignored by loss function.
+IGNORE_INDEX = torch.nn.CrossEntropyLoss().ignore_index
 
 class NERDADataSetReader():
     """Generic NERDA DataSetReader"""
@@ -14,7 +23,9 @@ class NERDADataSetReader():
                 max_len: int, 
                 tag_encoder: sklearn.preprocessing.LabelEncoder, 
                 tag_outside: str,
-                pad_sequences : bool = True) -> None:
+                pad_sequences : bool = True,
+                cache_dir: str = None,
+                stride: int = None) -> None:
         """Initialize DataSetReader
 
         Initializes DataSetReader that prepares and preprocesses 
@@ -33,7 +44,19 @@ class NERDADataSetReader():
                 for Named-Entity tags.
             tag_outside (str): Special Outside tag.
             pad_sequences (bool): Pad sequences to max_len. Defaults
-                to True.
+                to True. If False, sequences can be padded batch-wise 
+                with `collate_batch`.
+            cache_dir (str, optional): Directory for caching tokenized
+                features on disk. If provided, features are computed 
+                once and memory-mapped from disk afterwards. Defaults 
+                to None, in which case features are not cached.
+            stride (int, optional): If provided, sentences exceeding 
+                max_len are split into overlapping windows instead of 
+                being truncated. Every window is a separate item. 
+                'stride' is the number of wordpieces shared by 
+                consecutive windows. Every word is predicted by the 
+                window, where it has the most context. Defaults to None,
+                in which case sentences are truncated.
         """
         self.sentences = sentences
         self.tags = tags
@@ -42,27 +65,97 @@ class NERDADataSetReader():
         self.tag_encoder = tag_encoder
         self.pad_token_id = transformer_config.pad_token_id
         self.tag_outside_transformed = tag_encoder.transform([tag_outside])[0]
+        # look-up table for encoding tags, faster than encoder for single sentences.
+        self.tag_index = {tag: i for i, tag in enumerate(tag_encoder.classes_)}
         self.pad_sequences = pad_sequences
-    
-    def __len__(self):
-        return len(self.sentences)
+        self.stride = stride
+        self.encodings = None
+        self.windows = None
+        self.features_path = None
+        self._features = None
 
-    def __getitem__(self, item):
-        sentence = self.sentences[item]
-        tags = self.tags[item]
-        # encode tags
-        tags = self.tag_encoder.transform(tags)
-        
-        # check inputs for consistancy
-        assert len(sentence) == len(tags)
+        features_path = None
+        if cache_dir is not None:
+            key = features_fingerprint(sentences = sentences, 
+                                       tags = tags,
+                                       transformer_tokenizer = transformer_tokenizer,
+                                       max_len = max_len,
+                                       tag_encoder = tag_encoder,
+                                       tag_outside = tag_outside,
+                                       stride = stride)
+            features_path = os.path.join(cache_dir, key)
+            if os.path.exists(features_path):
+                self.features_path = features_path
+                return
+
+        # encode all sentences up front with the (Rust) fast tokenizer, if 
+        # available. Otherwise fall back to tokenizing word by word.
+        if getattr(transformer_tokenizer, 'is_fast', False):
+            self.encodings = self._encode_fast()
+
+        if stride is not None:
+            self.windows = self._windows()
+
+        if features_path is not None:
+            write_features(features_path, 
+                           [self._encode(i) for i in range(len(self))],
+                           sentence_ids = self.sentence_ids())
+            self.features_path = features_path
+            self.encodings = None
+            self.windows = None
+
+    @property
+    def features(self) -> dict:
+        """Memory-mapped features. Opened lazily in every worker."""
+        if self._features is None and self.features_path is not None:
+            self._features = read_features(self.features_path)
+        return self._features
+
+    def __getstate__(self):
+        # do not pickle memory-mapped arrays to data loader workers.
+        state = self.__dict__.copy()
+        state['_features'] = None
+        return state
+
+    def _encode_fast(self, chunk_size: int = 1000) -> list:
+        """Encode Sentences with Fast Tokenizer
 
-        input_ids = []
+        Runs the fast tokenizer over chunks of word-tokenized sentences
+        in one go instead of tokenizing word by word.
+
+        Args:
+            chunk_size (int, optional): Number of sentences encoded
+                per call to the tokenizer. Defaults to 1000.
+
+        Returns:
+            list: wordpiece IDs and corresponding word IDs for every
+            sentence. None, if the tokenizer can not handle 
+            pre-tokenized input, in which case the word by word
+            tokenization is used instead.
+        """
+        if getattr(self.transformer_tokenizer, 'add_prefix_space', None) is False:
+            # byte-level BPE tokenizers, e.g. RoBERTa, only accept 
+            # pre-tokenized input with 'add_prefix_space'.
+            return None
+        encodings = []
+        for start in range(0, len(self.sentences), chunk_size):
+            chunk = [list(sentence) for sentence in self.sentences[start:start + chunk_size]]
+            try:
+                encoded = self.transformer_tokenizer(chunk,
+                                                     is_split_into_words = True,
+                                                     add_special_tokens = False)
+            except (AssertionError, ValueError, TypeError):
+                # tokenizer rejects pre-tokenized input.
+                return None
+            encodings.extend((encoded['input_ids'][i], encoded.word_ids(i)) for i in range(len(chunk)))
+        return encodings
+
+    def _tokenize_slow(self, sentence: list, tags: list) -> tuple:
+        """Tokenize Sentence Word by Word"""
         target_tags = []
         tokens = []
         offsets = []
         
-        # for debugging purposes
-        # print(item)
         for i, word in enumerate(sentence):
             # bert tokenization
             wordpieces = self.transformer_tokenizer.tokenize(word)
@@ -72,13 +165,129 @@ class NERDADataSetReader():
                 offsets.extend([1]+[0]*(len(wordpieces)-1))
             # Extends the ner_tag if the word has been split by the wordpiece tokenizer
             target_tags.extend([tags[i]] * len(wordpieces)) 
+
+        input_ids = self.transformer_tokenizer.convert_tokens_to_ids(tokens)
+        return input_ids, target_tags, offsets
+
+    def _tokenize_fast(self, item: int, tags: list) -> tuple:
+        """Rebuild Offsets and Target Tags from Word IDs of Fast Encoding"""
+        input_ids, word_ids = self.encodings[item]
+        target_tags = [tags[word_id] for word_id in word_ids]
+        # first wordpiece of every word marks the original word.
+        offsets = [int(i == 0 or word_id != word_ids[i - 1]) for i, word_id in enumerate(word_ids)]
+        return list(input_ids), target_tags, offsets
+    
+    def __len__(self):
+        if self.features is not None:
+            return len(self.features['starts']) - 1
+        if self.windows is not None:
+            return len(self.windows)
+        return len(self.sentences)
+
+    def sentence_ids(self) -> np.ndarray:
+        """Sentence for Every Item
+
+        Returns:
+            np.ndarray: index of sentence for every item, if sentences 
+            are split into windows. Otherwise None.
+        """
+        if self.features is not None:
+            return self.features.get('sentence_ids')
+        if self.windows is not None:
+            return np.array([window[0] for window in self.windows], dtype = np.int64)
+        return None
+
+    def _sentence_lengths(self) -> list:
+        """Number of Wordpieces in every Sentence before Truncation"""
+        if self.encodings is not None:
+            return [len(input_ids) for input_ids, _ in self.encodings]
+        return [sum(len(self.transformer_tokenizer.tokenize(word)) for word in sentence) 
+                for sentence in self.sentences]
+
+    def _windows(self) -> list:
+        """Split Sentences into Overlapping Windows
+
+        Returns:
+            list: (sentence, start, end, own_start, own_end) for every
+            window. Wordpieces [start, end) of sentence are input to
+            the window, and words starting in [own_start, own_end) are 
+            predicted from it. Overlaps are split evenly between 
+            consecutive windows.
+        """
+        size = self.max_len - 2
+        assert 0 <= self.stride < size, "'stride' must be non-negative and less than max_len - 2"
+        step = size - self.stride
+        windows = []
+        for i, length in enumerate(self._sentence_lengths()):
+            starts = [0]
+            while starts[-1] + size < length:
+                starts.append(starts[-1] + step)
+            ends = [min(start + size, length) for start in starts]
+            bounds = [0] + [(starts[k + 1] + ends[k]) // 2 for k in range(len(starts) - 1)] + [length]
+            windows.extend((i, starts[k], ends[k], bounds[k], bounds[k + 1]) for k in range(len(starts)))
+        return windows
+
+    def sequence_lengths(self) -> np.ndarray:
+        """Compute Sequence Lengths
+
+        Computes the number of tokens for every item after applying 
+        the transformer tokenizer, truncation and adding special 
+        tokens.
+
+        Returns:
+            np.ndarray: sequence lengths.
+        """
+        if self.features is not None:
+            return np.diff(self.features['starts'])
+        if self.windows is not None:
+            return np.array([end - start + 2 for _, start, end, _, _ in self.windows], dtype = np.int64)
+        lengths = np.array(self._sentence_lengths(), dtype = np.int64)
+        return np.minimum(lengths, self.max_len - 2) + 2
+
+    def _encode(self, item: int) -> tuple:
+        """Encode Sentence
+
+        Tokenizes a single sentence and adds special tokens.
+
+        Args:
+            item (int): Index of sentence or window.
+
+        Returns:
+            tuple: input_ids, target_tags and offsets for sentence
+            without padding.
+        """
+        if self.windows is not None:
+            item, start, end, own_start, own_end = self.windows[item]
+        sentence = self.sentences[item]
+        tags = self.tags[item]
+        # encode tags
+        try:
+            tags = [self.tag_index[tag] for tag in tags]
+        except KeyError as e:
+            raise ValueError(f"tags contain previously unseen labels: {e}")
+        
+        # check inputs for consistancy
+        assert len(sentence) == len(tags)
+
+        if self.encodings is not None:
+            input_ids, target_tags, offsets = self._tokenize_fast(item, tags)
+        else:
+            input_ids, target_tags, offsets = self._tokenize_slow(sentence, tags)
                
+        if self.windows is not None:
+            # only words starting inside the window's own span are predicted,
+            # and only wordpieces inside it count for the loss, so overlaps
+            # are not counted twice in training.
+            input_ids = input_ids[start:end]
+            target_tags = [tag if own_start <= i < own_end else IGNORE_INDEX for i, tag in enumerate(target_tags[start:end], start)]
+            offsets = [offset if own_start <= i < own_end else 0 for i, offset in enumerate(offsets[start:end], start)]
+
         # Make room for adding special tokens (one for both 'CLS' and 'SEP' special tokens)
         # max_len includes _all_ tokens.
-        if len(tokens) > self.max_len-2:
-            msg = f'Sentence #{item} length {len(tokens)} exceeds max_len {self.max_len} and has been truncated'
+        if len(input_ids) > self.max_len-2:
+            msg = f'Sentence #{item} length {len(input_ids)} exceeds max_len {self.max_len} and has been truncated'
             warnings.warn(msg)
-        tokens = tokens[:self.max_len-2] 
+        input_ids = input_ids[:self.max_len-2] 
         target_tags = target_tags[:self.max_len-2]
         offsets = offsets[:self.max_len-2]
 
@@ -88,33 +297,396 @@ class NERDADataSetReader():
             self.transformer_tokenizer.cls_token = "[CLS]"
         if not self.transformer_tokenizer.sep_token_id:
             self.transformer_tokenizer.sep_token = "[SEP]"
-        input_ids = self.transformer_tokenizer.convert_tokens_to_ids(tokens)
         input_ids = [self.transformer_tokenizer.cls_token_id] + input_ids + [self.transformer_tokenizer.sep_token_id]
-       
-        # fill out other inputs for model.    
         target_tags = [self.tag_outside_transformed] + target_tags + [self.tag_outside_transformed] 
-        masks = [1] * len(input_ids)
+        offsets = [1] + offsets + [1]
+
+        return input_ids, target_tags, offsets
+
+    def __getitem__(self, item):
+        if self.features is not None:
+            # read from memory-mapped features without copying.
+            start, end = self.features['starts'][item:item + 2]
+            input_ids, target_tags, offsets = [torch.from_numpy(self.features[name][start:end]) 
+                                               for name in ['input_ids', 'target_tags', 'offsets']]
+        else:
+            # one tensor for all inputs of equal length.
+            input_ids, target_tags, offsets = torch.tensor(self._encode(item), dtype = torch.long)
+
+        # fill out other inputs for model.
+        masks = torch.ones_like(input_ids)
         # set to 0, because we are not doing NSP or QA type task (across multiple sentences)
         # token_type_ids distinguishes sentences.
-        token_type_ids = [0] * len(input_ids) 
-        offsets = [1] + offsets + [1]
+        token_type_ids = torch.zeros_like(input_ids)
 
         # Padding to max length 
         # compute padding length
         if self.pad_sequences:
             padding_len = self.max_len - len(input_ids)
-            input_ids = input_ids + ([self.pad_token_id] * padding_len)
-            masks = masks + ([0] * padding_len)  
-            offsets = offsets + ([0] * padding_len)
-            token_type_ids = token_type_ids + ([0] * padding_len)
-            target_tags = target_tags + ([self.tag_outside_transformed] * padding_len)  
+            input_ids = torch.nn.functional.pad(input_ids, (0, padding_len), value = self.pad_token_id)
+            masks = torch.nn.functional.pad(masks, (0, padding_len), value = 0)
+            offsets = torch.nn.functional.pad(offsets, (0, padding_len), value = 0)
+            token_type_ids = torch.nn.functional.pad(token_type_ids, (0, padding_len), value = 0)
+            target_tags = torch.nn.functional.pad(target_tags, (0, padding_len), value = int(self.tag_outside_transformed))
     
-        return {'input_ids' : torch.tensor(input_ids, dtype = torch.long),
-                'masks' : torch.tensor(masks, dtype = torch.long),
-                'token_type_ids' : torch.tensor(token_type_ids, dtype = torch.long),
-                'target_tags' : torch.tensor(target_tags, dtype = torch.long),
-                'offsets': torch.tensor(offsets, dtype = torch.long)} 
+        return {'input_ids' : input_ids,
+                'masks' : masks,
+                'token_type_ids' : token_type_ids,
+                'target_tags' : target_tags,
+                'offsets': offsets} 
       
+class LengthBucketBatchSampler(torch.utils.data.Sampler):
+    """Batch Sampler Grouping Sequences of Similar Length
+
+    Forms batches from sequences sorted by length, so a single long
+    sequence does not inflate the padding of a whole batch. Batches
+    are limited by a fixed number of sequences and/or a budget for
+    the number of (padded) tokens per batch.
+    """
+    def __init__(self, 
+                 lengths: np.ndarray,
+                 batch_size: int = None,
+                 max_tokens: int = None,
+                 shuffle: bool = False) -> None:
+        """Initialize LengthBucketBatchSampler
+
+        Args:
+            lengths (np.ndarray): sequence lengths.
+            batch_size (int, optional): Maximum number of sequences
+                per batch. Defaults to None, in which case only 
+                max_tokens applies.
+            max_tokens (int, optional): Maximum number of tokens 
+                per batch incl. padding, i.e. batch size times
+                length of longest sequence in batch. Sequences 
+                exceeding the budget on their own make up a batch 
+                of their own. Defaults to None, in which case only 
+                batch_size applies.
+            shuffle (bool, optional): Shuffle order of batches and 
+                sequences of equal length. Composition of batches 
+                in terms of sequence lengths (and hence the number 
+                of batches) is the same for every iteration. Defaults
+                to False.
+        """
+        assert batch_size is not None or max_tokens is not None, "Provide 'batch_size' and/or 'max_tokens'"
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.shuffle = shuffle
+        self.sizes = self._batch_sizes(np.sort(self.lengths, kind = 'stable'))
+
+    def _batch_sizes(self, sorted_lengths: np.ndarray) -> list:
+        """Split Sorted Sequence Lengths into Batches"""
+        sizes = []
+        size = 0
+        for length in sorted_lengths:
+            # sequences are sorted, hence 'length' is the longest in batch.
+            exceeds_size = self.batch_size is not None and size + 1 > self.batch_size
+            exceeds_tokens = self.max_tokens is not None and (size + 1) * length > self.max_tokens
+            if size > 0 and (exceeds_size or exceeds_tokens):
+                sizes.append(size)
+                size = 0
+            size += 1
+        if size > 0:
+            sizes.append(size)
+        return sizes
+
+    def __iter__(self):
+        if not self.sizes:
+            # no sequences, no batches.
+            return
+        if self.shuffle:
+            # break ties between sequences of equal length randomly.
+            order = np.lexsort((np.random.permutation(len(self.lengths)), self.lengths))
+        else:
+            order = np.argsort(self.lengths, kind = 'stable')
+        batches = np.split(order, np.cumsum(self.sizes)[:-1])
+        if self.shuffle:
+            batches = [batches[i] for i in np.random.permutation(len(batches))]
+        for batch in batches:
+            yield batch.tolist()
+
+    def __len__(self):
+        return len(self.sizes)
+
+class NERDAPackedDataSet(torch.utils.data.Dataset):
+    """Packed NERDA DataSet
+
+    Packs consecutive sequences from a NERDADataSetReader into one 
+    sequence of up to max_len tokens. Every packed sequence keeps 
+    its own special tokens, position IDs and offsets, and attention 
+    is block-diagonal, so sequences do not attend to each other. 
+    Hence a packed sequence is equivalent to its sequences on their 
+    own, but takes up only one forward pass.
+
+    The transformer must accept 'position_ids' and 3-dimensional 
+    attention masks, like e.g. BERT and ELECTRA.
+    """
+    def __init__(self, data_reader: NERDADataSetReader, max_len: int) -> None:
+        """Initialize Packed DataSet
+
+        Args:
+            data_reader (NERDADataSetReader): reader with unpadded 
+                sequences to pack.
+            max_len (int): Maximum length of packed sequences.
+        """
+        assert not data_reader.pad_sequences, "sequences can not be padded to max_len for packing"
+        self.data_reader = data_reader
+        self.lengths = data_reader.sequence_lengths()
+        self.packs = []
+        pack, pack_len = [], 0
+        for i, length in enumerate(self.lengths):
+            if pack and pack_len + length > max_len:
+                self.packs.append(pack)
+                pack, pack_len = [], 0
+            pack.append(i)
+            pack_len += length
+        if pack:
+            self.packs.append(pack)
+
+    def __len__(self):
+        return len(self.packs)
+
+    def sentence_ids(self) -> np.ndarray:
+        return self.data_reader.sentence_ids()
+
+    def sequence_lengths(self) -> np.ndarray:
+        return np.array([self.lengths[pack].sum() for pack in self.packs], dtype = np.int64)
+
+    def spans(self, item: int) -> list:
+        """Positions [start, end) of Sequences in Packed Sequence"""
+        ends = np.cumsum(self.lengths[self.packs[item]]).tolist()
+        return list(zip([0] + ends[:-1], ends))
+
+    def __getitem__(self, item):
+        items = [self.data_reader[i] for i in self.packs[item]]
+        packed = {k: torch.cat([x[k] for x in items]) for k in ['input_ids', 'token_type_ids', 'target_tags', 'offsets']}
+        packed['masks'] = torch.block_diag(*[torch.ones(len(x['masks']), len(x['masks']), dtype = torch.long) for x in items])
+        packed['position_ids'] = torch.cat([torch.arange(len(x['input_ids'])) for x in items])
+        return packed
+
+class NERDADistillationDataSet(torch.utils.data.Dataset):
+    """NERDA DataSet with Soft Targets
+
+    Adds soft targets from a teacher network, e.g. its logits, to the
+    sequences of a NERDADataSetReader for knowledge distillation. Soft
+    targets are given for the words of every sentence and are placed 
+    at the first subword of every word ('soft_targets'), where 
+    'soft_masks' is 1. Target tags of unlabeled sentences are ignored
+    by the loss.
+    """
+    def __init__(self, 
+                 data_reader: NERDADataSetReader, 
+                 soft_targets: list, 
+                 labeled: list = None) -> None:
+        """Initialize Distillation DataSet
+
+        Args:
+            data_reader (NERDADataSetReader): reader with one sequence
+                per sentence.
+            soft_targets (list): array with soft targets for every word
+                of every sentence with shape (words, tags).
+            labeled (list, optional): True for every labeled sentence.
+                Defaults to None, i.e. all sentences are labeled.
+        """
+        assert data_reader.sentence_ids() is None, "soft targets can not be combined with windows"
+        assert len(soft_targets) == len(data_reader), "one array of soft targets per sentence is required"
+        self.data_reader = data_reader
+        self.soft_targets = soft_targets
+        self.labeled = labeled
+
+    def __len__(self):
+        return len(self.data_reader)
+
+    def sentence_ids(self) -> np.ndarray:
+        return self.data_reader.sentence_ids()
+
+    def sequence_lengths(self) -> np.ndarray:
+        return self.data_reader.sequence_lengths()
+
+    def __getitem__(self, item):
+        x = self.data_reader[item]
+        targets = torch.tensor(np.asarray(self.soft_targets[item], dtype = np.float32))
+        # first subwords of words excluding special tokens.
+        positions = x['offsets'].nonzero().squeeze(1)[1:-1]
+        n = min(len(positions), len(targets))
+        x['soft_targets'] = torch.zeros(len(x['offsets']), targets.shape[1])
+        x['soft_targets'][positions[:n]] = targets[:n]
+        x['soft_masks'] = torch.zeros_like(x['offsets'])
+        x['soft_masks'][positions[:n]] = 1
+        if self.labeled is not None and not self.labeled[item]:
+            x['target_tags'] = torch.full_like(x['target_tags'], IGNORE_INDEX)
+        return x
+
+class NERDAIterableDataSet(torch.utils.data.IterableDataset):
+    """Streaming NERDA DataSet
+
+    Streams sequences from shards of sentences, that are read and
+    tokenized one at a time, so data sets do not have to fit in 
+    memory. Shards are distributed between data loader workers.
+    """
+    def __init__(self,
+                 shards,
+                 transformer_tokenizer: transformers.PreTrainedTokenizer, 
+                 transformer_config: transformers.PretrainedConfig, 
+                 max_len: int, 
+                 tag_encoder: sklearn.preprocessing.LabelEncoder, 
+                 tag_outside: str,
+                 shuffle_buffer: int = 0,
+                 stride: int = None) -> None:
+        """Initialize Streaming DataSet
+
+        Args:
+            shards: iterable of shards or function returning one, e.g. 
+                a generator function. Every shard is a tuple with 
+                (sentences, tags) or a dict with 'sentences' and 'tags'. 
+                Use a function, a list or another re-iterable, if the 
+                data set is iterated more than once.
+            transformer_tokenizer (transformers.PreTrainedTokenizer): 
+                tokenizer for transformer.
+            transformer_config (transformers.PretrainedConfig): Config
+                for transformer model.
+            max_len (int): Maximum length of sentences after applying
+                transformer tokenizer.
+            tag_encoder (sklearn.preprocessing.LabelEncoder): Encoder
+                for Named-Entity tags.
+            tag_outside (str): Special Outside tag.
+            shuffle_buffer (int, optional): Size of buffer for shuffling 
+                sequences across shards. Defaults to 0, in which case
+                sequences are not shuffled.
+            stride (int, optional): if provided, split sentences exceeding
+                max_len into overlapping windows sharing 'stride' wordpieces.
+                Defaults to None.
+        """
+        self.shards = shards
+        self.reader_args = {'transformer_tokenizer': transformer_tokenizer,
+                            'transformer_config': transformer_config,
+                            'max_len': max_len,
+                            'tag_encoder': tag_encoder,
+                            'tag_outside': tag_outside,
+                            'pad_sequences': False,
+                            'stride': stride}
+        self.shuffle_buffer = shuffle_buffer
+        self.iterated = False
+
+    def _shards(self):
+        if callable(self.shards):
+            return self.shards()
+        # iterators, e.g. generators, are exhausted after one pass.
+        if iter(self.shards) is self.shards:
+            assert not self.iterated, "shards are exhausted. Provide a function returning the shards instead of a generator"
+        self.iterated = True
+        return self.shards
+
+    def _sequences(self):
+        worker_info = torch.utils.data.get_worker_info()
+        worker_id, num_workers = (0, 1) if worker_info is None else (worker_info.id, worker_info.num_workers)
+        for i, shard in enumerate(self._shards()):
+            if i % num_workers != worker_id:
+                continue
+            sentences, tags = (shard['sentences'], shard['tags']) if isinstance(shard, dict) else shard
+            data_reader = NERDADataSetReader(sentences = sentences, tags = tags, **self.reader_args)
+            for item in range(len(data_reader)):
+                yield data_reader[item]
+
+    def __iter__(self):
+        if not self.shuffle_buffer:
+            yield from self._sequences()
+            return
+        buffer = []
+        for sequence in self._sequences():
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(sequence)
+                continue
+            i = random.randrange(len(buffer))
+            yield buffer[i]
+            buffer[i] = sequence
+        random.shuffle(buffer)
+        yield from buffer
+
+def count_sentences(shards) -> int:
+    """Estimate Number of Sentences in Shards
+
+    The number is estimated from the first shard without tokenizing
+    it. Only shards in a list can be counted without reading all of
+    them, otherwise the number must be given as 'n_sentences'.
+
+    Args:
+        shards: list of shards as for NERDAIterableDataSet.
+
+    Returns:
+        int: estimated number of sentences.
+    """
+    assert isinstance(shards, (list, tuple)), \
+        "declare the number of sentences with 'n_sentences', unless shards are a list"
+    shard = shards[0]
+    sentences = shard['sentences'] if isinstance(shard, dict) else shard[0]
+    return len(sentences) * len(shards)
+
+def create_streaming_dataloader(shards,
+                                transformer_tokenizer, 
+                                transformer_config, 
+                                max_len,  
+                                tag_encoder, 
+                                tag_outside,
+                                batch_size = 1,
+                                num_workers = 1,
+                                shuffle_buffer = 0,
+                                stride = None):
+    """Create DataLoader for Streaming DataSet
+
+    Sequences are padded batch-wise. See NERDAIterableDataSet for 
+    arguments.
+    """
+    data_set = NERDAIterableDataSet(shards = shards,
+                                    transformer_tokenizer = transformer_tokenizer,
+                                    transformer_config = transformer_config,
+                                    max_len = max_len,
+                                    tag_encoder = tag_encoder,
+                                    tag_outside = tag_outside,
+                                    shuffle_buffer = shuffle_buffer,
+                                    stride = stride)
+
+    collate_fn = partial(collate_batch, 
+                         pad_token_id = transformer_config.pad_token_id,
+                         tag_outside_transformed = int(tag_encoder.transform([tag_outside])[0]))
+
+    return torch.utils.data.DataLoader(
+        data_set, batch_size = batch_size, num_workers = num_workers, collate_fn = collate_fn
+    )
+
+def collate_batch(batch: list, 
+                  pad_token_id: int, 
+                  tag_outside_transformed: int) -> dict:
+    """Pad Batch Dynamically
+
+    Collates sequences of varying lengths into a batch. Sequences 
+    are padded to the longest sequence in the batch only rather than 
+    to max_len.
+
+    Args:
+        batch (list): items from NERDADataSetReader or NERDAPackedDataSet
+            with unpadded sequences.
+        pad_token_id (int): ID of padding token.
+        tag_outside_transformed (int): Encoded outside tag used for
+            padding target tags.
+
+    Returns:
+        dict: padded tensors for batch.
+    """
+    padding_values = {'input_ids': pad_token_id, 
+                      'target_tags': tag_outside_transformed}
+    max_len = max(len(item['input_ids']) for item in batch)
+    collated = {}
+    for k in batch[0].keys():
+        if k == 'masks' and batch[0][k].dim() == 2:
+            # attention masks of packed sequences.
+            collated[k] = torch.stack([torch.nn.functional.pad(item[k], (0, max_len - len(item[k])) * 2) for item in batch])
+        else:
+            collated[k] = pad_sequence([item[k] for item in batch], 
+                                       batch_first = True, 
+                                       padding_value = padding_values.get(k, 0))
+    return collated
+
 def create_dataloader(sentences, 
                       tags, 
                       transformer_tokenizer, 
@@ -124,11 +696,48 @@ def create_dataloader(sentences,
                       tag_outside,
                       batch_size = 1,
                       num_workers = 1,
-                      pad_sequences = True):
+                      pad_sequences = False,
+                      cache_dir = None,
+                      length_bucketing = False,
+                      max_tokens = None,
+                      shuffle = False,
+                      stride = None,
+                      packing = False,
+                      soft_targets = None,
+                      labeled = None):
+    """Create DataLoader
 
-    if not pad_sequences and batch_size > 1:
-        print("setting pad_sequences to True, because batch_size is more than one.")
-        pad_sequences = True
+    Args:
+        pad_sequences (bool, optional): if True, pad all sequences to 
+            max_len. Otherwise sequences are padded to the longest 
+            sequence in every batch. Defaults to False.
+        length_bucketing (bool, optional): if True, batch sequences of 
+            similar length together with `LengthBucketBatchSampler`. 
+            Batches are then NOT in the order of the sentences. 
+            Defaults to False.
+        max_tokens (int, optional): Maximum number of tokens per batch
+            incl. padding. Replaces batch_size and implies length 
+            bucketing. Defaults to None.
+        shuffle (bool, optional): if True, shuffle the order of 
+            length-bucketed batches. Defaults to False.
+        stride (int, optional): if provided, split sentences exceeding
+            max_len into overlapping windows sharing 'stride' wordpieces. 
+            Defaults to None.
+        packing (bool, optional): if True, pack consecutive sequences 
+            into sequences of up to max_len tokens with 
+            `NERDAPackedDataSet`. Can not be combined with padding to
+            max_len or length bucketing. Defaults to False.
+        soft_targets (list, optional): soft targets for every word of
+            every sentence for knowledge distillation, see 
+            `NERDADistillationDataSet`. Defaults to None.
+        labeled (list, optional): True for every labeled sentence, if
+            soft targets are given. Defaults to None, i.e. all 
+            sentences are labeled.
+
+    See NERDADataSetReader for the remaining arguments.
+    """
+    assert not (packing and (pad_sequences or length_bucketing or max_tokens is not None)), \
+        "packing can not be combined with 'pad_sequences', 'length_bucketing' or 'max_tokens'"
 
     data_reader = NERDADataSetReader(
         sentences = sentences, 
@@ -138,12 +747,36 @@ def create_dataloader(sentences,
         max_len = max_len,
         tag_encoder = tag_encoder,
         tag_outside = tag_outside,
-        pad_sequences = pad_sequences)
-        # Don't pad sequences if batch size == 1. This improves performance.
+        pad_sequences = pad_sequences,
+        cache_dir = cache_dir,
+        stride = stride)
 
-    data_loader = torch.utils.data.DataLoader(
-        data_reader, batch_size = batch_size, num_workers = num_workers
-    )
+    # pad batch-wise, unless sequences are padded to max_len already.
+    collate_fn = None
+    if not pad_sequences:
+        collate_fn = partial(collate_batch, 
+                             pad_token_id = data_reader.pad_token_id,
+                             tag_outside_transformed = int(data_reader.tag_outside_transformed))
 
-    return data_loader
+    if soft_targets is not None:
+        assert not packing, "soft targets can not be combined with packing"
+        data_reader = NERDADistillationDataSet(data_reader, soft_targets, labeled)
+
+    if packing:
+        data_reader = NERDAPackedDataSet(data_reader, max_len = max_len)
 
+    if length_bucketing or max_tokens is not None:
+        # token budget replaces fixed batch size.
+        batch_sampler = LengthBucketBatchSampler(data_reader.sequence_lengths(),
+                                                 batch_size = batch_size if max_tokens is None else None,
+                                                 max_tokens = max_tokens,
+                                                 shuffle = shuffle)
+        data_loader = torch.utils.data.DataLoader(
+            data_reader, batch_sampler = batch_sampler, num_workers = num_workers, collate_fn = collate_fn
+        )
+    else:
+        data_loader = torch.utils.data.DataLoader(
+            data_reader, batch_size = batch_size, num_workers = num_workers, collate_fn = collate_fn
+        )
+
+    return data_loader
@@ -0,0 +1,238 @@
+"""
+This section covers structured pruning of the transformers of
+fine-tuned [NERDA.models.NERDA][] models, see `NERDA.prune`.
+
+Attention heads and neurons of the feed-forward layers (FFN) are
+scored by the sensitivity of the loss to masking them on a
+validation set (Michel et al. 2019). The lowest scoring heads and
+neurons are removed physically from the weight matrices, so the
+pruned network is smaller and faster, not just masked.
+
+Pruned heads are recorded in the buffer 'pruned_heads' of the
+network, so pruned networks saved with `save_network` are restored
+by `load_network_from_file`.
+"""
+import warnings
+import numpy as np
+import torch
+import transformers
+from transformers.pytorch_utils import prune_linear_layer
+from NERDA.networks import NERDANetwork, encoder_layers
+from NERDA.training import compute_loss
+from NERDA.utils import match_kwargs
+
+# names of the linear layers of feed-forward layers in encoder layers,
+# e.g. BERT, ELECTRA, XLM-RoBERTa and DistilBERT.
+FFN_LINEARS = [('intermediate.dense', 'output.dense'), ('ffn.lin1', 'ffn.lin2')]
+
+def _n_heads(config) -> int:
+    return getattr(config, 'num_attention_heads', None) or getattr(config, 'n_heads')
+
+def ffn_linears(layer: torch.nn.Module) -> tuple:
+    """Find Linear Layers of Feed-Forward Layer
+
+    Args:
+        layer (torch.nn.Module): encoder layer.
+
+    Returns:
+        tuple: names of the input and output linear layers.
+    """
+    names = dict(layer.named_modules())
+    for lin1, lin2 in FFN_LINEARS:
+        if lin1 in names and lin2 in names:
+            return lin1, lin2
+    raise ValueError(f'Feed-forward layer of {type(layer).__name__} not found')
+
+def _replace(layer: torch.nn.Module, name: str, module: torch.nn.Module) -> None:
+    parent, _, child = name.rpartition('.')
+    setattr(layer.get_submodule(parent), child, module)
+
+def importance_scores(network: NERDANetwork, data_loader, n_tags: int) -> tuple:
+    """Score Attention Heads and FFN Neurons
+
+    Importance is the absolute gradient of the loss with respect to
+    a mask of every head and neuron accumulated over the data set
+    and normalized by its L2-norm within every layer.
+
+    Args:
+        network (NERDANetwork): fine-tuned network.
+        data_loader: data loader with target tags, e.g. for the
+            validation data set.
+        n_tags (int): number of tags.
+
+    Returns:
+        tuple: scores of heads with shape (layers, heads) and list 
+        with scores of FFN neurons for every layer. Heads are not 
+        scored (None), if heads have been pruned already or the 
+        transformer does not accept head masks.
+    """
+    transformer = network.transformer
+    layers = encoder_layers(transformer)
+    pruned = getattr(network, 'pruned_heads', torch.zeros(len(layers), _n_heads(transformer.config), dtype = torch.bool))
+    device = network.tags.weight.device
+
+    head_mask = torch.ones(pruned.shape, device = device, requires_grad = True)
+    ffn_masks = []
+    handles = []
+    for layer in layers:
+        lin2 = layer.get_submodule(ffn_linears(layer)[1])
+        mask = torch.ones(lin2.in_features, device = device, requires_grad = True)
+        handles.append(lin2.register_forward_pre_hook(lambda module, inputs, mask = mask: (inputs[0] * mask,)))
+        ffn_masks.append(mask)
+
+    requires_grad = [p.requires_grad for p in network.parameters()]
+    for p in network.parameters():
+        p.requires_grad = False
+    network.eval()
+    verbosity = transformers.logging.get_verbosity()
+    # head masks are not supported by fused attention kernels.
+    transformers.logging.set_verbosity_error()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            for batch in data_loader:
+                # head masks must have the same number of heads in every
+                # layer, hence heads are only scored before pruning heads.
+                inputs = match_kwargs(transformer.forward,
+                                      input_ids = batch['input_ids'].to(device),
+                                      attention_mask = batch['masks'].to(device),
+                                      token_type_ids = batch['token_type_ids'].to(device),
+                                      head_mask = None if pruned.any() else head_mask)
+                outputs = network.tags(transformer(**inputs)[0])
+                loss = compute_loss([outputs], batch['target_tags'], batch['masks'], device, n_tags)
+                loss.backward()
+    finally:
+        transformers.logging.set_verbosity(verbosity)
+        for handle in handles:
+            handle.remove()
+        for p, r in zip(network.parameters(), requires_grad):
+            p.requires_grad = r
+
+    normalize = lambda x: x / (np.linalg.norm(x) + 1e-12)
+    head_scores = None
+    if head_mask.grad is not None:
+        head_scores = np.stack([normalize(row) for row in head_mask.grad.abs().cpu().numpy()])
+    ffn_scores = [normalize(mask.grad.abs().cpu().numpy()) for mask in ffn_masks]
+    return head_scores, ffn_scores
+
+def _lowest(scores: list, sparsity: float) -> list:
+    """Lowest Scoring Units Keeping at Least One Unit per Layer"""
+    remaining = [len(row) for row in scores]
+    n_prune = int(sparsity * sum(remaining))
+    candidates = sorted((s, i, j) for i, row in enumerate(scores) for j, s in enumerate(row))
+    selected = [[] for _ in scores]
+    for _, i, j in candidates:
+        if n_prune == 0:
+            break
+        if remaining[i] > 1:
+            selected[i].append(j)
+            remaining[i] -= 1
+            n_prune -= 1
+    return selected
+
+def _register_pruned_heads(network: NERDANetwork) -> None:
+    # the buffer marks the network as pruned in saved weights, also if
+    # only FFN neurons are pruned.
+    if not hasattr(network, 'pruned_heads'):
+        layers = encoder_layers(network.transformer)
+        network.register_buffer('pruned_heads', torch.zeros(len(layers), _n_heads(network.transformer.config), dtype = torch.bool))
+
+def prune_heads(network: NERDANetwork, heads: dict) -> None:
+    """Remove Attention Heads
+
+    Args:
+        network (NERDANetwork): network.
+        heads (dict): original indices of heads to remove by layer.
+    """
+    _register_pruned_heads(network)
+    heads = {layer: [h for h in layer_heads if not network.pruned_heads[layer, h]] for layer, layer_heads in heads.items()}
+    heads = {layer: layer_heads for layer, layer_heads in heads.items() if layer_heads}
+    if heads:
+        network.transformer.prune_heads(heads)
+    for layer, layer_heads in heads.items():
+        network.pruned_heads[layer, layer_heads] = True
+
+def prune_ffn(network: NERDANetwork, layer: int, keep: list) -> None:
+    """Keep Selected Neurons of Feed-Forward Layer
+
+    Args:
+        network (NERDANetwork): network.
+        layer (int): index of encoder layer.
+        keep (list): indices of neurons to keep.
+    """
+    encoder_layer = encoder_layers(network.transformer)[layer]
+    lin1, lin2 = ffn_linears(encoder_layer)
+    index = torch.as_tensor(sorted(keep), dtype = torch.long, device = network.tags.weight.device)
+    _replace(encoder_layer, lin1, prune_linear_layer(encoder_layer.get_submodule(lin1), index, dim = 0))
+    _replace(encoder_layer, lin2, prune_linear_layer(encoder_layer.get_submodule(lin2), index, dim = 1))
+
+def prune_network(network: NERDANetwork,
+                  data_loader,
+                  n_tags: int,
+                  head_sparsity: float = 0.25,
+                  ffn_sparsity: float = 0.25) -> dict:
+    """Prune Attention Heads and FFN Neurons
+
+    Removes the lowest scoring heads and neurons, see
+    `importance_scores`. At least one head and one neuron are kept
+    in every layer.
+
+    Args:
+        network (NERDANetwork): fine-tuned network.
+        data_loader: data loader with target tags for scoring.
+        n_tags (int): number of tags.
+        head_sparsity (float, optional): share of heads to remove. 
+            Heads can only be pruned once. Defaults to 0.25.
+        ffn_sparsity (float, optional): share of (remaining) FFN
+            neurons to remove. Defaults to 0.25.
+
+    Returns:
+        dict: numbers of parameters, heads and FFN neurons before
+        and after pruning.
+    """
+    assert isinstance(network, NERDANetwork), "Pruning requires a NERDANetwork"
+    assert 0 <= head_sparsity < 1 and 0 <= ffn_sparsity < 1, "sparsity must be in [0, 1)"
+    before = network_size(network)
+    head_scores, ffn_scores = importance_scores(network, data_loader, n_tags)
+    _register_pruned_heads(network)
+
+    if head_sparsity > 0:
+        if head_scores is None:
+            raise ValueError('Heads can not be scored: heads have been pruned already or transformer does not accept head masks')
+        prune_heads(network, {layer: heads for layer, heads in enumerate(_lowest(list(head_scores), head_sparsity))})
+    for layer, (scores, removed) in enumerate(zip(ffn_scores, _lowest(ffn_scores, ffn_sparsity))):
+        if removed:
+            prune_ffn(network, layer, sorted(set(range(len(scores))) - set(removed)))
+
+    after = network_size(network)
+    return {key: (before[key], after[key]) for key in before}
+
+def network_size(network: NERDANetwork) -> dict:
+    """Number of Parameters, Heads and FFN Neurons of Network"""
+    layers = encoder_layers(network.transformer)
+    pruned = getattr(network, 'pruned_heads', None)
+    n_heads = len(layers) * _n_heads(network.transformer.config) - (int(pruned.sum()) if pruned is not None else 0)
+    return {'parameters': sum(p.numel() for p in network.parameters()),
+            'heads': n_heads,
+            'ffn_neurons': sum(layer.get_submodule(ffn_linears(layer)[1]).in_features for layer in layers)}
+
+def restore_pruning(network: NERDANetwork, state_dict: dict) -> None:
+    """Prune Network like Saved Weights
+
+    Removes the heads recorded in the saved weights and reduces the
+    FFN layers to their saved sizes, so the saved weights can be
+    loaded into the network.
+
+    Args:
+        network (NERDANetwork): network.
+        state_dict (dict): saved weights of pruned network.
+    """
+    pruned = state_dict['pruned_heads'].cpu()
+    prune_heads(network, {layer: row.nonzero().flatten().tolist() for layer, row in enumerate(pruned)})
+    prefix = [name for name, module in network.named_modules() if module is encoder_layers(network.transformer)][0]
+    for i, layer in enumerate(encoder_layers(network.transformer)):
+        lin1 = ffn_linears(layer)[0]
+        size = state_dict[f'{prefix}.{i}.{lin1}.weight'].shape[0]
+        if size < layer.get_submodule(lin1).out_features:
+            # saved weights replace those of the kept neurons.
+            prune_ffn(network, i, list(range(size)))
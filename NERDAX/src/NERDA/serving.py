@@ -0,0 +1,357 @@
+"""
+This section covers functionality for serving [NERDA.models.NERDA][]
+and [NERDA.precooked.Precooked][] models over HTTP.
+
+The server exposes JSON endpoints for predictions, that are batched
+server-side with a `NERDA.inference.MicroBatcher`, together with
+health, readiness and metrics endpoints. Start it from the command
+line with `nerda serve` or from Python with `NERDAServer`.
+
+Endpoints:
+    POST /predict: {"sentences": [["Jens", "Hansen"]]} with
+        word-tokenized sentences.
+    POST /predict_text: {"text": "Jens Hansen har en bondegård"}.
+    GET /health: server is running.
+    GET /ready: model is loaded and warmed up.
+    GET /metrics: counters for requests, batches and latency.
+"""
+import asyncio
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from NERDA import precooked
+from NERDA.models import NERDA
+
+def load_model(model: str = 'NERDA',
+               weights: str = None,
+               device: str = None,
+               **kwargs) -> NERDA:
+    """Load Model with Weights from Local File
+
+    Args:
+        model (str, optional): 'NERDA' or name of a precooked model,
+            e.g. 'DA_BERT_ML' or 'EN_ELECTRA_EN'. Defaults to 'NERDA'.
+        weights (str, optional): path to weights of network saved with
+            `save_network`. Defaults to None, in which case precooked
+            models are loaded from the '.nerda' folder in the home
+            directory.
+        device (str, optional): Computational device. Defaults to None.
+        kwargs: arguments for `NERDA` model, e.g. 'transformer',
+            'tag_scheme' and 'max_len'. Only for 'NERDA'.
+
+    Returns:
+        NERDA: model with weights loaded.
+    """
+    if model == 'NERDA':
+        assert weights is not None, "'weights' must be provided for NERDA models"
+        nerda = NERDA(device = device, **kwargs)
+        nerda.load_network_from_file(weights)
+        return nerda
+
+    model_class = getattr(precooked, model, None)
+    if not (isinstance(model_class, type) and issubclass(model_class, precooked.Precooked)):
+        raise ValueError(f"Unknown model '{model}'. Must be 'NERDA' or a precooked model.")
+    assert not kwargs, "Precooked models can not be customized"
+    nerda = model_class(device = device)
+    nerda.load_network(weights)
+    return nerda
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request Handler for NERDAServer"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.nerda.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if status == 503:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server.nerda
+        if self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        elif self.path == '/ready':
+            self._send(200 if server.ready else 503, {'ready': server.ready})
+        elif self.path == '/metrics':
+            self._send(200, server.metrics())
+        else:
+            self._send(404, {'error': f'Unknown endpoint {self.path}'})
+
+    def do_POST(self):
+        server = self.server.nerda
+        if self.path not in ('/predict', '/predict_text'):
+            self._send(404, {'error': f'Unknown endpoint {self.path}'})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        if length > server.max_body_size:
+            self._send(413, {'error': 'Request body too large'})
+            self.close_connection = True
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send(400, {'error': 'Request body must be JSON'})
+            return
+        status, result = server.handle(self.path, body)
+        self._send(status, result)
+
+class NERDAServer:
+    """HTTP Server for NERDA Models
+
+    Requests are handled in threads and handed over to a
+    `MicroBatcher` running in an asyncio event loop in a background
+    thread, that merges them into shared forward passes. Requests
+    are rejected with status 503, when the queue of the batcher is
+    full or the model is not ready.
+
+    Attributes:
+        host (str): host name.
+        port (int): port.
+        ready (bool): True, when model is loaded and warmed up.
+    """
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 8000,
+                 max_batch_size: int = 32,
+                 max_wait: float = 0.005,
+                 max_queue_size: int = 256,
+                 max_body_size: int = 1_000_000,
+                 timeout: float = 30,
+                 verbose: bool = False,
+                 **kwargs) -> None:
+        """Initialize NERDAServer
+
+        Args:
+            host (str, optional): host name. Defaults to '127.0.0.1'.
+            port (int, optional): port. 0 picks a free port. Defaults
+                to 8000.
+            max_batch_size (int, optional): maximum number of sentences
+                per batch. Defaults to 32.
+            max_wait (float, optional): maximum time in seconds to wait
+                for more requests. Defaults to 0.005.
+            max_queue_size (int, optional): maximum number of queued
+                requests. Defaults to 256.
+            max_body_size (int, optional): maximum size of request body
+                in bytes. Defaults to 1,000,000.
+            timeout (float, optional): timeout in seconds for a single
+                request. Defaults to 30.
+            verbose (bool, optional): if True, log every request.
+                Defaults to False.
+            kwargs: arguments for `InferenceSession`, e.g.
+                'sent_tokenize' and 'word_tokenize'.
+        """
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue_size = max_queue_size
+        self.max_body_size = max_body_size
+        self.timeout = timeout
+        self.verbose = verbose
+        self.session_kwargs = kwargs
+        self.model = None
+        self.batcher = None
+        self.ready = False
+        self.counts = {'requests': 0, 'errors': 0, 'rejected': 0}
+        self.latency = {'count': 0, 'sum': 0.0, 'max': 0.0}
+        self.lock = threading.Lock()
+
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.nerda = self
+        self.host, self.port = self.httpd.server_address[:2]
+        self.loop = asyncio.new_event_loop()
+        self.threads = []
+
+    def start(self) -> 'NERDAServer':
+        """Start Server in Background Threads"""
+        for target in (self.loop.run_forever, self.httpd.serve_forever):
+            thread = threading.Thread(target = target, daemon = True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def set_model(self, model: NERDA) -> None:
+        """Serve Model
+
+        Compiles model for inference and warms it up. The server is
+        ready afterwards.
+
+        Args:
+            model (NERDA): model to serve.
+        """
+        self.ready = False
+        self.model = model
+        self.batcher = model.micro_batcher(max_batch_size = self.max_batch_size,
+                                           max_wait = self.max_wait,
+                                           max_queue_size = self.max_queue_size,
+                                           **self.session_kwargs)
+        self.ready = True
+
+    def shutdown(self) -> None:
+        """Stop Server"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.batcher is not None:
+            asyncio.run_coroutine_threadsafe(self.batcher.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        for thread in self.threads:
+            thread.join()
+
+    def handle(self, path: str, body: dict) -> tuple:
+        """Handle Prediction Request
+
+        Args:
+            path (str): '/predict' or '/predict_text'.
+            body (dict): JSON body of request.
+
+        Returns:
+            tuple: HTTP status and JSON response.
+        """
+        start = time.perf_counter()
+        with self.lock:
+            self.counts['requests'] += 1
+        if not self.ready:
+            return self._fail('rejected', 503, 'Model is not ready')
+        return_confidence = bool(body.get('return_confidence', False))
+        try:
+            if path == '/predict':
+                sentences = body.get('sentences')
+                if not (isinstance(sentences, list) and all(isinstance(s, list) and all(isinstance(w, str) for w in s) for s in sentences)):
+                    return self._fail('errors', 400, "'sentences' must be a list of list of word-tokens")
+                coroutine = self.batcher.predict(sentences, return_confidence = return_confidence)
+            else:
+                text = body.get('text')
+                if not isinstance(text, str):
+                    return self._fail('errors', 400, "'text' must be a string")
+                coroutine = self.batcher.predict_text(text, return_confidence = return_confidence)
+            result = asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(self.timeout)
+        except asyncio.QueueFull:
+            return self._fail('rejected', 503, 'Too many requests in queue')
+        except Exception as e:
+            return self._fail('errors', 500, f'{type(e).__name__}: {e}')
+
+        if path == '/predict_text':
+            sentences, result = result
+        response = {'sentences': sentences} if path == '/predict_text' else {}
+        if return_confidence:
+            response['predictions'], response['confidences'] = result
+        else:
+            response['predictions'] = result
+
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latency['count'] += 1
+            self.latency['sum'] += elapsed
+            self.latency['max'] = max(self.latency['max'], elapsed)
+        return 200, response
+
+    def _fail(self, counter: str, status: int, message: str) -> tuple:
+        with self.lock:
+            self.counts[counter] += 1
+        return status, {'error': message}
+
+    def metrics(self) -> dict:
+        """Metrics for Server
+
+        Returns:
+            dict: number of requests, errors and rejected requests,
+            latency of successful requests in seconds, and number of
+            batches, sentences and queued requests of the batcher.
+        """
+        with self.lock:
+            metrics = dict(self.counts)
+            metrics['latency_count'] = self.latency['count']
+            metrics['latency_sum'] = self.latency['sum']
+            metrics['latency_max'] = self.latency['max']
+        if self.batcher is not None:
+            metrics['batches'] = self.batcher.stats['batches']
+            metrics['sentences'] = self.batcher.stats['sentences']
+            metrics['queue_size'] = self.batcher.queue.qsize() if self.batcher.queue is not None else 0
+        return metrics
+
+class NERDAClient:
+    """Client for NERDAServer
+
+    Minimal client with no dependencies beyond the standard library.
+
+    Attributes:
+        url (str): URL of server, e.g. 'http://127.0.0.1:8000'.
+    """
+    def __init__(self, url: str = 'http://127.0.0.1:8000', timeout: float = 30) -> None:
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path: str, body: dict = None) -> tuple:
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        request = urllib.request.Request(self.url + path,
+                                         data = data,
+                                         headers = {'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout = self.timeout) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b'{}')
+
+    def predict(self, sentences: list, return_confidence: bool = False) -> tuple:
+        """POST /predict. Returns HTTP status and JSON response."""
+        return self._request('/predict', {'sentences': sentences, 'return_confidence': return_confidence})
+
+    def predict_text(self, text: str, return_confidence: bool = False) -> tuple:
+        """POST /predict_text. Returns HTTP status and JSON response."""
+        return self._request('/predict_text', {'text': text, 'return_confidence': return_confidence})
+
+    def health(self) -> tuple:
+        """GET /health. Returns HTTP status and JSON response."""
+        return self._request('/health')
+
+    def ready(self) -> tuple:
+        """GET /ready. Returns HTTP status and JSON response."""
+        return self._request('/ready')
+
+    def metrics(self) -> tuple:
+        """GET /metrics. Returns HTTP status and JSON response."""
+        return self._request('/metrics')
+
+def serve(model: NERDA = None,
+          model_loader: callable = None,
+          host: str = '127.0.0.1',
+          port: int = 8000,
+          **kwargs) -> None:
+    """Serve Model until Interrupted
+
+    The server starts before the model is loaded and reports ready,
+    when the model is loaded and warmed up.
+
+    Args:
+        model (NERDA, optional): model to serve. Defaults to None.
+        model_loader (callable, optional): function returning model to
+            serve, if model is not provided. Defaults to None.
+        host (str, optional): host name. Defaults to '127.0.0.1'.
+        port (int, optional): port. Defaults to 8000.
+        kwargs: arguments for `NERDAServer`.
+    """
+    server = NERDAServer(host = host, port = port, **kwargs).start()
+    print(f'Serving on http://{server.host}:{server.port}')
+    try:
+        server.set_model(model if model is not None else model_loader())
+        print('Model ready')
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
@@ -0,0 +1,190 @@
+"""
+This section covers fast sentence and word splitters for texts,
+that can replace the `nltk` tokenizers used by default for
+predictions on texts with [NERDA.models.NERDA][] models.
+
+The splitters are precompiled regular expressions with rules,
+that approximate the `nltk` Punkt sentence tokenizer and Treebank
+word tokenizer on Danish and English texts, e.g. abbreviations,
+initials, ordinals, numbers and contractions. They do not require
+any downloaded data, so they run offline.
+
+## Examples
+>>> from NERDA.splitters import sent_tokenize, word_tokenize
+>>> [word_tokenize(sentence) for sentence in sent_tokenize("Hr. Hansen kom kl. 10.30. Han blev til d. 3. juni.")]
+[['Hr.', 'Hansen', 'kom', 'kl.', '10.30', '.'], ['Han', 'blev', 'til', 'd.', '3.', 'juni', '.']]
+"""
+import re
+import torch
+from typing import Callable, List
+
+ABBREVIATIONS = {
+    'danish': {'adm', 'alm', 'ang', 'bl.a', 'bl', 'ca', 'cand', 'd', 'dvs', 'e.l', 'eks', 'ekskl',
+               'el', 'etc', 'evt', 'f.eks', 'fhv', 'fr', 'fru', 'gl', 'hhv', 'hr', 'inkl', 'jf',
+               'jvf', 'kap', 'kbh', 'kl', 'ltd', 'm.fl', 'm.m', 'm.v', 'mag', 'mht', 'mio', 'mia',
+               'mv', 'nr', 'o.l', 'osv', 'pga', 'pr', 'prof', 'sml', 'skt', 'st', 'stk', 'tlf',
+               'u.s', 'vha', 'vs'},
+    'english': {'a.m', 'approx', 'apr', 'aug', 'capt', 'co', 'col', 'corp', 'dec', 'dept', 'dr',
+                'e.g', 'est', 'etc', 'feb', 'fig', 'gen', 'gov', 'i.e', 'inc', 'jan', 'jr', 'jul',
+                'jun', 'lt', 'ltd', 'mar', 'mr', 'mrs', 'ms', 'mt', 'no', 'nov', 'oct', 'p.m',
+                'prof', 'rep', 'rev', 'sen', 'sep', 'sept', 'sgt', 'sr', 'st', 'u.k', 'u.s',
+                'vol', 'vs'},
+}
+ABBREVIATIONS[None] = ABBREVIATIONS['danish'] | ABBREVIATIONS['english']
+
+# candidate sentence boundaries: end punctuation, optionally followed by
+# closing quotes and brackets, followed by white space.
+SENTENCE_END = re.compile(r'([.!?…]+)(["\'”’»)\]]*)\s+')
+SENTENCE_START = re.compile(r'["\'“‘«(\[]*(\w)')
+
+WORD = re.compile(r"""
+    \.\.\.+                             # ellipsis
+  | https?://\S+[^\s.,;:!?"')\]]        # urls
+  | (?i:\w+(?=n't\b))                   # words before English negation
+  | (?i:n't\b)                          # English negation
+  | '(?i:s|re|ve|ll|d|m)\b              # English clitics and genitive
+  | \d+(?:[.,:/]\d+)+                   # numbers, times and dates
+  | \w+(?:[./]\w+)*\.(?![.\w])          # words with a period, handled below
+  | \w+(?:(?:[-./]|['’](?!(?i:s|re|ve|ll|d|m)\b))\w+)*
+                                        # words incl. hyphens, slashes and apostrophes
+  | --+                                 # dashes
+  | \S                                  # any other character
+""", re.VERBOSE)
+
+def _is_boundary(text: str, match: re.Match, abbreviations: set) -> bool:
+    punctuation = match.group(1)
+    start = SENTENCE_START.match(text, match.end())
+    if start is None:
+        return True
+    if punctuation[-1] in '!?':
+        return True
+    next_upper = start.group(1).isupper() or start.group(1).isdigit()
+    if punctuation != '.':
+        # ellipsis.
+        return next_upper
+    words = text[:match.start()].rsplit(None, 1)
+    if not words:
+        # punctuation at the start of the text.
+        return True
+    word = words[-1].lstrip('"\'“‘«([')
+    if word.lower() in abbreviations:
+        return False
+    # initials, e.g. 'J. Hansen'.
+    if len(word) == 1 and word.isalpha():
+        return False
+    # ordinals, e.g. '3. juni'.
+    if word.isdigit():
+        return next_upper
+    return True
+
+def sent_tokenize(text: str, language: str = None) -> List[str]:
+    """Split Text into Sentences
+
+    Splits after '.', '!', '?' and ellipses followed by white space,
+    except after abbreviations, initials and (Danish) ordinals
+    followed by lower case.
+
+    Args:
+        text (str): text.
+        language (str, optional): 'danish' or 'english' for
+            abbreviations of that language. Defaults to None, i.e.
+            abbreviations of both languages.
+
+    Returns:
+        List[str]: sentences.
+    """
+    abbreviations = ABBREVIATIONS[language]
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        if _is_boundary(text, match, abbreviations):
+            sentence = text[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+    sentence = text[start:].strip()
+    if sentence:
+        sentences.append(sentence)
+    return sentences
+
+def word_tokenize(text: str, language: str = None) -> List[str]:
+    """Split Sentence into Words
+
+    Splits punctuation from words except periods of abbreviations
+    and ordinals, that are kept unless they end the sentence. Like
+    the Treebank tokenizer, English clitics are split off, e.g.
+    "don't" -> 'do', "n't", and double quotes are replaced by '``'
+    and "''".
+
+    Args:
+        text (str): sentence.
+        language (str, optional): 'danish' or 'english' for
+            abbreviations of that language. Defaults to None, i.e.
+            abbreviations of both languages.
+
+    Returns:
+        List[str]: words.
+    """
+    abbreviations = ABBREVIATIONS[language]
+    words = []
+    for match in WORD.finditer(text):
+        word = match.group()
+        if word == '"' or word in '“”':
+            before = text[:match.start()]
+            word = '``' if not before or before[-1].isspace() or before[-1] in '([{<' else "''"
+            words.append(word)
+        elif word[-1] == '.' and len(word) > 1 and not word.startswith('..'):
+            stem = word[:-1]
+            last = text[match.end():].strip(' \t\n"\'”’»)]') == ''
+            if not last and (stem.lower() in abbreviations or (len(stem) == 1 and stem.isalpha()) or '.' in stem or stem.isdigit()):
+                words.append(word)
+            else:
+                words.extend([stem, '.'])
+        else:
+            words.append(word)
+    return words
+
+_splitters = {}
+
+def _init_worker(sent_tokenize: Callable, word_tokenize: Callable) -> None:
+    # with 'fork' the tokenizers are inherited and never pickled.
+    _splitters['sent_tokenize'] = sent_tokenize
+    _splitters['word_tokenize'] = word_tokenize
+
+def _split_chunk(texts: List[str]) -> List[List[List[str]]]:
+    return split_texts(texts, **_splitters)
+
+def split_texts(texts: List[str],
+                sent_tokenize: Callable = sent_tokenize,
+                word_tokenize: Callable = word_tokenize,
+                n_workers: int = None,
+                chunk_size: int = 64) -> List[List[List[str]]]:
+    """Split Texts into Sentences and Words
+
+    Splits texts in worker processes, if more than one worker is
+    requested. Long single texts can be split in parallel by
+    passing their paragraphs as texts.
+
+    Args:
+        texts (List[str]): texts.
+        sent_tokenize (Callable, optional): function for sentence
+            tokenization. Defaults to `NERDA.splitters.sent_tokenize`.
+        word_tokenize (Callable, optional): function for word
+            tokenization. Defaults to `NERDA.splitters.word_tokenize`.
+        n_workers (int, optional): number of worker processes.
+            Defaults to None, i.e. texts are split in this process.
+        chunk_size (int, optional): number of texts per task for
+            workers. Defaults to 64.
+
+    Returns:
+        List[List[List[str]]]: word-tokenized sentences for every text.
+    """
+    if n_workers is None or n_workers <= 1 or len(texts) <= chunk_size:
+        return [[word_tokenize(sentence) for sentence in sent_tokenize(text)] for text in texts]
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    # tokenizers must be picklable, unless the start method is 'fork'.
+    start_method = 'fork' if 'fork' in torch.multiprocessing.get_all_start_methods() else 'spawn'
+    context = torch.multiprocessing.get_context(start_method)
+    with context.Pool(n_workers, initializer = _init_worker, initargs = (sent_tokenize, word_tokenize)) as pool:
+        results = pool.map(_split_chunk, chunks)
+    return [sentences for chunk in results for sentences in chunk]
@@ -1,5 +1,5 @@
 import numpy as np
-from .preprocessing import create_dataloader
+from .preprocessing import create_dataloader, create_streaming_dataloader, count_sentences, IGNORE_INDEX
 from sklearn import preprocessing
 from transformers import get_linear_schedule_with_warmup
 import random
@@ -7,36 +7,59 @@ import torch
 from torch.optim import AdamW
 from tqdm import tqdm
 
-def train(model, data_loader, optimizer, device, scheduler, n_tags):
+def n_batches(data_loader) -> int:
+    """Number of Batches in DataLoader, None if Streaming"""
+    if isinstance(data_loader.dataset, torch.utils.data.IterableDataset):
+        return None
+    return len(data_loader)
+
+def train(model, data_loader, optimizer, device, scheduler, n_tags, distillation_alpha = 0.5, distillation_temperature = 2.0):
     """One Iteration of Training"""
 
     model.train()    
     final_loss = 0.0
+    n = 0
     
-    for dl in tqdm(data_loader, total=len(data_loader)):
+    for dl in tqdm(data_loader, total=n_batches(data_loader)):
 
         optimizer.zero_grad()
+        # soft targets for knowledge distillation are not inputs for model.
+        soft_targets = dl.pop('soft_targets', None)
+        soft_masks = dl.pop('soft_masks', None)
         outputs = model(**dl)
-        loss = compute_loss(outputs, 
-                            dl.get('target_tags'),
-                            dl.get('masks'), 
-                            device, 
-                            n_tags)
+        if soft_targets is None:
+            loss = compute_loss(outputs, 
+                                dl.get('target_tags'),
+                                dl.get('masks'), 
+                                device, 
+                                n_tags)
+        else:
+            loss = compute_distillation_loss(outputs,
+                                             soft_targets,
+                                             soft_masks,
+                                             dl.get('target_tags'),
+                                             dl.get('masks'),
+                                             device,
+                                             n_tags,
+                                             alpha = distillation_alpha,
+                                             temperature = distillation_temperature)
         loss.backward()
         optimizer.step()
         scheduler.step()
         final_loss += loss.item()
+        n += 1
 
     # Return average loss
-    return final_loss / len(data_loader)
+    return final_loss / n
 
 def validate(model, data_loader, device, n_tags):
     """One Iteration of Validation"""
 
     model.eval()
     final_loss = 0.0
+    n = 0
 
-    for dl in tqdm(data_loader, total=len(data_loader)):
+    for dl in tqdm(data_loader, total=n_batches(data_loader)):
         
         outputs = model(**dl)
         loss = compute_loss(outputs, 
@@ -45,32 +68,74 @@ def validate(model, data_loader, device, n_tags):
                             device, 
                             n_tags)
         final_loss += loss.item()
+        n += 1
     
     # Return average loss.
-    return final_loss / len(data_loader)   
+    return final_loss / n
 
 def compute_loss(preds, target_tags, masks, device, n_tags):
     
-    # initialize loss function.
-    lfn = torch.nn.CrossEntropyLoss()
+    # attention masks of packed sequences are block-diagonal.
+    if masks.dim() == 3:
+        masks = masks.diagonal(dim1 = 1, dim2 = 2)
 
     # Compute active loss to not compute loss of paddings
-    active_loss = masks.view(-1) == 1
-
+    active_labels = target_tags.to(device).masked_fill(masks.to(device) != 1, IGNORE_INDEX)
+    # outputs of several classification heads stacked, e.g. early exits.
+    if preds[0].dim() == 4:
+        active_labels = active_labels.repeat(preds[0].shape[0], 1, 1)
     active_logits = preds[0].view(-1, n_tags)
-    active_labels = torch.where(
-        active_loss,
-        target_tags.view(-1),
-        torch.tensor(lfn.ignore_index).type_as(target_tags)
-    )
-
-    active_labels = torch.as_tensor(active_labels, device = torch.device(device), dtype = torch.long)
     
     # Only compute loss on actual token predictions
-    loss = lfn(active_logits, active_labels)
+    loss = torch.nn.functional.cross_entropy(active_logits, 
+                                             active_labels.view(-1), 
+                                             ignore_index = IGNORE_INDEX)
 
     return loss
 
+def compute_distillation_loss(preds, soft_targets, soft_masks, target_tags, masks, device, n_tags, alpha = 0.5, temperature = 2.0):
+    """Loss for Knowledge Distillation
+
+    Combines the cross-entropy with the target tags and the 
+    Kullback-Leibler divergence between the distributions of the soft
+    targets (teacher logits) and the outputs softened by temperature.
+
+    Args:
+        preds: outputs of network.
+        soft_targets (torch.Tensor): teacher logits for tokens.
+        soft_masks (torch.Tensor): 1 for tokens with soft targets.
+        target_tags (torch.Tensor): target tags. Ignored for tokens 
+            with IGNORE_INDEX, e.g. of unlabeled sentences.
+        masks (torch.Tensor): attention masks.
+        device (str): Computational device.
+        n_tags (int): number of tags.
+        alpha (float, optional): weight of cross-entropy. The 
+            divergence is weighted by 1 - alpha. Defaults to 0.5.
+        temperature (float, optional): temperature for softening 
+            distributions. Defaults to 2.0.
+
+    Returns:
+        torch.Tensor: loss.
+    """
+    logits = preds[0]
+    active_labels = target_tags.to(device).masked_fill(masks.to(device) != 1, IGNORE_INDEX).view(-1)
+    # batches can consist of unlabeled sentences only.
+    n_labels = (active_labels != IGNORE_INDEX).sum().clamp(min = 1)
+    ce = torch.nn.functional.cross_entropy(logits.view(-1, n_tags), 
+                                           active_labels, 
+                                           ignore_index = IGNORE_INDEX, 
+                                           reduction = 'sum') / n_labels
+
+    active = soft_masks.to(device) == 1
+    kl = logits.new_zeros(())
+    if active.any():
+        kl = torch.nn.functional.kl_div(torch.log_softmax(logits[active] / temperature, dim = -1),
+                                        torch.log_softmax(soft_targets.to(device)[active] / temperature, dim = -1),
+                                        log_target = True,
+                                        reduction = 'batchmean') * temperature ** 2
+
+    return alpha * ce + (1 - alpha) * kl
+
 def enforce_reproducibility(seed = 42) -> None:
     """Enforce Reproducibity
 
@@ -110,7 +175,15 @@ def train_model(network,
                 learning_rate = 5e-5,
                 device = None,
                 fixed_seed = 42,
-                num_workers = 1):
+                num_workers = 1,
+                cache_dir = None,
+                length_bucketing = False,
+                max_tokens = None,
+                stride = None,
+                packing = False,
+                shuffle_buffer = 0,
+                distillation_alpha = 0.5,
+                distillation_temperature = 2.0):
     
     if fixed_seed is not None:
         enforce_reproducibility(fixed_seed)
@@ -119,15 +192,38 @@ def train_model(network,
     n_tags = tag_encoder.classes_.shape[0]
 
     # prepare datasets for modelling by creating data readers and loaders
-    dl_train = create_dataloader(sentences = dataset_training.get('sentences'),
-                                 tags = dataset_training.get('tags'), 
-                                 transformer_tokenizer = transformer_tokenizer, 
-                                 transformer_config = transformer_config,
-                                 max_len = max_len, 
-                                 batch_size = train_batch_size, 
-                                 tag_encoder = tag_encoder,
-                                 tag_outside = tag_outside,
-                                 num_workers = num_workers)
+    if 'shards' in dataset_training:
+        # stream data set, that does not fit in memory.
+        assert not (cache_dir or length_bucketing or max_tokens or packing), \
+            "'cache_dir', 'length_bucketing', 'max_tokens' and 'packing' are not supported for streaming"
+        dl_train = create_streaming_dataloader(shards = dataset_training.get('shards'),
+                                               transformer_tokenizer = transformer_tokenizer, 
+                                               transformer_config = transformer_config,
+                                               max_len = max_len, 
+                                               batch_size = train_batch_size, 
+                                               tag_encoder = tag_encoder,
+                                               tag_outside = tag_outside,
+                                               num_workers = num_workers,
+                                               shuffle_buffer = shuffle_buffer,
+                                               stride = stride)
+    else:
+        dl_train = create_dataloader(sentences = dataset_training.get('sentences'),
+                                     tags = dataset_training.get('tags'), 
+                                     transformer_tokenizer = transformer_tokenizer, 
+                                     transformer_config = transformer_config,
+                                     max_len = max_len, 
+                                     batch_size = train_batch_size, 
+                                     tag_encoder = tag_encoder,
+                                     tag_outside = tag_outside,
+                                     num_workers = num_workers,
+                                     cache_dir = cache_dir,
+                                     length_bucketing = length_bucketing,
+                                     max_tokens = max_tokens,
+                                     shuffle = True,
+                                     stride = stride,
+                                     packing = packing,
+                                     soft_targets = dataset_training.get('soft_targets'),
+                                     labeled = dataset_training.get('labeled'))
     dl_validate = create_dataloader(sentences = dataset_validation.get('sentences'), 
                                     tags = dataset_validation.get('tags'),
                                     transformer_tokenizer = transformer_tokenizer,
@@ -136,11 +232,26 @@ def train_model(network,
                                     batch_size = validation_batch_size, 
                                     tag_encoder = tag_encoder,
                                     tag_outside = tag_outside,
-                                    num_workers = num_workers)
+                                    num_workers = num_workers,
+                                    cache_dir = cache_dir,
+                                    length_bucketing = length_bucketing,
+                                    max_tokens = max_tokens,
+                                    stride = stride,
+                                    packing = packing)
 
     optimizer_parameters = network.parameters()
 
-    num_train_steps = int(len(dataset_training.get('sentences')) / train_batch_size * epochs)
+    if 'shards' in dataset_training:
+        # the number of sentences sizes the learning rate schedule. It is
+        # declared or estimated from the first shard of a list, as counting
+        # would read the whole streamed data set once more.
+        n_sentences = dataset_training.get('n_sentences') or count_sentences(dataset_training.get('shards'))
+        num_train_steps = int(np.ceil(n_sentences / train_batch_size) * epochs)
+    elif length_bucketing or max_tokens is not None or stride is not None or packing:
+        # number of batches depends on the lengths of the sequences.
+        num_train_steps = len(dl_train) * epochs
+    else:
+        num_train_steps = int(len(dataset_training.get('sentences')) / train_batch_size * epochs)
     
     optimizer = AdamW(optimizer_parameters, lr = learning_rate)
     scheduler = get_linear_schedule_with_warmup(
@@ -154,7 +265,7 @@ def train_model(network,
         
         print('\n Epoch {:} / {:}'.format(epoch + 1, epochs))
 
-        train_loss = train(network, dl_train, optimizer, device, scheduler, n_tags)
+        train_loss = train(network, dl_train, optimizer, device, scheduler, n_tags, distillation_alpha, distillation_temperature)
         train_losses.append(train_loss)
         valid_loss = validate(network, dl_validate, device, n_tags)
 
@@ -1,5 +1,8 @@
 from typing import Callable
 
+# names of arguments by function code.
+_function_args = {}
+
 def match_kwargs(function: Callable, **kwargs) -> dict:
     """Matches Arguments with Function
 
@@ -14,8 +17,7 @@ def match_kwargs(function: Callable, **kwargs) -> dict:
         respective values.
 
     """
-    arg_count = function.__code__.co_argcount
-    args = function.__code__.co_varnames[:arg_count]
+    args = function_args(function)
 
     args_dict = {}
     for k, v in kwargs.items():
@@ -23,3 +25,22 @@ def match_kwargs(function: Callable, **kwargs) -> dict:
             args_dict[k] = v
 
     return args_dict
+
+def function_args(function: Callable) -> frozenset:
+    """Names of Arguments of Function
+
+    Cached, so every function is only introspected once.
+
+    Args:
+        function (function): Function to get argument names for.
+
+    Returns:
+        frozenset: names of positional and keyword arguments.
+    """
+    code = function.__code__
+    # look up by identity, hashing code objects is not cheap.
+    cached = _function_args.get(id(code))
+    if cached is None or cached[0] is not code:
+        cached = (code, frozenset(code.co_varnames[:code.co_argcount]))
+        _function_args[id(code)] = cached
+    return cached[1]
@@ -0,0 +1,76 @@
+import pytest
+pytest.importorskip('onnxruntime')
+import copy
+import torch
+from transformers import BertConfig, BertModel, BertTokenizerFast
+from NERDA.models import NERDA
+
+sentences = [['Jens', 'Hansen', 'har', 'en', 'bondegård'], 
+             ['Pernille', 'Rosenkrantz-Theil', 'kommer', 'fra', 'Vejle', '.']]
+tags = [['B-PER', 'I-PER', 'O', 'O', 'O'], 
+        ['B-PER', 'I-PER', 'O', 'O', 'B-LOC', 'O']]
+
+@pytest.fixture(scope = 'module')
+def model(tmp_path_factory):
+    """Tiny BERT model built locally"""
+    path = str(tmp_path_factory.mktemp('tiny'))
+    words = [w.lower() for sentence in sentences for w in sentence]
+    vocab = list(dict.fromkeys(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + words + list('abcdefghijklmnopqrstuvwxyzæøå-.')))
+    with open(f'{path}/vocab.txt', 'w') as f:
+        f.write('\n'.join(vocab))
+    torch.manual_seed(42)
+    config = BertConfig(vocab_size = len(vocab), hidden_size = 32, num_hidden_layers = 2, 
+                        num_attention_heads = 4, intermediate_size = 64)
+    BertModel(config).save_pretrained(path)
+    BertTokenizerFast(f'{path}/vocab.txt', do_lower_case = True).save_pretrained(path)
+    return NERDA(transformer = path, 
+                 device = 'cpu',
+                 tag_scheme = ['B-PER', 'I-PER', 'B-LOC', 'I-LOC'],
+                 dataset_training = {'sentences': sentences, 'tags': tags},
+                 dataset_validation = {'sentences': sentences, 'tags': tags},
+                 max_len = 32)
+
+@pytest.mark.parametrize('quantize', [False, True])
+def test_onnx_parity(model, tmp_path, quantize):
+    """Test that ONNX network predicts same tags as torch network"""
+    predictions = model.predict(sentences * 4, batch_size = 3)
+    onnx_model = copy.copy(model)
+    onnx_model.load_onnx(model.export_onnx(str(tmp_path / 'model.onnx'), quantize = quantize))
+    onnx_predictions = onnx_model.predict(sentences * 4, batch_size = 3)
+    if quantize:
+        # int8 weights may flip uncertain tags.
+        assert [len(p) for p in onnx_predictions] == [len(p) for p in predictions]
+    else:
+        assert onnx_predictions == predictions
+
+def test_quantize_static(model, tmp_path):
+    """Test that static quantization reports F1 and speed and refuses large F1 drops"""
+    dataset = {'sentences': sentences * 4, 'tags': tags * 4}
+    quantized = copy.copy(model)
+    report = quantized.quantize_static(dataset, 
+                                       path = str(tmp_path / 'model-int8.onnx'), 
+                                       evaluation_data = dataset,
+                                       strict = False)
+    assert list(report['Precision']) == ['fp32', 'int8-static']
+    assert quantized.quantized
+    assert [len(p) for p in quantized.predict(sentences)] == [len(s) for s in sentences]
+
+    refused = copy.copy(model)
+    with pytest.raises(ValueError):
+        refused.quantize_static(dataset, 
+                                path = str(tmp_path / 'model-int8.onnx'), 
+                                evaluation_data = dataset, 
+                                max_f1_drop = -1)
+    assert refused.network is model.network
+
+def test_onnx_prediction_cache(model, tmp_path):
+    """Test that cached predictions are invalidated by exporting again to same path"""
+    path = str(tmp_path / 'model.onnx')
+    onnx_model = copy.copy(model)
+    onnx_model.load_onnx(model.export_onnx(path))
+    onnx_model.enable_prediction_cache(cache_dir = str(tmp_path / 'cache'))
+    onnx_model.predict(sentences)
+    onnx_model.load_onnx(model.export_onnx(path, quantize = True))
+    onnx_model.enable_prediction_cache(cache_dir = str(tmp_path / 'cache'))
+    onnx_model.predict(sentences)
+    assert onnx_model.prediction_cache.stats()['hits'] == 0
@@ -1,6 +1,11 @@
 from NERDA.datasets import get_dane_data
 from NERDA.models import NERDA
 import nltk
+import pytest
+import asyncio
+import copy
+import threading
+import time
 
 # instantiate a minimal model.
 model = NERDA(dataset_training = get_dane_data('train', 5),
@@ -30,6 +35,26 @@ def test_predict_length():
     """Test that sentence and prediction lenghts match"""
     assert len(sentences[0])==len(predictions[0])
 
+def test_predict_padding():
+    """Test that batch-wise padding gives the same predictions as padding to max_len"""
+    sents = get_dane_data('test', 10).get('sentences')
+    assert model.predict(sents, batch_size = 4) == model.predict(sents, batch_size = 4, pad_sequences = True)
+
+def test_predict_length_bucketing():
+    """Test that length-bucketed predictions are returned in original order"""
+    sents = get_dane_data('test', 10).get('sentences')
+    assert model.predict(sents, length_bucketing = True) == model.predict(sents)
+
+def test_predict_max_tokens():
+    """Test that predictions with a token budget are returned in original order"""
+    sents = get_dane_data('test', 10).get('sentences')
+    assert model.predict(sents, max_tokens = 100) == model.predict(sents)
+
+def test_predict_packing():
+    """Test that packed sentences give the same predictions as unpacked sentences"""
+    sents = get_dane_data('test', 10).get('sentences')
+    assert model.predict(sents, packing = True) == model.predict(sents)
+
 def test_predict_text():
     """Test that predict_text runs"""
     predictions = model.predict_text(text_single)
@@ -40,6 +65,13 @@ def test_predict_maxlen_exceed():
     sentences = [nltk.word_tokenize(text)]
     model.predict(sentences)
 
+def test_predict_stride():
+    """Test that sentences exceeding max len are predicted in full with windows"""
+    text = "ice " * 200
+    sentences = [nltk.word_tokenize(text)]
+    predictions = model.predict(sentences, stride = 16)
+    assert len(predictions[0]) == len(sentences[0])
+
 # test confidence scores
 words, preds = model.predict_text(text_single, return_confidence=True)
 
@@ -67,6 +99,19 @@ def test_predict_text_multi():
 
 predictions_text_multi = model.predict_text(text_multi, batch_size = 2)
 
+def test_predict_no_download(monkeypatch):
+    """Test that sessions, micro-batcher and pool do not download tokenizer data"""
+    monkeypatch.setattr(nltk, 'download', lambda *args, **kwargs: pytest.fail('downloaded'))
+    model.predict(sentences)
+    session = model.compile_for_inference(batch_size = 2)
+    session.predict(sentences)
+    assert session.predict_text(text_multi) == predictions_text_multi
+    batcher = copy.copy(model)
+    batcher.micro_batcher(max_batch_size = 4)
+    assert asyncio.run(batcher.apredict_text(text_multi)) == predictions_text_multi
+    with model.inference_pool(n_workers = 2, chunk_size = 3) as pool:
+        assert pool.predict_text(text_multi) == predictions_text_multi
+
 def test_predict_text_multi_format():
     """Test multi-sentence text predictions has expected format"""
     assert isinstance(predictions_text_multi, tuple)
@@ -81,3 +126,120 @@ def test_predict_text_multi_lens():
     s2 = len(predictions_text_multi[0][1]) == len(predictions_text_multi[1][1])
     assert all([s1, s2])
 
+
+def test_predict_iter():
+    """Test that predict_iter yields same predictions as predict"""
+    sentences_iter = [nltk.word_tokenize(sentence) for sentence in nltk.sent_tokenize(text_multi)] * 3
+    predictions = model.predict(sentences_iter, return_confidence = True)
+    predictions_iter = sorted(model.predict_iter(iter(sentences_iter), 
+                                                 return_confidence = True,
+                                                 chunk_size = 4, 
+                                                 batch_size = 3))
+    assert [p[0] for p in predictions_iter] == list(range(len(sentences_iter)))
+    assert [p[1] for p in predictions_iter] == predictions[0]
+
+def test_predict_text_iter():
+    """Test that predict_text_iter yields same predictions as predict_text"""
+    predictions_iter = list(model.predict_text_iter(text_multi, batch_size = 2))
+    assert [p[1] for p in predictions_iter] == predictions_text_multi[0]
+    assert [p[2] for p in predictions_iter] == predictions_text_multi[1]
+
+def test_inference_session():
+    """Test that inference session predicts same as predict_text"""
+    session = model.compile_for_inference(batch_size = 2)
+    assert session.predict_text(text_multi) == predictions_text_multi
+
+def test_apredict_text():
+    """Test that concurrent requests are merged and routed back"""
+    async def requests():
+        return await asyncio.gather(*[model.apredict_text(text_multi) for _ in range(5)])
+    model.micro_batcher(max_batch_size = 4)
+    assert asyncio.run(requests()) == [predictions_text_multi] * 5
+
+def test_apredict_text_splits_in_executor():
+    """Test that texts are not split on the thread of the event loop"""
+    threads = []
+    def split_sentences(text):
+        threads.append(threading.current_thread())
+        return nltk.sent_tokenize(text)
+    batcher = copy.copy(model)
+    batcher.micro_batcher(max_batch_size = 4, sent_tokenize = split_sentences)
+    assert asyncio.run(batcher.apredict_text(text_multi)) == predictions_text_multi
+    assert threads and threading.main_thread() not in threads
+
+def test_inference_pool():
+    """Test that inference pool predicts same as predict"""
+    sentences_pool = [nltk.word_tokenize(sentence) for sentence in nltk.sent_tokenize(text_multi)] * 4
+    with model.inference_pool(n_workers = 2, chunk_size = 3) as pool:
+        assert pool.predict(sentences_pool) == model.predict(sentences_pool)
+        assert pool.predict_text(text_multi) == predictions_text_multi
+
+def test_inference_session_pipeline():
+    """Test that pipelined session predicts same as predict_text"""
+    session = model.compile_for_inference(batch_size = 1, chunk_size = 1, pipeline_depth = 2)
+    assert session.predict_text(text_multi) == predictions_text_multi
+
+def test_inference_session_pipeline_error():
+    """Test that errors in pipelined session are raised instead of hanging"""
+    session = model.compile_for_inference(batch_size = 1, pipeline_depth = 1)
+    def forward(**batch):
+        # let the producer fill the queue before failing.
+        time.sleep(0.5)
+        raise RuntimeError('forward failed')
+    session.network = forward
+    result = []
+    def predict():
+        try:
+            session.predict(sentences * 2)
+        except RuntimeError as e:
+            result.append(e)
+    thread = threading.Thread(target = predict, daemon = True)
+    thread.start()
+    thread.join(timeout = 30)
+    assert not thread.is_alive()
+    assert str(result[0]) == 'forward failed'
+
+def test_optimize_torchscript(tmp_path):
+    """Test that traced network predicts same as eager network and can be reloaded"""
+    path = str(tmp_path / 'network.pt')
+    for _ in range(2):
+        # trace and save first, load from file second.
+        optimized = copy.copy(model)
+        assert optimized.optimize('torchscript', path = path)
+        assert optimized.predict_text(text_multi) == predictions_text_multi
+
+def test_optimize_precision():
+    """Test that optimized networks refuse lower precisions"""
+    optimized = copy.copy(model)
+    if optimized.optimize('torchscript'):
+        for precision in ['bf16-autocast', 'fp16', 'int8-dynamic']:
+            with pytest.raises(AssertionError):
+                optimized.set_precision(precision)
+    converted = copy.deepcopy(model)
+    converted.set_precision('bf16-autocast')
+    with pytest.raises(AssertionError):
+        converted.optimize('torchscript')
+
+def test_set_precision():
+    """Test that bfloat16 autocast predicts tags for all words"""
+    converted = copy.deepcopy(model)
+    converted.set_precision('bf16-autocast')
+    predictions = converted.predict_text(text_multi)
+    assert [len(tags) for tags in predictions[1]] == [len(tags) for tags in predictions_text_multi[1]]
+    converted.set_precision('fp32')
+    assert converted.predict_text(text_multi) == predictions_text_multi
+
+def test_prediction_cache(tmp_path):
+    """Test that cached predictions equal predictions and recurring sentences are hits"""
+    cached = copy.copy(model)
+    cache = cached.enable_prediction_cache(max_size = 2, cache_dir = str(tmp_path))
+    assert cached.predict_text(text_multi) == predictions_text_multi
+    assert cached.predict_text(text_multi) == predictions_text_multi
+    n_sentences = len(predictions_text_multi[0])
+    assert cache.stats()['hits'] + cache.stats()['misses'] == 2 * n_sentences
+    assert cache.stats()['hits'] >= n_sentences
+
+def test_predict_texts():
+    """Test that pooled predictions for texts equal predict_text"""
+    texts = [text_single, text_multi, text_single]
+    assert model.predict_texts(texts, batch_size = 3) == [model.predict_text(text) for text in texts]
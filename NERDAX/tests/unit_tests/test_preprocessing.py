@@ -0,0 +1,119 @@
+from NERDA.datasets import get_dane_data
+from NERDA.preprocessing import NERDADataSetReader, LengthBucketBatchSampler, IGNORE_INDEX
+from transformers import AutoTokenizer, AutoConfig, RobertaConfig, RobertaTokenizerFast
+from tokenizers import ByteLevelBPETokenizer
+import pytest
+import sklearn.preprocessing
+import torch
+import numpy as np
+
+transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased'
+data = get_dane_data('train', 20)
+tag_encoder = sklearn.preprocessing.LabelEncoder()
+tag_encoder.fit(['O', 'B-PER', 'I-PER', 'B-ORG', 'I-ORG', 'B-LOC', 'I-LOC', 'B-MISC', 'I-MISC'])
+transformer_config = AutoConfig.from_pretrained(transformer)
+
+def create_reader(use_fast, max_len = 128):
+    tokenizer = AutoTokenizer.from_pretrained(transformer, do_lower_case = True, use_fast = use_fast)
+    return NERDADataSetReader(sentences = data.get('sentences'),
+                              tags = data.get('tags'),
+                              transformer_tokenizer = tokenizer,
+                              transformer_config = transformer_config,
+                              max_len = max_len,
+                              tag_encoder = tag_encoder,
+                              tag_outside = 'O')
+
+reader_fast = create_reader(use_fast = True)
+reader_slow = create_reader(use_fast = False)
+
+def test_fast_encodings():
+    """Test that fast tokenizer encodes sentences up front"""
+    assert reader_fast.encodings is not None
+    assert reader_slow.encodings is None
+
+def test_fast_matches_slow():
+    """Test that fast and word by word tokenization give identical inputs"""
+    for i in range(len(data.get('sentences'))):
+        fast, slow = reader_fast[i], reader_slow[i]
+        assert all(torch.equal(fast[k], slow[k]) for k in slow.keys())
+
+def test_fast_matches_slow_truncated():
+    """Test that truncated sentences are identical for fast and slow tokenization"""
+    fast, slow = create_reader(True, max_len = 5), create_reader(False, max_len = 5)
+    for i in range(len(data.get('sentences'))):
+        assert all(torch.equal(fast[i][k], slow[i][k]) for k in slow[i].keys())
+
+@pytest.mark.parametrize('add_prefix_space', [False, True])
+def test_fast_matches_slow_byte_level_bpe(tmp_path, add_prefix_space):
+    """Test that byte-level BPE tokenizers give identical inputs with and without prefix space"""
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator([' '.join(sentence) for sentence in data.get('sentences')], 
+                            vocab_size = 500, 
+                            special_tokens = ['<s>', '<pad>', '</s>', '<unk>', '<mask>'])
+    bpe.save_model(str(tmp_path))
+    tokenizer = RobertaTokenizerFast(str(tmp_path / 'vocab.json'), 
+                                     str(tmp_path / 'merges.txt'), 
+                                     add_prefix_space = add_prefix_space)
+    kwargs = {'sentences': data.get('sentences'),
+              'tags': data.get('tags'),
+              'transformer_tokenizer': tokenizer,
+              'transformer_config': RobertaConfig(),
+              'max_len': 128,
+              'tag_encoder': tag_encoder,
+              'tag_outside': 'O'}
+    fast = NERDADataSetReader(**kwargs)
+    assert (fast.encodings is not None) == add_prefix_space
+    slow = NERDADataSetReader(**kwargs)
+    slow.encodings = None
+    for i in range(len(data.get('sentences'))):
+        assert all(torch.equal(fast[i][k], slow[i][k]) for k in slow[i].keys())
+
+def test_cached_features(tmp_path):
+    """Test that cached features are reused and identical to tokenized features"""
+    tokenizer = AutoTokenizer.from_pretrained(transformer, do_lower_case = True)
+    kwargs = {'sentences': data.get('sentences'),
+              'tags': data.get('tags'),
+              'transformer_tokenizer': tokenizer,
+              'transformer_config': transformer_config,
+              'max_len': 128,
+              'tag_encoder': tag_encoder,
+              'tag_outside': 'O',
+              'cache_dir': str(tmp_path)}
+    NERDADataSetReader(**kwargs)
+    reader_cached = NERDADataSetReader(**kwargs)
+    assert len(list(tmp_path.iterdir())) == 1
+    assert reader_cached.encodings is None
+    for i in range(len(data.get('sentences'))):
+        assert all(torch.equal(reader_cached[i][k], reader_fast[i][k]) for k in reader_fast[i].keys())
+
+def test_length_bucket_batch_sampler():
+    """Test that sampler respects token budget and covers all sequences"""
+    lengths = reader_fast.sequence_lengths()
+    sampler = LengthBucketBatchSampler(lengths, max_tokens = 200, shuffle = True)
+    batches = list(sampler)
+    assert len(batches) == len(sampler)
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    assert all(len(batch) * max(lengths[batch]) <= 200 for batch in batches if len(batch) > 1)
+
+def test_length_bucket_batch_sampler_empty():
+    """Test that sampler yields no batches without sequences"""
+    sampler = LengthBucketBatchSampler(np.array([], dtype = int), batch_size = 4)
+    assert len(sampler) == 0
+    assert list(sampler) == []
+
+def test_windows_count_wordpieces_once():
+    """Test that overlapping windows leave every wordpiece in the loss once"""
+    tokenizer = AutoTokenizer.from_pretrained(transformer, do_lower_case = True)
+    reader = NERDADataSetReader(sentences = data.get('sentences'),
+                                tags = data.get('tags'),
+                                transformer_tokenizer = tokenizer,
+                                transformer_config = transformer_config,
+                                max_len = 8,
+                                tag_encoder = tag_encoder,
+                                tag_outside = 'O',
+                                stride = 2)
+    assert len(reader) > len(data.get('sentences'))
+    # wordpieces without special tokens and padding.
+    counted = sum(int(((reader[i]['target_tags'] != IGNORE_INDEX) & (reader[i]['masks'] == 1)).sum()) - 2 
+                  for i in range(len(reader)))
+    assert counted == sum(reader._sentence_lengths())
@@ -0,0 +1,51 @@
+from NERDA.datasets import get_dane_data
+from NERDA.models import NERDA
+from NERDA.serving import NERDAServer, NERDAClient, load_model
+import nltk
+
+transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased'
+
+# instantiate a minimal model.
+model = NERDA(dataset_training = get_dane_data('train', 5),
+              dataset_validation = get_dane_data('dev', 5),
+              transformer = transformer,
+              hyperparameters = {'epochs' : 1,
+                                 'warmup_steps' : 10,
+                                 'train_batch_size': 5,
+                                 'learning_rate': 0.0001})
+
+text = "Pernille Rosenkrantz-Theil kommer fra Vejle. Jens Hansen har en bondegård."
+sentences = [nltk.word_tokenize(sentence) for sentence in nltk.sent_tokenize(text)]
+
+def test_serve(tmp_path):
+    """Test all endpoints of server with local client"""
+    weights = str(tmp_path / 'model.bin')
+    model.save_network(weights)
+
+    server = NERDAServer(port = 0).start()
+    client = NERDAClient(f'http://127.0.0.1:{server.port}')
+    try:
+        assert client.health()[0] == 200
+        assert client.ready()[0] == 503
+        assert client.predict(sentences)[0] == 503
+
+        server.set_model(load_model(weights = weights, transformer = transformer))
+        assert client.ready()[0] == 200
+
+        status, response = client.predict(sentences)
+        assert status == 200
+        assert response['predictions'] == model.predict(sentences)
+
+        status, response = client.predict_text(text, return_confidence = True)
+        assert status == 200
+        assert response['sentences'] == sentences
+        assert [len(c) for c in response['confidences']] == [len(s) for s in sentences]
+
+        assert client.predict('not sentences')[0] == 400
+
+        status, metrics = client.metrics()
+        assert status == 200
+        assert metrics['requests'] == 4
+        assert metrics['sentences'] == 2 * len(sentences)
+    finally:
+        server.shutdown()
@@ -0,0 +1,24 @@
+from NERDA.splitters import sent_tokenize, word_tokenize, split_texts
+
+text = 'Hr. Hansen kom kl. 10.30 d. 3. juni. Han sagde: "Det er J. Jensens bil." Mr. Smith didn\'t agree!'
+
+def test_sent_tokenize():
+    """Test that abbreviations, initials and ordinals do not end sentences"""
+    assert sent_tokenize(text) == ['Hr. Hansen kom kl. 10.30 d. 3. juni.',
+                                   'Han sagde: "Det er J. Jensens bil."',
+                                   "Mr. Smith didn't agree!"]
+
+def test_sent_tokenize_leading_punctuation():
+    """Test that punctuation without preceding words ends a sentence"""
+    assert sent_tokenize('. Hello world.') == ['.', 'Hello world.']
+    assert sent_tokenize('  . Hello') == ['.', 'Hello']
+
+def test_word_tokenize():
+    """Test that words are split like the nltk Treebank tokenizer"""
+    assert word_tokenize('Han sagde: "Det er J. Jensens bil."') == ['Han', 'sagde', ':', '``', 'Det', 'er', 'J.', 'Jensens', 'bil', '.', "''"]
+    assert word_tokenize("Mr. Smith didn't agree!") == ['Mr.', 'Smith', 'did', "n't", 'agree', '!']
+
+def test_split_texts():
+    """Test that texts are split the same in worker processes"""
+    texts = [text, 'Pernille Rosenkrantz-Theil kommer fra Vejle.'] * 10
+    assert split_texts(texts, n_workers = 2, chunk_size = 3) == split_texts(texts)
@@ -26,6 +26,33 @@ def test_training_exceed_maxlen():
                                  'learning_rate': 0.0001})
     m.train()
 
+def test_training_exceed_maxlen_stride():
+    """Test if training with overlapping windows for sentences exceeding MAX LEN runs"""
+    m = NERDA(dataset_training = get_dane_data('train', 5),
+              dataset_validation = get_dane_data('dev', 5),
+              max_len = 8,
+              stride = 2,
+              transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased',
+              hyperparameters = {'epochs' : 1,
+                                 'warmup_steps' : 10,
+                                 'train_batch_size': 5,
+                                 'learning_rate': 0.0001})
+    m.train()
+    predictions = m.predict(get_dane_data('dev', 5).get('sentences'))
+    assert [len(p) for p in predictions] == [len(s) for s in get_dane_data('dev', 5).get('sentences')]
+
+def test_training_packing():
+    """Test if training with packed sentences runs"""
+    m = NERDA(dataset_training = get_dane_data('train', 5),
+              dataset_validation = get_dane_data('dev', 5),
+              transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased',
+              hyperparameters = {'epochs' : 1,
+                                 'warmup_steps' : 10,
+                                 'train_batch_size': 2,
+                                 'packing': True,
+                                 'learning_rate': 0.0001})
+    m.train()
+
 def test_training_bert():
     """Test if traning does not break even though MAX LEN is exceeded"""
     m = NERDA(dataset_training = get_dane_data('train', 5),
@@ -36,3 +63,94 @@ def test_training_bert():
                                  'train_batch_size': 5,
                                  'learning_rate': 0.0001})
     m.train()
+
+def test_training_max_tokens():
+    """Test if training runs with batches limited by a token budget"""
+    m = NERDA(dataset_training = get_dane_data('train', 5),
+              dataset_validation = get_dane_data('dev', 5),
+              transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased',
+              hyperparameters = {'epochs' : 1,
+                                 'warmup_steps' : 10,
+                                 'max_tokens': 200,
+                                 'learning_rate': 0.0001})
+    m.train()
+
+def test_training_streaming():
+    """Test if training on a streamed data set runs"""
+    def shards():
+        for split in ['train', 'dev']:
+            yield get_dane_data(split, 5)
+    m = NERDA(dataset_training = {'shards': shards, 'n_sentences': 10},
+              dataset_validation = get_dane_data('dev', 5),
+              transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased',
+              hyperparameters = {'epochs' : 2,
+                                 'warmup_steps' : 10,
+                                 'train_batch_size': 5,
+                                 'shuffle_buffer': 4,
+                                 'learning_rate': 0.0001})
+    m.train()
+
+def test_training_early_exit():
+    """Test if heads of early exits are trained without changing the network"""
+    m = NERDA(dataset_training = get_dane_data('train', 5),
+              dataset_validation = get_dane_data('dev', 5),
+              transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased',
+              hyperparameters = {'epochs' : 1,
+                                 'warmup_steps' : 10,
+                                 'train_batch_size': 5,
+                                 'learning_rate': 0.0001})
+    sentences = get_dane_data('dev', 5).get('sentences')
+    predictions = m.predict(sentences)
+    m.train_early_exit(exit_layers = [2, 6])
+    assert m.predict(sentences) == predictions
+    m.set_early_exit(max_layers = 2)
+    assert [len(p) for p in m.predict(sentences)] == [len(s) for s in sentences]
+    m.enable_prediction_cache()
+    for _ in range(2):
+        # cached predictions must not replace the exits.
+        report = m.evaluate_early_exit(get_dane_data('dev', 5), thresholds = [0.5])
+        assert list(report['Layers'])[:3] == [2, 6, 12]
+
+def test_distillation(tmp_path):
+    """Test if student is trained with soft targets of teacher and can be saved"""
+    student = NERDA(dataset_training = get_dane_data('train', 5),
+                    dataset_validation = get_dane_data('dev', 5),
+                    transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased',
+                    hyperparameters = {'epochs' : 1,
+                                       'warmup_steps' : 10,
+                                       'train_batch_size': 5,
+                                       'learning_rate': 0.0001})
+    student.distill(model, 
+                    unlabeled_sentences = get_dane_data('test', 5).get('sentences'), 
+                    cache_dir = str(tmp_path))
+    student.save_network(str(tmp_path / 'student.bin'))
+
+def test_pruning(tmp_path):
+    """Test if pruned network is smaller and restored from file"""
+    m = NERDA(dataset_training = get_dane_data('train', 5),
+              dataset_validation = get_dane_data('dev', 5),
+              transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased',
+              hyperparameters = {'epochs' : 1,
+                                 'warmup_steps' : 10,
+                                 'train_batch_size': 5,
+                                 'learning_rate': 0.0001})
+    report = m.prune(head_sparsity = 0.25, ffn_sparsity = 0.25)
+    assert report['parameters'][1] < report['parameters'][0]
+    m.save_network(str(tmp_path / 'pruned.bin'))
+    restored = NERDA(transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased')
+    restored.load_network_from_file(str(tmp_path / 'pruned.bin'))
+    sentences = get_dane_data('dev', 5).get('sentences')
+    assert restored.predict(sentences) == m.predict(sentences)
+
+def test_pruning_ffn(tmp_path):
+    """Test if network with pruned FFN neurons only is restored from file"""
+    m = NERDA(dataset_training = get_dane_data('train', 5),
+              dataset_validation = get_dane_data('dev', 5),
+              transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased')
+    report = m.prune(head_sparsity = 0.0, ffn_sparsity = 0.5)
+    assert report['heads'][1] == report['heads'][0]
+    m.save_network(str(tmp_path / 'pruned.bin'))
+    restored = NERDA(transformer = 'Maltehb/-l-ctra-danish-electra-small-uncased')
+    restored.load_network_from_file(str(tmp_path / 'pruned.bin'))
+    sentences = get_dane_data('dev', 5).get('sentences')
+    assert restored.predict(sentences) == m.predict(sentences)